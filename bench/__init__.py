@@ -0,0 +1 @@
+"""Benchmarks de rendimiento de Bingo OCR (se ejecutan con ``python -m bench.<script>``)."""
@@ -0,0 +1,97 @@
+"""Micro-benchmark de la limpieza: bucles originales vs versión vectorizada, y
+limpieza celda a celda vs limpieza del cartón completo.
+
+Uso:
+    python -m bench.cleanup --cells 500 --size 120
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from src.processor import remove_speckles, clear_border, cell_boxes, clean_cell, clean_card
+
+
+def legacy_remove_speckles(cell_bw):
+    """Versión original: una pasada completa por la celda para cada etiqueta."""
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(cell_bw, connectivity=8)
+    min_area = max(8, (cell_bw.shape[0] * cell_bw.shape[1]) // 500)
+    cleaned = np.zeros_like(cell_bw)
+    for lbl in range(1, num_labels):
+        area = stats[lbl, cv2.CC_STAT_AREA]
+        if area >= min_area:
+            cleaned[labels == lbl] = 255
+    return cleaned
+
+
+def legacy_clear_border(cell_bw):
+    """Versión original: floodFill desde cada píxel blanco de los cuatro bordes."""
+    flood = cell_bw.copy()
+    h_c, w_c = flood.shape
+    mask = np.zeros((h_c + 2, w_c + 2), np.uint8)
+    for x in range(w_c):
+        if flood[0, x] == 255:
+            cv2.floodFill(flood, mask, (x, 0), 0)
+        if flood[h_c - 1, x] == 255:
+            cv2.floodFill(flood, mask, (x, h_c - 1), 0)
+    for y in range(h_c):
+        if flood[y, 0] == 255:
+            cv2.floodFill(flood, mask, (0, y), 0)
+        if flood[y, w_c - 1] == 255:
+            cv2.floodFill(flood, mask, (w_c - 1, y), 0)
+    return flood
+
+
+def noisy_cells(count, size, seed=0):
+    """Celdas binarias con un número, líneas de cuadrícula en el borde y ruido sal."""
+    rng = np.random.default_rng(seed)
+    cells = []
+    for _ in range(count):
+        cell = np.zeros((size, size), np.uint8)
+        cv2.putText(cell, str(int(rng.integers(1, 76))), (size // 6, size * 3 // 4),
+                    cv2.FONT_HERSHEY_SIMPLEX, size / 60.0, 255, max(1, size // 30))
+        cell[:, :max(1, size // 40)] = 255
+        cell[rng.random((size, size)) < 0.02] = 255
+        cells.append(cell)
+    return cells
+
+
+def per_cell_ms(fn, cells):
+    start = time.perf_counter()
+    for cell in cells:
+        fn(cell)
+    return (time.perf_counter() - start) * 1000.0 / len(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, default=500)
+    parser.add_argument("--size", type=int, default=120, help="lado de cada celda en px")
+    args = parser.parse_args()
+
+    cells = noisy_cells(args.cells, args.size)
+    rows = [
+        ("speckles", legacy_remove_speckles, remove_speckles),
+        ("border", legacy_clear_border, clear_border),
+    ]
+    print(f"{'stage':<10} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name, before, after in rows:
+        t_before = per_cell_ms(before, cells)
+        t_after = per_cell_ms(after, cells)
+        print(f"{name:<10} {t_before:>10.3f} {t_after:>10.3f} {t_before / t_after:>7.1f}x")
+
+    # Cartones 5x5 con las mismas celdas: limpieza por celda vs una pasada por cartón
+    cards = []
+    for start in range(0, len(cells) - 24, 25):
+        chunk = cells[start:start + 25]
+        card = np.vstack([np.hstack(chunk[r * 5:(r + 1) * 5]) for r in range(5)])
+        cards.append((card, cell_boxes(card.shape[0], card.shape[1], 5, 5)))
+    if cards:
+        t_cell = per_cell_ms(lambda c: [clean_cell(c[0][ya:yb, xa:xb]) for xa, ya, xb, yb in c[1]], cards)
+        t_card = per_cell_ms(lambda c: clean_card(*c), cards)
+        print(f"{'card/5x5':<10} {t_cell:>10.3f} {t_card:>10.3f} {t_cell / t_card:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
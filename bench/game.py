@@ -0,0 +1,104 @@
+"""Coste de cantar números en una partida con muchos cartones: índice de bits de
+``src.game`` frente a recorrer todos los cartones en cada número.
+
+Genera cartones 5x5 válidos (B 1-15 ... O 61-75, casilla FREE), los carga en una
+partida y canta los 75 números en orden aleatorio. La versión ingenua marca y revisa
+cada cartón en cada número; como tarda mucho, se mide sobre los primeros
+``--naive-cards`` cartones y se escala.
+
+Uso:
+    python -m bench.game --cards 1000 10000 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.game import Game
+
+NUMBERS = 75
+
+
+def random_cards(count, seed=0):
+    """``count`` cartones 5x5 de bingo americano como los devuelve ``/process``."""
+    rng = np.random.default_rng(seed)
+    # Cinco números distintos por columna: los 5 primeros de una permutación de sus 15
+    columns = np.argsort(rng.random((count, 5, 15)), axis=2)[:, :, :5] + 1 + 15 * np.arange(5)[:, None]
+    cards = {}
+    for index, card in enumerate(columns.transpose(0, 2, 1).tolist()):
+        grid = [[str(n) for n in row] for row in card]
+        grid[2][2] = "FREE"
+        cards[f"card-{index}"] = grid
+    return cards
+
+
+def naive_game(cards, calls):
+    """Referencia: matriz de marcas por cartón y revisión de todas las líneas de todos
+    los cartones en cada número. Devuelve (segundos por número, premios)."""
+    marks = {card_id: [[cell == "FREE" for cell in row] for row in grid] for card_id, grid in cards.items()}
+    won = {card_id: set() for card_id in cards}
+    wins = 0
+    start = time.perf_counter()
+    for number in calls:
+        text = str(number)
+        for card_id, grid in cards.items():
+            card = marks[card_id]
+            for i, row in enumerate(grid):
+                for j, cell in enumerate(row):
+                    if cell == text:
+                        card[i][j] = True
+            lines = {f"row:{i}": all(card[i]) for i in range(5)}
+            lines.update({f"column:{j}": all(card[i][j] for i in range(5)) for j in range(5)})
+            lines["diagonal:0"] = all(card[i][i] for i in range(5))
+            lines["diagonal:1"] = all(card[i][4 - i] for i in range(5))
+            lines["full"] = all(all(row) for row in card)
+            for pattern, complete in lines.items():
+                if complete and pattern not in won[card_id]:
+                    won[card_id].add(pattern)
+                    wins += 1
+    return (time.perf_counter() - start) / len(calls), wins
+
+
+def indexed_game(cards, calls):
+    """Devuelve (segundos de carga, segundos por número, p99 por número, premios, MB del índice)."""
+    start = time.perf_counter()
+    game = Game((5, 5))
+    game.add_cards(cards)
+    load = time.perf_counter() - start
+    memory = game.nbytes() / 1e6
+
+    latencies = []
+    wins = 0
+    for number in calls:
+        start = time.perf_counter()
+        wins += len(game.call(number))
+        latencies.append(time.perf_counter() - start)
+    return load, float(np.mean(latencies)), float(np.percentile(latencies, 99)), wins, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--naive-cards", type=int, default=2000,
+                        help="cartones sobre los que se mide la versión ingenua")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    calls = (np.random.default_rng(args.seed).permutation(NUMBERS) + 1).tolist()
+    print(f"{'cards':>8} {'load s':>8} {'index MB':>9} {'call ms':>9} {'p99 ms':>8} "
+          f"{'naive ms':>10} {'speedup':>8} {'wins':>8}")
+    for count in args.cards:
+        cards = random_cards(count, args.seed)
+        load, mean, p99, wins, memory = indexed_game(cards, calls)
+
+        sample = dict(list(cards.items())[:min(count, args.naive_cards)])
+        naive, naive_wins = naive_game(sample, calls)
+        if len(sample) == count and naive_wins != wins:
+            raise SystemExit(f"Premios distintos con {count} cartones: {wins} vs {naive_wins}")
+        naive *= count / len(sample)
+        print(f"{count:>8} {load:>8.2f} {memory:>9.1f} {mean * 1000:>9.3f} {p99 * 1000:>8.3f} "
+              f"{naive * 1000:>10.1f} {naive / mean:>7.0f}x {wins:>8}")
+
+
+if __name__ == "__main__":
+    main()
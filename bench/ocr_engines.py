@@ -0,0 +1,74 @@
+"""Throughput (celdas/segundo) de cada motor de OCR, por celda y en batch.
+
+Uso:
+    python -m bench.ocr_engines --cells 200
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from src.ocr import create_engine, compose_cells, assign_words
+
+
+def render_cells(count, size=80, seed=0):
+    """Genera celdas sintéticas (número negro sobre blanco) y sus textos esperados."""
+    rng = np.random.default_rng(seed)
+    cells, truth = [], []
+    for _ in range(count):
+        text = str(int(rng.integers(1, 76)))
+        cell = np.full((size, size), 255, np.uint8)
+        scale = size / 70.0
+        (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 3)
+        cv2.putText(cell, text, ((size - tw) // 2, (size + th) // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, scale, 0, 3)
+        cells.append(cell)
+        truth.append(text)
+    return cells, truth
+
+
+def run_cell_mode(engine, cells):
+    return [engine.image_to_string(cell, 7).strip() for cell in cells]
+
+
+def run_batch_mode(engine, cells):
+    canvas, slots = compose_cells(cells)
+    return assign_words(engine.image_to_data(canvas, 6), slots)
+
+
+def measure(engine, cells, truth, mode, batch_size=25):
+    runner = run_cell_mode if mode == "cell" else run_batch_mode
+    # Calentar (carga de traineddata, primera inicialización)
+    runner(engine, cells[:min(len(cells), batch_size)])
+    texts = []
+    start = time.perf_counter()
+    for k in range(0, len(cells), batch_size):
+        texts.extend(runner(engine, cells[k:k + batch_size]))
+    elapsed = time.perf_counter() - start
+    accuracy = sum(a == b for a, b in zip(texts, truth)) / len(truth)
+    return len(cells) / elapsed, accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, default=200)
+    parser.add_argument("--size", type=int, default=80, help="lado de cada celda en px")
+    args = parser.parse_args()
+
+    cells, truth = render_cells(args.cells, args.size)
+    print(f"{'engine':<12} {'mode':<6} {'cells/s':>10} {'accuracy':>9}")
+    for name in ("pytesseract", "tesserocr"):
+        try:
+            engine = create_engine(name)
+            engine.image_to_string(cells[0], 7)
+        except Exception as e:
+            print(f"{name:<12} {'-':<6} {'n/a':>10}  ({e})")
+            continue
+        for mode in ("cell", "batch"):
+            rate, accuracy = measure(engine, cells, truth, mode)
+            print(f"{name:<12} {mode:<6} {rate:>10.1f} {accuracy:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Latencia y memoria pico de process_image según el tamaño de la foto, con y sin
+normalización de resolución (decodificación reducida a TARGET_CELL_HEIGHT).
+
+Cada medida corre en un proceso nuevo para que el pico de RSS sea solo suyo.
+
+Uso:
+    python -m bench.resolution --megapixels 1 3 12 24 48
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+
+def render_card(megapixels, rows=5, cols=5, seed=0):
+    """Foto sintética 4:3 de ``megapixels`` ocupada por el cartón; devuelve los bytes
+    JPEG y los textos esperados."""
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = height * 4 // 3
+    image = np.full((height, width), 255, np.uint8)
+    cell_h, cell_w = height // rows, width // cols
+    rng = np.random.default_rng(seed)
+    truth = []
+    # Número en la parte baja de la celda, como en los cartones impresos
+    scale = cv2.getFontScaleFromHeight(cv2.FONT_HERSHEY_SIMPLEX, cell_h * 2 // 5)
+    thickness = max(2, cell_h // 30)
+    for i in range(rows):
+        for j in range(cols):
+            text = str(int(rng.integers(1, 76)))
+            (tw, _th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+            cv2.putText(image, text, (j * cell_w + (cell_w - tw) // 2, (i + 1) * cell_h - cell_h // 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, scale, 0, thickness)
+            truth.append(text)
+    for k in range(rows + 1):
+        y = min(height - 1, k * cell_h)
+        cv2.line(image, (0, y), (width, y), 0, thickness)
+    for k in range(cols + 1):
+        x = min(width - 1, k * cell_w)
+        cv2.line(image, (x, 0), (x, height), 0, thickness)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes(), truth
+
+
+def _peak_rss_mb():
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child(path, target):
+    """Procesa ``path`` una vez e imprime latencia, RSS y textos (en JSON)."""
+    from src.processor import process_image
+
+    start = time.perf_counter()
+    grid = process_image(path, target_cell_height=target)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "peak_mb": _peak_rss_mb(), "texts": sum(grid, [])}))
+
+
+def measure(path, target):
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.resolution", "--child", path, "--target", str(target)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 3, 12, 24, 48])
+    parser.add_argument("--target", type=int, default=None,
+                        help="alto de celda objetivo (por defecto TARGET_CELL_HEIGHT)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.target)
+        return
+
+    from src.processor import TARGET_CELL_HEIGHT
+
+    target = TARGET_CELL_HEIGHT if args.target is None else args.target
+    print(f"{'MP':>5} {'target':>7} {'latency ms':>11} {'peak MB':>8} {'accuracy':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for megapixels in args.megapixels:
+            data, truth = render_card(megapixels)
+            path = os.path.join(tmp_dir, f"card_{megapixels}.jpg")
+            with open(path, "wb") as fh:
+                fh.write(data)
+            for label, value in (("full", 0), (str(target), target)):
+                result = measure(path, value)
+                accuracy = sum(a == b for a, b in zip(result["texts"], truth)) / len(truth)
+                print(f"{megapixels:>5g} {label:>7} {result['seconds'] * 1000:>11.0f} "
+                      f"{result['peak_mb']:>8.0f} {accuracy:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
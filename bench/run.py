@@ -0,0 +1,238 @@
+"""Benchmark de extremo a extremo sobre cartones sintéticos (``bench.synth``).
+
+Mide, sobre los mismos cartones con solución conocida:
+
+* latencia por etapa (decodificación, limpieza, OCR, ... y total) con percentiles,
+* cartones/segundo a varios niveles de concurrencia, en proceso y contra la API,
+* memoria pico (RSS) y acierto por celda.
+
+El resultado se escribe en JSON; con ``--baseline`` se compara con una ejecución
+anterior y se marcan las regresiones (código de salida 1).
+
+Uso:
+    python -m bench.run --cards 30 --profile scan --output bench.json
+    python -m bench.run --cards 30 --baseline bench.json --tolerance 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# Cada nivel de concurrencia repite los mismos cartones: sin caché de resultados, ni
+# memoria de celdas, ni aprendizaje del clasificador, para medir siempre en frío
+# (se pueden volver a activar desde el entorno)
+os.environ.setdefault("RESULT_CACHE_SIZE", "0")
+os.environ.setdefault("CELL_MEMO_SIZE", "0")
+os.environ.setdefault("DIGIT_BANK_SIZE", "0")
+
+from bench.synth import PROFILES, encode, generate  # noqa: E402
+from src.processor import process_image_with_stats  # noqa: E402
+
+PERCENTILES = (50, 90, 99)
+
+# Orden de las etapas en el informe (en el orden en que se ejecutan)
+STAGES = ("read", "decode", "cache", "pool_wait", "locate", "preprocess", "cleanup", "memo",
+          "classifier", "ocr", "overlay", "total", "request")
+
+
+def summarise(samples):
+    """Percentiles y media (ms) de una lista de duraciones en segundos."""
+    values = np.asarray(samples, np.float64) * 1000
+    summary = {f"p{p}": round(float(np.percentile(values, p)), 2) for p in PERCENTILES}
+    summary["mean"] = round(float(values.mean()), 2)
+    return summary
+
+
+def peak_rss_mb():
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def cell_accuracy(grids, truths):
+    pairs = [(a, b) for grid, truth in zip(grids, truths) for a, b in zip(sum(grid, []), sum(truth, []))]
+    return round(sum(a == b for a, b in pairs) / len(pairs), 4) if pairs else 0.0
+
+
+def run_card(card, ocr_mode):
+    """Procesa un cartón (bytes codificados) con el desglose de ``process_image`` por etapa."""
+    start = time.perf_counter()
+    grid, paths, timings = process_image_with_stats(card["data"], ocr_mode=ocr_mode,
+                                                    locate=card["locate"], timings=True)
+    timings["total"] = time.perf_counter() - start
+    return grid, paths, timings
+
+
+def stage_summaries(per_card):
+    """Percentiles de cada etapa sobre todos los cartones (0 si un cartón no la tuvo)."""
+    names = sorted({name for timings in per_card for name in timings},
+                   key=lambda n: STAGES.index(n) if n in STAGES else len(STAGES))
+    return {name: summarise([timings.get(name, 0.0) for timings in per_card]) for name in names}
+
+
+def bench_pipeline(cards, ocr_mode):
+    per_card, grids, paths = [], [], {}
+    for card in cards:
+        grid, card_paths, timings = run_card(card, ocr_mode)
+        grids.append(grid)
+        per_card.append(timings)
+        for name, count in card_paths.items():
+            paths[name] = paths.get(name, 0) + count
+    return {
+        "latency_ms": stage_summaries(per_card),
+        "accuracy": cell_accuracy(grids, [card["truth"] for card in cards]),
+        "ocr_paths": paths,
+    }
+
+
+def throughput(task, items, concurrency):
+    """Cartones por segundo procesando ``items`` con ``concurrency`` hilos."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(task, items))
+    return round(len(items) / (time.perf_counter() - start), 2)
+
+
+def bench_api(cards, levels):
+    from fastapi.testclient import TestClient
+    from src.api import app
+
+    def post(card):
+        start = time.perf_counter()
+        while True:
+            response = client.post(
+                "/process", params={"locate": str(card["locate"]).lower(), "timings": "true"},
+                files={"file": ("carton.jpg", card["data"], "image/jpeg")},
+            )
+            # Cola de OCR llena: reintentar como un cliente real, tras Retry-After
+            if response.status_code != 503:
+                break
+            time.sleep(float(response.headers.get("Retry-After", "1")))
+        response.raise_for_status()
+        body = response.json()
+        # Etapas medidas en el servidor (s) más la petición completa vista por el cliente
+        timings = {name: ms / 1000 for name, ms in body["timings_ms"].items()
+                   if name not in ("total", "ocr_per_cell")}
+        timings["request"] = time.perf_counter() - start
+        return body["grid"], timings
+
+    with TestClient(app) as client:
+        post(cards[0])
+        results = [post(card) for card in cards]
+        return {
+            "latency_ms": stage_summaries([timings for _grid, timings in results]),
+            "accuracy": cell_accuracy([grid for grid, _timings in results], [card["truth"] for card in cards]),
+            "cards_per_second": {str(c): throughput(post, cards, c) for c in levels},
+        }
+
+
+# Métricas comparables con una ejecución base: (ruta, mayor es mejor)
+def comparable_metrics(result):
+    metrics = {}
+    for section in ("pipeline", "api"):
+        data = result.get(section)
+        if not data:
+            continue
+        for stage, summary in data["latency_ms"].items():
+            for name in ("p50", "p90"):
+                metrics[f"{section}.latency_ms.{stage}.{name}"] = (summary[name], False)
+        metrics[f"{section}.accuracy"] = (data["accuracy"], True)
+        for level, rate in data.get("cards_per_second", {}).items():
+            metrics[f"{section}.cards_per_second.{level}"] = (rate, True)
+    metrics["peak_rss_mb"] = (result["peak_rss_mb"], False)
+    return metrics
+
+
+def compare(result, baseline, tolerance=0.15, accuracy_drop=0.01):
+    """Regresiones de ``result`` frente a ``baseline``: latencias, memoria o
+    throughput peores en más de ``tolerance`` (relativo), o acierto que cae más de
+    ``accuracy_drop`` (absoluto).
+
+    Returns:
+        list[tuple]: (métrica, base, actual) de cada regresión.
+    """
+    current, reference = comparable_metrics(result), comparable_metrics(baseline)
+    regressions = []
+    for name, (value, higher_is_better) in current.items():
+        if name not in reference:
+            continue
+        base = reference[name][0]
+        if name.endswith("accuracy"):
+            worse = value < base - accuracy_drop
+        elif higher_is_better:
+            worse = value < base * (1 - tolerance)
+        else:
+            worse = value > base * (1 + tolerance)
+        if worse:
+            regressions.append((name, base, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=30)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="scan")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ocr-mode", choices=("cell", "batch"), default="cell")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--no-api", action="store_true", help="no medir la API (TestClient)")
+    parser.add_argument("--output", help="fichero JSON donde guardar el resultado")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con la que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    cards = []
+    for card in generate(args.cards, args.profile, args.seed):
+        cards.append({"data": encode(card["image"]), "truth": card["truth"], "locate": card["locate"]})
+
+    # Calentar: carga del modelo de Tesseract y primeras reservas de memoria
+    run_card(cards[0], args.ocr_mode)
+
+    result = {
+        "meta": {
+            "profile": args.profile, "cards": args.cards, "seed": args.seed, "ocr_mode": args.ocr_mode,
+            "python": platform.python_version(), "opencv": cv2.__version__,
+            "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "pipeline": bench_pipeline(cards, args.ocr_mode),
+    }
+    result["pipeline"]["cards_per_second"] = {
+        str(c): throughput(lambda card: run_card(card, args.ocr_mode), cards, c) for c in args.concurrency
+    }
+    if not args.no_api:
+        result["api"] = bench_api(cards, args.concurrency)
+    result["peak_rss_mb"] = peak_rss_mb()
+
+    for section in ("pipeline", "api"):
+        data = result.get(section)
+        if not data:
+            continue
+        print(f"[{section}] accuracy {data['accuracy']:.1%}")
+        for stage, summary in data["latency_ms"].items():
+            print(f"  {stage:<11}" + " ".join(f"{k} {v:>8.1f}" for k, v in summary.items()) + "  ms")
+        print("  cards/s    " + " ".join(f"x{c}: {r}" for c, r in data["cards_per_second"].items()))
+    print(f"peak RSS {result['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(result, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        regressions = compare(result, baseline, args.tolerance)
+        for name, base, value in regressions:
+            print(f"REGRESSION {name}: {base} -> {value}")
+        if regressions:
+            sys.exit(1)
+        print(f"Sin regresiones frente a {args.baseline} (tolerancia {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
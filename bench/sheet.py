@@ -0,0 +1,76 @@
+"""Tiempo de una hoja con varios cartones frente al de un cartón suelto: localización
+de los cartones, lectura en paralelo en el pool de OCR de la API (``OCRPool``, como
+``/process/sheet``) y lectura de uno en uno.
+
+Uso:
+    python -m bench.sheet --cards 3 4 6 --photo
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from bench.synth import encode, make_sheet
+from src.processor import process_image, process_image_with_stats, warm_up
+from src.sheet import sheet_crops
+from src.workers import OCRPool
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def read_sheet(pool, data):
+    """Recorta los cartones de la hoja y los lee a la vez en ``pool``."""
+    crops, _boxes = sheet_crops(data)
+
+    async def read_all():
+        return await asyncio.gather(*(pool.run(process_image_with_stats, crop, locate=True)
+                                      for crop in crops))
+
+    return [grid for grid, _paths in asyncio.run(read_all())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, nargs="+", default=[3, 4, 6])
+    parser.add_argument("--photo", action="store_true", help="hoja fotografiada con el móvil (12 MP)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    warm_up()
+    pools = {}
+    for name, workers in (("parallel", args.workers), ("serial", 1)):
+        # La hoja entera cabe en la cola de admisión
+        pools[name] = OCRPool("thread", max_workers=workers, max_queue=max(args.cards))
+        # Cargar el motor de OCR en cada hilo antes de medir
+        pools[name].warm_up(warm_up)
+    print(f"{'cards':>5} {'detect ms':>10} {'single ms':>10} {'sheet ms':>9} {'serial ms':>10} "
+          f"{'sheet/single':>13} {'accuracy':>9}")
+    for count in args.cards:
+        sheet = make_sheet(np.random.default_rng(args.seed), count, 2 if count % 3 else 3, photo=args.photo)
+        data = encode(sheet["image"])
+        detect, (crops, _boxes) = best_of(lambda: sheet_crops(data), args.repeat)
+        single, _grid = best_of(lambda: process_image(crops[0], locate=True), args.repeat)
+        parallel, grids = best_of(lambda: read_sheet(pools["parallel"], data), args.repeat)
+        serial, _grids = best_of(lambda: read_sheet(pools["serial"], data), args.repeat)
+        pairs = [(read, truth) for grid, card in zip(grids, sheet["truths"])
+                 for read, truth in zip(sum(grid, []), sum(card, []))]
+        accuracy = sum(read == truth for read, truth in pairs) / max(len(pairs), 1)
+        print(f"{count:>5} {detect * 1000:>10.1f} {single * 1000:>10.1f} {parallel * 1000:>9.1f} "
+              f"{serial * 1000:>10.1f} {parallel / single:>12.1f}x {accuracy:>9.3f}")
+    for pool in pools.values():
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
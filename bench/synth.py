@@ -0,0 +1,241 @@
+"""Generador de cartones de bingo sintéticos con solución conocida (sin ficheros externos).
+
+Cada columna B-I-N-G-O lleva números de su rango (1-15, 16-30, ...), sin repetir, y la
+casilla central es la FREE. Los perfiles añaden ruido, desenfoque, giro, resolución
+variable y, en "phone", perspectiva y fondo de foto de móvil.
+
+Uso:
+    python -m bench.synth --count 20 --profile phone --out /tmp/cartones
+    python -m bench.synth --fixtures tests
+"""
+import argparse
+import json
+import os
+
+import cv2
+import numpy as np
+
+LETTERS = "BINGO"
+COLUMN_SPAN = 15
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# Parámetros de cada perfil: rangos (mínimo, máximo) de los que se sortea cada cartón
+PROFILES = {
+    # Escaneo limpio: solo cambia la resolución
+    "clean": {"cell": (70, 140), "noise": (0, 0), "blur": (0, 0), "rotation": (0, 0)},
+    # Escaneo o captura de pantalla con algo de ruido, desenfoque y giro
+    "scan": {"cell": (60, 200), "noise": (0, 8), "blur": (0, 1.2), "rotation": (-1, 1)},
+    # Foto de móvil: cartón en perspectiva sobre una mesa, de 3 a 12 MP
+    "phone": {"cell": (80, 120), "noise": (0, 6), "blur": (0, 1.5), "rotation": (-4, 4),
+              "fill": (0.35, 0.7), "megapixels": (3, 12)},
+}
+
+
+def bingo_numbers(rng, rows=5, cols=5, free=True):
+    """Matriz de textos de un cartón válido: la columna j usa el rango de la letra
+    ``j % 5`` y la casilla central queda vacía (FREE) si ``free``."""
+    grid = [[""] * cols for _ in range(rows)]
+    for j in range(cols):
+        start = (j % len(LETTERS)) * COLUMN_SPAN + 1
+        column = rng.choice(np.arange(start, start + COLUMN_SPAN), size=rows, replace=rows > COLUMN_SPAN)
+        for i in range(rows):
+            grid[i][j] = str(int(column[i]))
+    if free and rows % 2 and cols % 2:
+        grid[rows // 2][cols // 2] = ""
+    return grid
+
+
+def render_card(numbers, cell=90, free_text="FREE"):
+    """Cartón en BGR: letra de la columna arriba a la izquierda de cada celda, número
+    en la parte baja y líneas de la rejilla. Las celdas vacías centrales llevan
+    ``free_text``."""
+    rows, cols = len(numbers), len(numbers[0])
+    height, width = rows * cell, cols * cell
+    image = np.full((height, width, 3), 255, np.uint8)
+    scale = cv2.getFontScaleFromHeight(FONT, cell * 2 // 5)
+    thickness = max(2, cell // 30)
+    letter_scale = cv2.getFontScaleFromHeight(FONT, max(6, cell // 9))
+    for i, row in enumerate(numbers):
+        for j, text in enumerate(row):
+            x0, y0 = j * cell, i * cell
+            cv2.putText(image, LETTERS[j % len(LETTERS)], (x0 + cell // 18, y0 + cell // 5),
+                        FONT, letter_scale, (0, 0, 0), 1, cv2.LINE_AA)
+            if not text and (i, j) == (rows // 2, cols // 2):
+                text_scale, text_thickness = cv2.getFontScaleFromHeight(FONT, cell // 5), max(1, thickness // 2)
+                text = free_text
+            else:
+                text_scale, text_thickness = scale, thickness
+            if text:
+                (tw, _th), _ = cv2.getTextSize(text, FONT, text_scale, text_thickness)
+                cv2.putText(image, text, (x0 + (cell - tw) // 2, y0 + cell - cell // 5),
+                            FONT, text_scale, (0, 0, 0), text_thickness, cv2.LINE_AA)
+    line = max(2, cell // 45)
+    for k in range(rows + 1):
+        y = min(height - 1, k * cell)
+        cv2.line(image, (0, y), (width, y), (0, 0, 0), line)
+    for k in range(cols + 1):
+        x = min(width - 1, k * cell)
+        cv2.line(image, (x, 0), (x, height), (0, 0, 0), line)
+    return image
+
+
+def rotate(image, degrees, fill=255):
+    """Gira ``image`` alrededor del centro sin cambiar su tamaño."""
+    if not degrees:
+        return image
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), degrees, 1.0)
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=(fill, fill, fill))
+
+
+def degrade(image, rng, noise=0.0, blur=0.0):
+    """Desenfoque gaussiano de sigma ``blur`` y ruido gaussiano de sigma ``noise``."""
+    if blur > 0:
+        image = cv2.GaussianBlur(image, (0, 0), blur)
+    if noise > 0:
+        image = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+    return image
+
+
+def photograph(card, rng, fill=0.5, megapixels=6, rotation=0.0):
+    """Coloca el cartón (sobre su papel) en perspectiva encima de una mesa con textura,
+    ocupando ``fill`` del encuadre de una foto 4:3 de ``megapixels``, con un dedo
+    tapando una esquina del papel."""
+    scene_h = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    scene_w = scene_h * 4 // 3
+    background = np.empty((scene_h, scene_w, 3), np.uint8)
+    background[:] = rng.integers(80, 150, 3)
+    texture = rng.integers(0, 60, (scene_h // 8 + 1, scene_w // 8 + 1), dtype=np.uint8)
+    texture = cv2.resize(cv2.GaussianBlur(texture, (0, 0), 2), (scene_w, scene_h), interpolation=cv2.INTER_LINEAR)
+    background = cv2.add(background, cv2.cvtColor(texture, cv2.COLOR_GRAY2BGR))
+
+    height, width = card.shape[:2]
+    margin = int(0.06 * width)
+    paper = np.full((height + 2 * margin, width + 2 * margin, 3), 235, np.uint8)
+    paper[margin:margin + height, margin:margin + width] = card
+    paper_h, paper_w = paper.shape[:2]
+    scale = np.sqrt(fill * scene_w * scene_h / (paper_h * paper_w))
+    centre = np.array([scene_w / 2, scene_h / 2]) + rng.uniform(-0.05, 0.05, 2) * (scene_w, scene_h)
+    angle = np.deg2rad(rotation)
+    turn = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    corners = np.float32([[0, 0], [paper_w, 0], [paper_w, paper_h], [0, paper_h]])
+    jitter = rng.uniform(-0.03, 0.03, (4, 2)) * max(paper_h, paper_w) * scale
+    target = np.float32(((corners - (paper_w / 2, paper_h / 2)) * scale) @ turn.T + centre + jitter)
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    warped = cv2.warpPerspective(paper, matrix, (scene_w, scene_h), flags=cv2.INTER_LINEAR)
+    mask = cv2.warpPerspective(np.full((paper_h, paper_w), 255, np.uint8), matrix, (scene_w, scene_h))
+    photo = np.where(mask[..., None] > 0, warped, background)
+    finger = tuple(int(v) for v in target[0])
+    axes = (int(scene_w * 0.03), int(scene_h * 0.08))
+    cv2.ellipse(photo, finger, axes, 30, 0, 360, (60, 80, 120), -1)
+    return photo
+
+
+def make_card(rng, profile="scan", rows=5, cols=5):
+    """Un cartón del perfil ``profile``.
+
+    Returns:
+        dict: ``image`` (BGR), ``truth`` (matriz de textos), ``locate`` (si hace falta
+        localizar el cartón en la foto) y ``params`` (valores sorteados).
+    """
+    ranges = PROFILES[profile]
+    params = {name: float(rng.uniform(low, high)) for name, (low, high) in ranges.items()}
+    params["cell"] = int(params["cell"])
+    truth = bingo_numbers(rng, rows, cols)
+    image = render_card(truth, params["cell"])
+    if "fill" in params:
+        image = photograph(image, rng, params["fill"], params["megapixels"], params["rotation"])
+    else:
+        image = rotate(image, params["rotation"])
+    image = degrade(image, rng, params["noise"], params["blur"])
+    return {"image": image, "truth": truth, "locate": "fill" in params, "params": params}
+
+
+def make_sheet(rng, count=6, columns=2, cell=90, photo=False, megapixels=12, rows=5, cols=5):
+    """Hoja de papel con ``count`` cartones en ``columns`` columnas y un título, como
+    las que se imprimen para jugar varios cartones a la vez.
+
+    Returns:
+        dict: ``image`` (BGR; foto de móvil de ``megapixels`` con ``photo``), ``truths``
+        (matriz de textos de cada cartón en orden de lectura) y ``boxes`` (x, y, ancho,
+        alto de cada cartón en la hoja sin fotografiar).
+    """
+    truths = [bingo_numbers(rng, rows, cols) for _ in range(count)]
+    cards = [render_card(truth, cell) for truth in truths]
+    card_h, card_w = cards[0].shape[:2]
+    gap = cell // 2
+    lines = -(-count // columns)
+    top = 2 * cell
+    page = np.full((top + lines * (card_h + gap) + gap, columns * (card_w + gap) + gap, 3), 255, np.uint8)
+    cv2.putText(page, "BINGO", (gap, top * 2 // 3), FONT, cv2.getFontScaleFromHeight(FONT, cell // 2),
+                (0, 0, 0), 3, cv2.LINE_AA)
+    cv2.line(page, (gap, top * 3 // 4), (page.shape[1] // 2, top * 3 // 4), (0, 0, 0), 2)
+    boxes = []
+    for k, card in enumerate(cards):
+        y = top + (k // columns) * (card_h + gap)
+        x = gap + (k % columns) * (card_w + gap)
+        page[y:y + card_h, x:x + card_w] = card
+        boxes.append((x, y, card_w, card_h))
+    if photo:
+        page = photograph(page, rng, fill=0.5, megapixels=megapixels, rotation=float(rng.uniform(-3, 3)))
+    return {"image": page, "truths": truths, "boxes": boxes}
+
+
+def generate(count, profile="scan", seed=0, rows=5, cols=5):
+    """``count`` cartones reproducibles (misma semilla, mismos cartones)."""
+    rng = np.random.default_rng(seed)
+    return [make_card(rng, profile, rows, cols) for _ in range(count)]
+
+
+def encode(image, ext=".jpg", quality=90):
+    """Bytes codificados de ``image`` (JPEG por defecto, como las subidas desde el móvil)."""
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext in (".jpg", ".jpeg") else []
+    ok, data = cv2.imencode(ext, image, params)
+    if not ok:
+        raise ValueError(f"No se pudo codificar la imagen como {ext}")
+    return data.tobytes()
+
+
+def write_fixtures(directory):
+    """Genera las imágenes que usa ``tests/test_processor.py``: un cartón con los
+    números 1 a 25 fila a fila y un cartón sin números."""
+    numbers = [[str(r * 5 + c + 1) for c in range(5)] for r in range(5)]
+    blank = np.full((450, 450, 3), 255, np.uint8)
+    paths = {
+        "sample_bingo_card.png": render_card(numbers, cell=90),
+        "empty_image.png": blank,
+    }
+    for name, image in paths.items():
+        cv2.imwrite(os.path.join(directory, name), image)
+    return [os.path.join(directory, name) for name in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="scan")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="directorio donde escribir los cartones y truth.json")
+    parser.add_argument("--fixtures", help="directorio donde escribir las imágenes de los tests")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        for path in write_fixtures(args.fixtures):
+            print(path)
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        manifest = []
+        for k, card in enumerate(generate(args.count, args.profile, args.seed)):
+            name = f"{args.profile}_{k:04d}.jpg"
+            with open(os.path.join(args.out, name), "wb") as fh:
+                fh.write(encode(card["image"]))
+            manifest.append({"file": name, "truth": card["truth"], "locate": card["locate"],
+                             "params": card["params"]})
+        with open(os.path.join(args.out, "truth.json"), "w") as fh:
+            json.dump(manifest, fh, indent=2)
+        print(f"{len(manifest)} cartones en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,52 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import JSONResponse, FileResponse
+import time
+# Inicio de la importación del módulo: fase "import" del arranque
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import functools
+import importlib
+import io
+import json
 import os
-import shutil
-from .processor import process_image
-import tempfile
+import random
+import uuid
+import zipfile
+from .processor import (process_image_with_stats, load_for_ocr, warm_up, pipeline_options, PIPELINE_VERSION,
+                        TARGET_CELL_HEIGHT, validate_extension, validate_grid)
+from .ocr import engine_name, ocr_available, OCR_ENGINE
+from .workers import OCRPool, PoolSaturated
+from .cache import ResultCache, image_key
+from .cellcache import get_memo
+from .jobs import store_from_env
+from .diagnostics import DiagnosticsStore, KINDS as DIAGNOSTIC_KINDS
+from .timing import span, merge, to_ms
+from . import metrics
+from .logconf import setup_logging, bind_request, unbind_request, request_id_from, verbose, dropped, request_id_var
 import logging
 from datetime import datetime
-import traceback
 import sys
-import pytesseract
 import subprocess
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Configurar logging: cola + hilo escritor, JSON por línea (LOG_LEVEL, LOG_FORMAT)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Fracción de peticiones que registran cabeceras y resultados completos, y rutas de
+# sondas que no generan línea de acceso (salvo si fallan con un 5xx distinto de 503)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+LOG_QUIET_PATHS = set(filter(None, os.getenv("LOG_QUIET_PATHS", "/health,/metrics,/livez,/readyz").split(",")))
+
 # Configurar Tesseract automáticamente
 def configure_tesseract():
-    """Detecta y configura Tesseract en diferentes entornos"""
+    """Detecta y configura Tesseract en diferentes entornos (lanza ``tesseract
+    --version``: se llama en el warm-up, no al importar)"""
+    import pytesseract
     tesseract_paths = [
         '/usr/bin/tesseract',  # Linux/Railway
         '/usr/local/bin/tesseract',  # Linux alternativo
@@ -68,8 +90,196 @@ def configure_tesseract():
         logger.error(f"    - {path}")
     return False
 
-# Configurar Tesseract al iniciar
-tesseract_available = configure_tesseract()
+def tesseract_cmd():
+    """Binario de Tesseract que usa pytesseract (None si pytesseract no se ha cargado)."""
+    module = sys.modules.get("pytesseract")
+    return module.pytesseract.tesseract_cmd if module else None
+
+# Comprobación inmediata (sin lanzar procesos ni cargar modelos); el warm-up del
+# arranque crea el motor de OCR y la confirma
+tesseract_available = ocr_available()
+
+# Motor de OCR de los workers (lo carga el warm-up): con tesserocr no hace falta el binario
+ocr_engine_name = None
+
+# Modo de OCR: "cell" (un Tesseract por celda) o "batch" (uno por cartón)
+OCR_MODE = os.getenv("OCR_MODE", "cell")
+
+# Localizar el cartón en la foto (y enderezarlo) antes de dividir la cuadrícula
+LOCATE_CARD = os.getenv("LOCATE_CARD", "0").lower() in ("1", "true", "yes")
+
+# Pool de workers para el OCR (fuera del event loop) con cola de admisión acotada
+ocr_pool = OCRPool.from_env()
+ocr_pool.on_change = metrics.observe_pool
+
+# Caché de resultados por contenido (píxeles + cuadrícula + versión de la canalización)
+result_cache = ResultCache.from_env()
+
+# Imágenes de diagnóstico de save_grid por result_id (se dibujan al pedirlas)
+diagnostics_store = DiagnosticsStore.from_env()
+
+
+# Memoria de celdas ya reconocidas (huella de la celda -> dígitos). Con OCR_EXECUTOR=process
+# cada proceso del pool tiene la suya; la de este proceso se guarda al apagar (CELL_MEMO_PATH)
+cell_memo = get_memo()
+
+# Clasificador de dígitos por plantillas antes de Tesseract (DIGIT_CLASSIFIER=0 lo desactiva)
+USE_CLASSIFIER = os.getenv("DIGIT_CLASSIFIER", "1") not in ("0", "false", "no")
+digit_classifier = None  # se construye en el warm-up (plantillas renderizadas)
+
+# Ajustes del entorno que cambian los textos detectados (umbrales del clasificador, de la
+# memoria de celdas y de confirmación): entran en la clave de la caché de resultados
+PIPELINE_OPTIONS = pipeline_options(USE_CLASSIFIER)
+
+# Arranque por fases medidas (import, startup, engine, tesseract, classifier,
+# import_<módulo>, warm_cell); /readyz solo responde 200 cuando el warm-up ha terminado bien
+startup_phases = {}
+readiness = {"status": "starting", "error": None}
+warmup_task = None
+
+# Módulos de funciones que no usa /process: no se importan con la API sino en el
+# warm-up (una fase cada uno) o en la primera petición que los necesita
+FEATURE_MODULES = ("stream", "sheet", "cards", "game")
+
+
+def feature(name):
+    """Módulo ``src.<name>`` de una función opcional, importado en el primer uso."""
+    return importlib.import_module(f".{name}", __package__)
+
+
+# Desglose por etapas: además de las peticiones con ?timings=true se mide esta fracción
+# de peticiones, y las que superan SLOW_REQUEST_SECONDS se registran con su desglose
+TIMINGS_SAMPLE_RATE = float(os.getenv("TIMINGS_SAMPLE_RATE", "0.1"))
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "2"))
+
+# Lotes (/process/batch): cartones en curso por lote, tope de cartones y de tamaño por
+# fichero del zip, y reintentos cuando el pool de OCR está lleno
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "0")) or ocr_pool.max_workers
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(25 * 1024 * 1024)))
+BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "3"))
+
+
+# Trabajos asíncronos (/jobs): almacén con TTL, cola en memoria y workers del event loop
+job_store = store_from_env()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0")) or ocr_pool.max_workers
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+job_queue = None
+job_loop = None
+job_tasks = []
+
+# Cartones registrados para comprobar marcas sin OCR (CARDS_DB: fichero SQLite); se
+# crea en el primer uso (get_card_registry)
+card_registry = None
+
+# Partidas en memoria (/games): índice de cartones para cantar números. GAMES_MAX
+# limita cuántas hay a la vez (al crear una más se descarta la más antigua)
+GAMES_MAX = int(os.getenv("GAMES_MAX", "100"))
+games = {}
+# Elementos como mucho por página en los listados de una partida (números y premios)
+GAMES_PAGE_MAX = 1000
+
+
+def get_card_registry():
+    """Registro de cartones del proceso, creado desde el entorno en el primer uso."""
+    global card_registry
+    if card_registry is None:
+        card_registry = feature("cards").CardRegistry.from_env()
+    return card_registry
+
+
+def decode_upload(contents, grid, locate=LOCATE_CARD):
+    """Decodifica la subida y calcula su clave de caché (trabajo de CPU, fuera del event loop).
+
+    Las fotos grandes se decodifican ya reducidas a la resolución del OCR
+    (TARGET_CELL_HEIGHT): menos memoria por petición y un hash más barato.
+
+    Returns:
+        tuple: (imagen, escala (sx, sy) respecto a la subida, clave)
+    """
+    metrics.UPLOAD_SIZE.observe(len(contents))
+    img, scale = load_for_ocr(contents, grid, locate)
+    if img is None:
+        return None, scale, None
+    return img, scale, image_key(img, grid, PIPELINE_VERSION, ocr_mode=OCR_MODE, locate=locate,
+                          target_cell_height=TARGET_CELL_HEIGHT, **PIPELINE_OPTIONS)
+
+
+def decode_sheet(contents, grid):
+    """Recortes de los cartones de una hoja y sus claves de caché (ver ``sheet_crops``).
+
+    Returns:
+        tuple: (recortes, cajas, claves)
+    """
+    metrics.UPLOAD_SIZE.observe(len(contents))
+    crops, boxes = feature("sheet").sheet_crops(contents, grid)
+    keys = [image_key(crop, grid, PIPELINE_VERSION, ocr_mode=OCR_MODE, locate=True,
+                      target_cell_height=TARGET_CELL_HEIGHT, **PIPELINE_OPTIONS) for crop in crops]
+    return crops, boxes, keys
+
+
+async def run_card(img, cache_key, rows, cols, diagnostics=None, locate=LOCATE_CARD,
+                   timings=None):
+    """Resultado de un cartón ya decodificado: de la caché o del pool de OCR.
+
+    Con ``timings`` (dict) se le suman las etapas de la canalización y la espera en
+    el pool ("pool_wait", incluye el envío al proceso en modo process). Con
+    ``diagnostics`` (dict) se rellena con lo necesario para dibujar las imágenes de
+    diagnóstico (ver ``process_image``).
+
+    Returns:
+        tuple: (grid, cached, ocr_paths)
+    """
+    # Las imágenes de diagnóstico exigen ejecutar la canalización: sin caché
+    use_cache = result_cache.enabled and diagnostics is None
+    with span(timings, "cache"):
+        numeros = result_cache.get(cache_key) if use_cache else None
+    if use_cache:
+        metrics.RESULT_CACHE.labels("miss" if numeros is None else "hit").inc()
+    if numeros is not None:
+        metrics.observe_card(rows * cols, cached=True)
+        return numeros, True, {"cache": rows * cols}
+    kwargs = dict(
+        grid=(rows, cols),
+        ocr_mode=OCR_MODE,
+        locate=locate,
+        memo=True,
+        classifier=USE_CLASSIFIER
+    )
+    start = time.perf_counter()
+    numeros, ocr_paths, *extra = await ocr_pool.run(
+        process_image_with_stats, img, timings=timings is not None,
+        diagnostics=diagnostics is not None, **kwargs)
+    if diagnostics is not None:
+        diagnostics.update(extra.pop())
+    if timings is not None:
+        elapsed = time.perf_counter() - start
+        stages = extra.pop()
+        merge(timings, stages)
+        timings["pool_wait"] = timings.get("pool_wait", 0.0) + max(0.0, elapsed - sum(stages.values()))
+    metrics.observe_card(rows * cols)
+    if use_cache:
+        result_cache.put(cache_key, numeros)
+    return numeros, False, ocr_paths
+
+
+def _read_zip_entry(archive, info):
+    if info.file_size > BATCH_MAX_FILE_BYTES:
+        raise ValueError(f"Archivo demasiado grande ({info.file_size} bytes)")
+    return archive.read(info)
+
+
+def open_zip(contents):
+    """Lista (nombre, lector) de los ficheros de un zip; cada lector descomprime su
+    fichero al llamarlo, para no tener el lote entero descomprimido en memoria."""
+    archive = zipfile.ZipFile(io.BytesIO(contents))
+    entries = []
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+            continue
+        entries.append((name, functools.partial(_read_zip_entry, archive, info)))
+    return entries
 
 app = FastAPI(
     title="Bingo OCR API",
@@ -106,42 +316,63 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
-# Middleware para logging de todas las requests
+# Middleware de logging: una línea estructurada por petición
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    request_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-    
-    # Log detallado del request entrante
-    logger.info(f"📨 [{request_id}] ===== INCOMING REQUEST =====")
-    logger.info(f"  Method: {request.method}")
-    logger.info(f"  URL: {request.url}")
-    logger.info(f"  Path: {request.url.path}")
-    logger.info(f"  Client: {request.client.host if request.client else 'Unknown'}:{request.client.port if request.client else 'Unknown'}")
-    logger.info(f"  Origin: {request.headers.get('origin', 'NO ORIGIN HEADER')}")
-    logger.info(f"  Referer: {request.headers.get('referer', 'NO REFERER')}")
-    logger.info(f"  User-Agent: {request.headers.get('user-agent', 'NO USER-AGENT')}")
-    logger.info(f"  Content-Type: {request.headers.get('content-type', 'NO CONTENT-TYPE')}")
-    logger.info(f"  All Headers: {dict(request.headers)}")
-    
+    # Se respeta el X-Request-ID del proxy o del cliente para poder correlacionar,
+    # salvo que traiga caracteres que no deben llegar a los logs
+    request_id = request_id_from(request.headers.get("x-request-id"))
+    tokens = bind_request(request_id, LOG_SAMPLE_RATE)
+    request.state.request_id = request_id
+    # Los endpoints añaden aquí sus campos (fichero, cuadrícula, caché, ...)
+    request.state.log = {}
+    start = time.perf_counter()
+    status = 500
     try:
         response = await call_next(request)
-        
-        # Log del response
-        logger.info(f"📤 [{request_id}] ===== RESPONSE =====")
-        logger.info(f"  Status: {response.status_code}")
-        logger.info(f"  Headers: {dict(response.headers)}")
-        
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
         return response
     except Exception as e:
-        logger.error(f"❌ [{request_id}] ===== ERROR =====")
-        logger.error(f"  Exception: {str(e)}")
-        logger.error(f"  Type: {type(e).__name__}")
-        logger.error(f"  Traceback:\n{traceback.format_exc()}")
+        logger.exception(f"❌ Unhandled {type(e).__name__} on {request.method} {request.url.path}: {e}")
         raise
+    finally:
+        # Las sondas solo se registran si fallan (503 = aún no lista u ocupada, no fallo)
+        if request.url.path not in LOG_QUIET_PATHS or (status >= 500 and status != 503):
+            fields = {
+                "method": request.method,
+                "path": request.url.path,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "client": request.client.host if request.client else None,
+                "origin": request.headers.get("origin"),
+                **request.state.log,
+            }
+            if verbose():
+                fields["headers"] = dict(request.headers)
+            logger.info(f"{request.method} {request.url.path} {status}", extra={"fields": fields})
+        unbind_request(tokens)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Etiqueta por ruta (plantilla), no por URL: /jobs/{job_id} es una sola serie
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        metrics.REQUEST_LATENCY.labels(request.method, endpoint, str(status)).observe(
+            time.perf_counter() - start)
 
 # Log de startup
 @app.on_event("startup")
 async def startup_event():
+    global warmup_task
+    started = time.perf_counter()
     logger.info("=" * 50)
     logger.info("🚀 BINGO OCR API STARTING")
     logger.info("=" * 50)
@@ -149,25 +380,93 @@ async def startup_event():
     logger.info(f"  Port: {os.getenv('PORT', '8000')}")
     logger.info(f"  CORS Origins: {origins}")
     logger.info(f"  Python: {sys.version}")
-    logger.info(f"  Tesseract: {'✅ Available' if tesseract_available else '❌ NOT FOUND'}")
-    if tesseract_available:
-        logger.info(f"    Path: {pytesseract.pytesseract.tesseract_cmd}")
+    logger.info(f"  OCR engine: {OCR_ENGINE} (se carga en el warm-up)")
+    logger.info(f"  OCR pool: {ocr_pool.stats()}")
+    logger.info(f"  OCR mode: {OCR_MODE}, locate card: {LOCATE_CARD}, target cell height: {TARGET_CELL_HEIGHT}")
+    logger.info(f"  Result cache: {result_cache.stats()}")
+    logger.info(f"  Timings: sample rate {TIMINGS_SAMPLE_RATE}, slow request >= {SLOW_REQUEST_SECONDS}s")
+    logger.info(f"  Logging: level {logging.getLevelName(logging.getLogger().level)}, "
+                f"verbose sample rate {LOG_SAMPLE_RATE}, quiet paths {sorted(LOG_QUIET_PATHS)}")
+    logger.info(f"  Cell memo: {cell_memo.stats()}")
+    logger.info(f"  Jobs: {job_store.stats()}, workers: {JOB_WORKERS}")
+    logger.info(f"  Digit classifier: {'enabled' if USE_CLASSIFIER else 'disabled'}")
+    start_job_workers()
     logger.info("=" * 50)
-    if tesseract_available:
-        logger.info("✅ API READY TO ACCEPT REQUESTS")
-    else:
-        logger.warning("⚠️ API STARTED BUT TESSERACT NOT AVAILABLE")
+    record_startup_phase("startup", time.perf_counter() - started)
+    # El warm-up corre en segundo plano: /livez responde ya y /readyz cuando termine
+    warmup_task = asyncio.ensure_future(warm_up_service())
+
+def record_startup_phase(phase, seconds):
+    startup_phases[phase] = seconds
+    metrics.STARTUP_PHASE.labels(phase).set(seconds)
+    logger.info(f"⏱️ Startup phase {phase}: {seconds * 1000:.1f} ms",
+                extra={"fields": {"phase": phase, "duration_ms": round(seconds * 1000, 2)}})
+
+async def warm_up_service():
+    """Carga el motor de OCR, el clasificador y procesa un cartón sintético en cada
+    worker del pool; marca el servicio como listo (/readyz) si todo va bien."""
+    global tesseract_available, ocr_engine_name, digit_classifier
+
+    async def phase(name, fn, *args):
+        start = time.perf_counter()
+        result = await run_in_threadpool(fn, *args)
+        record_startup_phase(name, time.perf_counter() - start)
+        return result
+
+    try:
+        # El modelo se carga en cada worker del pool (tesserocr guarda uno por hilo)
+        ocr_engine_name = (await phase("engine", ocr_pool.warm_up, engine_name))[0]
+        if ocr_engine_name == "tesserocr":
+            tesseract_available = True
+        else:
+            tesseract_available = await phase("tesseract", configure_tesseract)
+        if not tesseract_available:
+            raise RuntimeError("Tesseract no disponible")
+        if USE_CLASSIFIER:
+            digit_classifier = await phase("classifier", feature("classifier").get_classifier)
+        for name in FEATURE_MODULES:
+            await phase(f"import_{name}", feature, name)
+        texts = await phase("warm_cell", ocr_pool.warm_up, warm_up)
+        if any(text != ["2", "7"] for text in texts):
+            logger.warning(f"⚠️ Warm-up card read as {texts}, expected ['2', '7']")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        readiness.update(status="failed", error=str(e))
+        logger.exception(f"❌ Warm-up failed: {e}")
         logger.warning("   OCR requests will fail until Tesseract is installed")
-    logger.info("=" * 50)
+        return
+    readiness["status"] = "ready"
+    total = sum(startup_phases.values())
+    logger.info(f"✅ API READY TO ACCEPT REQUESTS (engine {ocr_engine_name}, cold start {total:.2f}s)",
+                extra={"fields": {"startup_ms": to_ms(startup_phases)}})
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("🛑 Bingo OCR API shutting down...")
+    metrics.mark_process_dead()
+    if warmup_task is not None:
+        warmup_task.cancel()
+    for task in job_tasks:
+        task.cancel()
+    ocr_pool.shutdown()
+    memo_path = os.getenv("CELL_MEMO_PATH")
+    if memo_path and cell_memo.enabled:
+        try:
+            cell_memo.save(memo_path)
+            logger.info(f"💾 Cell memo saved to {memo_path}: {cell_memo.stats()}")
+        except Exception as e:
+            logger.error(f"❌ Could not save cell memo: {e}")
+    bank_path = os.getenv("DIGIT_BANK_PATH")
+    if bank_path and digit_classifier is not None:
+        try:
+            digit_classifier.save(bank_path)
+            logger.info(f"💾 Digit templates saved to {bank_path}: {digit_classifier.stats()}")
+        except Exception as e:
+            logger.error(f"❌ Could not save digit templates: {e}")
 
 @app.get("/")
 async def root(request: Request):
-    logger.info("✅ Root endpoint accessed")
-    logger.info(f"  Origin: {request.headers.get('origin', 'NO ORIGIN')}")
     return {
         "message": "Bingo OCR API",
         "version": "1.0.0",
@@ -176,7 +475,22 @@ async def root(request: Request):
         "endpoints": {
             "/": "GET - Información de la API",
             "/health": "GET - Verificar estado del servicio",
+            "/livez": "GET - Sonda de vida",
+            "/readyz": "GET - Sonda de disponibilidad (200 tras el warm-up)",
             "/process": "POST - Procesar imagen de cartón de bingo",
+            "/process/batch": "POST - Procesar muchos cartones (imágenes o zip), respuesta NDJSON",
+            "/process/sheet": "POST - Procesar una hoja con varios cartones (uno por región detectada)",
+            "/jobs": "POST - Encolar un cartón y devolver el id del trabajo",
+            "/jobs/{job_id}": "GET - Estado y resultado de un trabajo",
+            "/results/{result_id}/grid.png": "GET - Cuadrícula de diagnóstico (save_grid=true)",
+            "/results/{result_id}/bw.png": "GET - Máscara de celdas de diagnóstico (save_grid=true)",
+            "/stream": "WebSocket - Frames de vídeo de un cartón, responde con las celdas que cambian",
+            "/cards": "POST - Registrar un cartón (OCR una sola vez)",
+            "/cards/{card_id}/marks": "POST - Celdas marcadas en una foto de un cartón registrado, sin OCR",
+            "/games": "POST - Crear una partida",
+            "/games/{game_id}/cards": "POST - Añadir cartones (grids o ids de cartones registrados)",
+            "/games/{game_id}/calls": "POST - Cantar un número (premios nuevos); GET - Números cantados (paginado)",
+            "/games/{game_id}/winners": "GET - Premios de la partida (paginado)",
             "/docs": "GET - Documentación interactiva",
             "/redoc": "GET - Documentación alternativa"
         }
@@ -184,12 +498,9 @@ async def root(request: Request):
 
 @app.get("/health")
 async def health_check(request: Request):
-    logger.info("❤️ Health check endpoint accessed")
-    logger.info(f"  Origin: {request.headers.get('origin', 'NO ORIGIN')}")
-    
     # Verificar estado de Tesseract
     tesseract_status = "available" if tesseract_available else "not_found"
-    tesseract_path = pytesseract.pytesseract.tesseract_cmd if tesseract_available else None
+    tesseract_path = tesseract_cmd() if tesseract_available else None
     
     health_data = {
         "status": "healthy" if tesseract_available else "degraded",
@@ -199,19 +510,51 @@ async def health_check(request: Request):
         "environment": os.getenv("ENVIRONMENT", "development"),
         "tesseract": {
             "status": tesseract_status,
-            "path": tesseract_path
-        }
+            "path": tesseract_path,
+            "engine": ocr_engine_name
+        },
+        "workers": ocr_pool.stats(),
+        "cache": result_cache.stats(),
+        "diagnostics": diagnostics_store.stats(),
+        "cell_memo": cell_memo.stats(),
+        "classifier": digit_classifier.stats() if digit_classifier else None,
+        "jobs": {**job_store.stats(), "pending_in_queue": job_queue.qsize() if job_queue else 0},
+        "cards": card_registry.stats() if card_registry else None,
+        "games": {"active": len(games), "max": GAMES_MAX},
+        "logging": {"dropped": dropped()}
     }
-    logger.info(f"  Response: {health_data}")
     return health_data
 
+@app.get("/livez")
+async def liveness():
+    """Sonda de vida: el proceso responde (el event loop no está bloqueado)."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness_probe():
+    """Sonda de disponibilidad: 200 solo cuando el warm-up ha terminado bien (motor de
+    OCR cargado y cartón de prueba procesado); 503 mientras arranca o si falló."""
+    body = {**readiness, "startup_ms": to_ms(startup_phases)}
+    if readiness["status"] != "ready":
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métricas en formato de texto de Prometheus (agregadas entre workers si
+    PROMETHEUS_MULTIPROC_DIR está definido)."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.post("/process")
 async def process_bingo_card(
     request: Request,
     file: UploadFile = File(...),
     rows: int = 5,
     cols: int = 5,
-    save_grid: bool = False
+    save_grid: bool = False,
+    locate: Optional[bool] = None,
+    timings: bool = False
 ):
     """
     Procesa una imagen de cartón de bingo y extrae los números.
@@ -221,138 +564,737 @@ async def process_bingo_card(
         rows: Número de filas (default: 5)
         cols: Número de columnas (default: 5)
         save_grid: Si es True, devuelve también las imágenes con cuadrícula
+        locate: Si es True, localiza y endereza el cartón antes de dividirlo
+            (default: LOCATE_CARD)
+        timings: Si es True, la respuesta incluye el desglose por etapas en ms
     
     Returns:
         JSON con los números detectados
     """
     start_time = datetime.now()
-    request_id = start_time.strftime("%Y%m%d%H%M%S%f")
-    
-    logger.info(f"🎯 [{request_id}] ===== PROCESSING REQUEST =====")
-    logger.info(f"  Filename: {file.filename}")
-    logger.info(f"  Content-Type: {file.content_type}")
-    logger.info(f"  Grid size: {rows}x{cols}")
-    logger.info(f"  Save grid: {save_grid}")
-    logger.info(f"  Origin: {request.headers.get('origin', 'NO ORIGIN')}")
-    logger.info(f"  Tesseract available: {tesseract_available}")
+    request_id = request.state.request_id
+    if locate is None:
+        locate = LOCATE_CARD
+    # Campos de la línea de acceso de esta petición (ver log_requests)
+    log_fields = request.state.log
+    log_fields.update(filename=file.filename, grid=f"{rows}x{cols}", locate=locate, save_grid=save_grid)
+    # Desglose por etapas si se pide o si la petición cae en la muestra
+    spans = {} if timings or random.random() < TIMINGS_SAMPLE_RATE else None
     
     # Verificar que Tesseract está disponible
     if not tesseract_available:
-        logger.error(f"❌ [{request_id}] Tesseract not available")
+        logger.error("❌ Tesseract not available")
         raise HTTPException(
             status_code=503,
             detail="Tesseract OCR no está disponible. Contacta al administrador del sistema."
         )
     
-    # Validar tipo de archivo
-    allowed_extensions = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff']
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    # Validar tipo de archivo y dimensiones (mismas reglas que process_image)
+    try:
+        file_ext = validate_extension(file.filename)
+        validate_grid(rows, cols)
+    except ValueError as e:
+        logger.warning(f"⚠️ Invalid request: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if file_ext not in allowed_extensions:
-        logger.warning(f"⚠️ [{request_id}] Invalid file extension: {file_ext}")
+    # Leer el archivo subido en memoria (sin copiarlo a disco)
+    try:
+        with span(spans, "read"):
+            contents = await file.read()
+        log_fields["bytes"] = len(contents)
+    except Exception as e:
+        logger.exception(f"❌ Error reading file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error leyendo archivo: {str(e)}")
+
+    if not contents:
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+
+    # Decodificar una única vez con cv2.imdecode y calcular la clave, fuera del event loop
+    with span(spans, "decode"):
+        img, scale, cache_key = await run_in_threadpool(decode_upload, contents, (rows, cols), locate)
+    if img is None:
+        logger.warning("⚠️ Could not decode image")
+        raise HTTPException(status_code=400, detail="No se pudo decodificar la imagen")
+
+    # Procesar imagen
+    try:
+        # Las imágenes de diagnóstico no se dibujan aquí: se guarda lo necesario y se
+        # generan al pedirlas en GET /results/{result_id}/grid.png y bw.png
+        diagnostics = {} if save_grid and diagnostics_store.enabled else None
+        numeros, cached, ocr_paths = await run_card(img, cache_key, rows, cols, diagnostics, locate, spans)
+        processing_time = (datetime.now() - start_time).total_seconds()
+        log_fields.update(cached=cached, ocr_paths=ocr_paths, processing_ms=round(processing_time * 1000, 2))
+        # La matriz completa solo en las peticiones de la muestra detallada
+        if verbose():
+            log_fields["result"] = numeros
+
+        response = {
+            "success": True,
+            "filename": file.filename,
+            "grid": numeros,
+            "dimensions": {
+                "rows": len(numeros),
+                "cols": len(numeros[0]) if numeros else 0
+            },
+            "processing_time_seconds": processing_time,
+            "cached": cached,
+            "ocr_paths": ocr_paths,
+            "request_id": request_id
+        }
+
+        # Si se solicitó guardar la cuadrícula. Las imágenes se guardan con un id
+        # propio del servidor: el X-Request-ID lo elige el cliente y puede repetirse
+        if diagnostics is not None:
+            result_id = uuid.uuid4().hex
+            diagnostics_store.put(result_id, img, scale, diagnostics)
+            response["images"] = {
+                "result_id": result_id,
+                "grid_available": True,
+                "bw_available": True,
+                "grid_url": f"/results/{result_id}/grid.png",
+                "bw_url": f"/results/{result_id}/bw.png"
+            }
+
+        if spans is not None:
+            breakdown = to_ms(spans)
+            breakdown["total"] = round(processing_time * 1000, 2)
+            if ocr_paths.get("tesseract") and "ocr" in breakdown:
+                breakdown["ocr_per_cell"] = round(breakdown["ocr"] / ocr_paths["tesseract"], 2)
+            metrics.observe_stages(spans)
+            if timings:
+                response["timings_ms"] = breakdown
+            if processing_time >= SLOW_REQUEST_SECONDS:
+                logger.warning(f"🐢 Slow request ({processing_time:.2f}s)", extra={"fields": {"timings_ms": breakdown}})
+
+        return JSONResponse(content=response)
+
+    except PoolSaturated as e:
+        logger.warning(f"⏳ OCR pool saturated: {ocr_pool.stats()}")
         raise HTTPException(
-            status_code=400,
-            detail=f"Formato de archivo no permitido. Use: {', '.join(allowed_extensions)}"
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except FileNotFoundError as e:
+        logger.error(f"❌ File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        logger.exception(f"❌ Runtime error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.exception(f"❌ Unexpected {type(e).__name__}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error procesando imagen: {str(e)}")
+
+@app.post("/process/sheet")
+async def process_sheet(
+    request: Request,
+    file: UploadFile = File(...),
+    rows: int = 5,
+    cols: int = 5
+):
+    """
+    Procesa la foto de una hoja con varios cartones (3-6 por página, por ejemplo).
+
+    Cada cartón se localiza en una copia reducida de la hoja y su recorte pasa por
+    la canalización de un cartón; todos se envían a la vez al pool de OCR, así que la
+    hoja tarda poco más que un cartón suelto. Devuelve un grid por cartón, en orden
+    de lectura, con su caja ``[x, y, ancho, alto]`` en la foto original.
+    """
+    start_time = datetime.now()
+    log_fields = request.state.log
+    log_fields.update(filename=file.filename, grid=f"{rows}x{cols}")
+    if not tesseract_available:
+        raise HTTPException(
+            status_code=503,
+            detail="Tesseract OCR no está disponible. Contacta al administrador del sistema."
+        )
+    try:
+        validate_extension(file.filename)
+        validate_grid(rows, cols)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+    log_fields["bytes"] = len(contents)
+    try:
+        crops, boxes, keys = await run_in_threadpool(decode_sheet, contents, (rows, cols))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not crops:
+        raise HTTPException(status_code=422, detail="No se encontró ningún cartón en la hoja")
+
+    # Como mucho un cartón por worker a la vez: la hoja no ocupa la cola de admisión
+    semaphore = asyncio.Semaphore(ocr_pool.max_workers)
+
+    async def read_card(crop, key):
+        async with semaphore:
+            return await run_card(crop, key, rows, cols, locate=True)
+
+    try:
+        results = await asyncio.gather(*(read_card(crop, key) for crop, key in zip(crops, keys)))
+    except PoolSaturated as e:
+        logger.warning(f"⏳ OCR pool saturated: {ocr_pool.stats()}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.exception(f"❌ Sheet processing failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error procesando imagen: {str(e)}")
+
+    processing_time = (datetime.now() - start_time).total_seconds()
+    log_fields.update(cards=len(crops), processing_ms=round(processing_time * 1000, 2))
+    return {
+        "success": True,
+        "filename": file.filename,
+        "dimensions": {"rows": rows, "cols": cols},
+        "cards": [
+            {"index": index, "grid": numeros, "box": box, "cached": cached, "ocr_paths": ocr_paths}
+            for index, ((numeros, cached, ocr_paths), box) in enumerate(zip(results, boxes))
+        ],
+        "processing_time_seconds": processing_time,
+        "request_id": request.state.request_id
+    }
+
+async def _batch_card(index, filename, contents, rows, cols, semaphore):
+    """Procesa un cartón de un lote y devuelve su línea de resultado (nunca lanza)."""
+    start = time.perf_counter()
+    line = {"index": index, "filename": filename}
+    try:
+        validate_extension(filename)
+        async with semaphore:
+            if callable(contents):
+                contents = await run_in_threadpool(contents)
+            if not contents:
+                raise ValueError("El archivo está vacío")
+            img, _scale, cache_key = await run_in_threadpool(decode_upload, contents, (rows, cols))
+            if img is None:
+                raise ValueError("No se pudo decodificar la imagen")
+            # Si el pool está lleno por otras peticiones, el lote espera en lugar de fallar
+            for attempt in range(BATCH_RETRIES + 1):
+                try:
+                    numeros, cached, ocr_paths = await run_card(img, cache_key, rows, cols)
+                    break
+                except PoolSaturated as e:
+                    if attempt == BATCH_RETRIES:
+                        raise
+                    await asyncio.sleep(e.retry_after)
+        line.update({
+            "success": True,
+            "grid": numeros,
+            "dimensions": {"rows": len(numeros), "cols": len(numeros[0]) if numeros else 0},
+            "cached": cached,
+            "ocr_paths": ocr_paths,
+        })
+    except (ValueError, zipfile.BadZipFile) as e:
+        line.update({"success": False, "status": 400, "error": str(e)})
+    except PoolSaturated as e:
+        line.update({"success": False, "status": 503, "error": str(e)})
+    except Exception as e:
+        logger.exception(f"❌ Batch card {index} ({filename}) failed: {str(e)}")
+        line.update({"success": False, "status": 500, "error": f"Error procesando imagen: {str(e)}"})
+    line["processing_time_seconds"] = round(time.perf_counter() - start, 4)
+    return line
+
+@app.post("/process/batch")
+async def process_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    rows: int = 5,
+    cols: int = 5
+):
+    """
+    Procesa muchos cartones en una sola petición (varias imágenes o un zip).
+    
+    Los cartones se reparten por el pool de OCR (como mucho BATCH_CONCURRENCY a la vez
+    por lote) y la respuesta es NDJSON: una línea por cartón en cuanto termina, con
+    ``index`` (posición en el lote) y ``filename``. Un cartón que falla produce una
+    línea con ``success: false``, ``status`` y ``error`` sin afectar al resto.
+    """
+    if not tesseract_available:
+        logger.error("❌ Tesseract not available")
+        raise HTTPException(
+            status_code=503,
+            detail="Tesseract OCR no está disponible. Contacta al administrador del sistema."
         )
+    try:
+        validate_grid(rows, cols)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    logger.info(f"✅ [{request_id}] File extension valid: {file_ext}")
+    items = []
+    for upload in files:
+        contents = await upload.read()
+        if (upload.filename or "").lower().endswith(".zip"):
+            try:
+                items.extend(await run_in_threadpool(open_zip, contents))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"Zip no válido: {upload.filename}")
+        else:
+            items.append((upload.filename, contents))
     
-    # Validar dimensiones
-    if rows < 1 or rows > 10 or cols < 1 or cols > 10:
-        logger.warning(f"⚠️ [{request_id}] Invalid grid dimensions: {rows}x{cols}")
+    if not items:
+        raise HTTPException(status_code=400, detail="El lote no contiene imágenes")
+    if len(items) > BATCH_MAX_FILES:
         raise HTTPException(
             status_code=400,
-            detail="Las dimensiones del grid deben estar entre 1 y 10"
+            detail=f"Demasiados cartones en el lote ({len(items)}); máximo {BATCH_MAX_FILES}"
         )
+    request.state.log.update(cards=len(items), grid=f"{rows}x{cols}")
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
     
-    # Crear directorio temporal para procesar la imagen
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        temp_input_path = os.path.join(tmp_dir, f"input{file_ext}")
-        
+    async def stream_results():
+        tasks = [
+            asyncio.ensure_future(_batch_card(index, name, contents, rows, cols, semaphore))
+            for index, (name, contents) in enumerate(items)
+        ]
+        failed = 0
         try:
-            # Guardar archivo subido temporalmente
-            logger.info(f"💾 [{request_id}] Saving uploaded file to: {temp_input_path}")
-            with open(temp_input_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            file_size = os.path.getsize(temp_input_path)
-            logger.info(f"✅ [{request_id}] File saved successfully. Size: {file_size} bytes")
-            
-        except Exception as e:
-            logger.error(f"❌ [{request_id}] Error saving file: {str(e)}")
-            logger.error(f"  Traceback:\n{traceback.format_exc()}")
-            raise HTTPException(status_code=500, detail=f"Error guardando archivo: {str(e)}")
-        
-        # Procesar imagen
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                failed += not line["success"]
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            # La respuesta se envía en streaming: la línea de acceso sale antes que esta
+            logger.info(f"📊 Batch finished: {len(items) - failed} ok, {failed} failed",
+                        extra={"fields": {"cards": len(items), "failed": failed}})
+        finally:
+            # Si el cliente corta la conexión, no seguir encolando cartones
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+async def job_worker():
+    """Saca trabajos de la cola, los ejecuta en el pool de OCR y guarda el resultado."""
+    while True:
+        job_id, img, cache_key, rows, cols, request_id = await job_queue.get()
+        metrics.JOBS_QUEUED.dec()
+        metrics.JOBS_RUNNING.inc()
+        # Los logs del trabajo llevan el id de la petición que lo creó
+        token = request_id_var.set(request_id)
         try:
-            logger.info(f"🔄 [{request_id}] Starting OCR processing...")
-            
-            save_grid_path = None
-            if save_grid:
-                save_grid_path = os.path.join(tmp_dir, "grid.png")
-                logger.info(f"  Grid will be saved to: {save_grid_path}")
-            
-            numeros = process_image(
-                temp_input_path,
-                grid=(rows, cols),
-                save_grid_path=save_grid_path
-            )
-            
-            logger.info(f"✅ [{request_id}] OCR processing completed successfully")
-            logger.info(f"  Detected grid:\n{numeros}")
-            
-            processing_time = (datetime.now() - start_time).total_seconds()
-            
-            response = {
-                "success": True,
-                "filename": file.filename,
+            job_store.update(job_id, status="running", started_at=time.time())
+            while True:
+                try:
+                    numeros, cached, ocr_paths = await run_card(img, cache_key, rows, cols)
+                    break
+                except PoolSaturated as e:
+                    # El pool está lleno por peticiones síncronas: el trabajo espera su turno
+                    await asyncio.sleep(e.retry_after)
+            job_store.update(job_id, status="done", finished_at=time.time(), result={
                 "grid": numeros,
-                "dimensions": {
-                    "rows": len(numeros),
-                    "cols": len(numeros[0]) if numeros else 0
-                },
-                "processing_time_seconds": processing_time,
-                "request_id": request_id
-            }
-            
-            # Si se solicitó guardar la cuadrícula
-            if save_grid and save_grid_path and os.path.exists(save_grid_path):
-                base, ext = os.path.splitext(save_grid_path)
-                bw_path = f"{base}_bw{ext}"
-                
-                response["images"] = {
-                    "grid_available": os.path.exists(save_grid_path),
-                    "bw_available": os.path.exists(bw_path)
-                }
-            
-            logger.info(f"📊 [{request_id}] Response prepared. Processing time: {processing_time:.2f}s")
-            return JSONResponse(content=response)
-            
-        except FileNotFoundError as e:
-            logger.error(f"❌ [{request_id}] File not found: {str(e)}")
-            raise HTTPException(status_code=404, detail=str(e))
-        except RuntimeError as e:
-            logger.error(f"❌ [{request_id}] Runtime error: {str(e)}")
-            logger.error(f"  Traceback:\n{traceback.format_exc()}")
-            raise HTTPException(status_code=500, detail=str(e))
+                "dimensions": {"rows": len(numeros), "cols": len(numeros[0]) if numeros else 0},
+                "cached": cached,
+                "ocr_paths": ocr_paths,
+            })
+        except asyncio.CancelledError:
+            job_store.update(job_id, status="failed", finished_at=time.time(),
+                             error="Servidor apagándose")
+            raise
         except Exception as e:
-            logger.error(f"❌ [{request_id}] Unexpected error: {str(e)}")
-            logger.error(f"  Type: {type(e).__name__}")
-            logger.error(f"  Traceback:\n{traceback.format_exc()}")
-            raise HTTPException(status_code=500, detail=f"Error procesando imagen: {str(e)}")
+            logger.exception(f"❌ Job {job_id} failed: {str(e)}")
+            job_store.update(job_id, status="failed", finished_at=time.time(),
+                             error=f"Error procesando imagen: {str(e)}")
+        finally:
+            metrics.JOBS_RUNNING.dec()
+            request_id_var.reset(token)
+            job_queue.task_done()
+
+def start_job_workers():
+    """Arranca los workers de trabajos (en el startup o en el primer POST /jobs).
+
+    Cola y workers pertenecen al event loop en curso; si cambia (p. ej. al reiniciar
+    la app en el mismo proceso), se crean de nuevo.
+    """
+    global job_queue, job_loop
+    loop = asyncio.get_running_loop()
+    if job_queue is None or job_loop is not loop:
+        job_loop = loop
+        job_queue = asyncio.Queue(maxsize=JOB_QUEUE_SIZE)
+        job_tasks.clear()
+    if not job_tasks:
+        job_tasks.extend(asyncio.ensure_future(job_worker()) for _ in range(JOB_WORKERS))
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    request: Request,
+    file: UploadFile = File(...),
+    rows: int = 5,
+    cols: int = 5
+):
+    """
+    Encola un cartón y devuelve al instante el id del trabajo.
+    
+    El resultado se consulta con GET /jobs/{job_id}; la conexión no queda abierta
+    mientras corre el OCR.
+    """
+    if not tesseract_available:
+        raise HTTPException(
+            status_code=503,
+            detail="Tesseract OCR no está disponible. Contacta al administrador del sistema."
+        )
+    try:
+        validate_extension(file.filename)
+        validate_grid(rows, cols)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+    img, _scale, cache_key = await run_in_threadpool(decode_upload, contents, (rows, cols))
+    if img is None:
+        raise HTTPException(status_code=400, detail="No se pudo decodificar la imagen")
+    
+    start_job_workers()
+    if job_queue.full():
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor ocupado: cola de trabajos llena",
+            headers={"Retry-After": str(ocr_pool.retry_after)}
+        )
+    job = job_store.create(file.filename, rows, cols)
+    job_queue.put_nowait((job["id"], img, cache_key, rows, cols, request.state.request_id))
+    metrics.JOBS_QUEUED.inc()
+    request.state.log.update(job_id=job["id"], filename=file.filename, grid=f"{rows}x{cols}",
+                             queue=job_queue.qsize())
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Estado de un trabajo: queued, running, done (con ``result``) o failed (con ``error``)."""
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o caducado")
+    return job
+
+@app.get("/results/{result_id}/{kind}.png")
+async def get_diagnostic_image(result_id: str, kind: str):
+    """Imagen de diagnóstico de una petición con ``save_grid=true``: ``grid`` (foto
+    original con la cuadrícula) o ``bw`` (máscara de las celdas limpias).
+
+    Se dibuja y codifica en PNG la primera vez que se pide; caduca a los
+    DIAGNOSTICS_TTL segundos.
+    """
+    if kind not in DIAGNOSTIC_KINDS:
+        raise HTTPException(status_code=404, detail=f"Imagen no disponible: {kind}.png")
+    data = await run_in_threadpool(diagnostics_store.png, result_id, kind)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Resultado no encontrado o caducado")
+    return Response(content=data, media_type="image/png",
+                    headers={"Cache-Control": "private, max-age=600"})
+
+@app.post("/cards", status_code=201)
+async def register_card(
+    request: Request,
+    file: UploadFile = File(...),
+    rows: int = 5,
+    cols: int = 5,
+    locate: Optional[bool] = None
+):
+    """
+    Registra un cartón a partir de una foto sin marcar: lee sus números (OCR, una
+    sola vez) y guarda su geometría y su aspecto para comprobar después las marcas
+    con POST /cards/{card_id}/marks.
+    """
+    if locate is None:
+        locate = LOCATE_CARD
+    if not tesseract_available:
+        raise HTTPException(
+            status_code=503,
+            detail="Tesseract OCR no está disponible. Contacta al administrador del sistema."
+        )
+    try:
+        validate_extension(file.filename)
+        validate_grid(rows, cols)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+    img, _scale, cache_key = await run_in_threadpool(decode_upload, contents, (rows, cols), locate)
+    if img is None:
+        raise HTTPException(status_code=400, detail="No se pudo decodificar la imagen")
+    try:
+        (numeros, _cached, ocr_paths), profile = await asyncio.gather(
+            run_card(img, cache_key, rows, cols, locate=locate),
+            run_in_threadpool(feature("cards").card_profile, contents, (rows, cols), locate),
+        )
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.exception(f"❌ Card registration failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error procesando imagen: {str(e)}")
+
+    card_id = get_card_registry().register(numeros, profile)
+    request.state.log.update(card_id=card_id, grid=f"{rows}x{cols}", ocr_paths=ocr_paths)
+    return {
+        "card_id": card_id,
+        "grid": numeros,
+        "dimensions": {"rows": rows, "cols": cols},
+        "located": profile["located"],
+        "marks_url": f"/cards/{card_id}/marks",
+    }
+
+@app.get("/cards/{card_id}")
+async def get_card(card_id: str):
+    card = get_card_registry().get(card_id)
+    if card is None:
+        raise HTTPException(status_code=404, detail="Cartón no registrado")
+    return {
+        "card_id": card_id,
+        "grid": card["grid"],
+        "dimensions": {"rows": card["rows"], "cols": card["cols"]},
+        "located": card["located"],
+        "created_at": card["created_at"],
+    }
+
+@app.delete("/cards/{card_id}", status_code=204)
+async def delete_card(card_id: str):
+    if not get_card_registry().delete(card_id):
+        raise HTTPException(status_code=404, detail="Cartón no registrado")
+    return Response(status_code=204)
+
+@app.post("/cards/{card_id}/marks")
+async def card_marks(request: Request, card_id: str, file: UploadFile = File(...)):
+    """
+    Celdas marcadas en una nueva foto de un cartón registrado.
+
+    La foto se alinea con la del registro y cada celda se decide por su aumento de
+    tinta oscura o de color respecto al cartón sin marcar: sin OCR, en milisegundos.
+    Responde 422 si la foto no parece del cartón registrado.
+    """
+    start = time.perf_counter()
+    cards = feature("cards")
+    card = get_card_registry().get(card_id)
+    if card is None:
+        raise HTTPException(status_code=404, detail="Cartón no registrado")
+    try:
+        validate_extension(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+    try:
+        result = await run_in_threadpool(cards.check_marks, contents, card)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except cards.CardMismatch as e:
+        request.state.log.update(card_id=card_id, layout_difference=round(e.difference, 3))
+        raise HTTPException(status_code=422, detail=str(e))
+    processing_ms = round((time.perf_counter() - start) * 1000, 2)
+    request.state.log.update(card_id=card_id, marked=len(result["marked"]), processing_ms=processing_ms)
+    return {"card_id": card_id, **result, "processing_ms": processing_ms}
+
+class GameCard(BaseModel):
+    card_id: str
+    grid: List[List[str]]
+
+
+class GameCards(BaseModel):
+    cards: List[GameCard] = []
+    card_ids: List[str] = []
+
+
+def get_game(game_id):
+    game = games.get(game_id)
+    if game is None:
+        raise HTTPException(status_code=404, detail="Partida no encontrada")
+    return game
+
+@app.post("/games", status_code=201)
+async def create_game(rows: int = 5, cols: int = 5, patterns: Optional[str] = None):
+    """
+    Crea una partida vacía. ``patterns`` limita los premios (separados por comas:
+    row, column, diagonal, full; por defecto todos).
+    """
+    try:
+        validate_grid(rows, cols)
+        game_module = feature("game")
+        game = game_module.Game((rows, cols), tuple(patterns.split(",")) if patterns else game_module.PATTERNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    while len(games) >= GAMES_MAX:
+        games.pop(next(iter(games)))
+    game_id = uuid.uuid4().hex
+    games[game_id] = game
+    return {"game_id": game_id, **game.stats()}
+
+@app.get("/games/{game_id}")
+async def get_game_state(game_id: str):
+    """
+    Resumen de una partida: contadores y último número cantado. Los números cantados
+    y los premios se listan por páginas en ``links``.
+    """
+    game = get_game(game_id)
+    called = game.called
+    return {"game_id": game_id, **game.stats(), "last_number": called[-1] if called else None,
+            "links": {"calls": f"/games/{game_id}/calls", "winners": f"/games/{game_id}/winners"}}
+
+def game_page(name, items, offset, limit):
+    """Página ``[offset, offset + limit)`` del listado ``items`` de una partida, bajo la
+    clave ``name`` (400 si la página no es válida)."""
+    if offset < 0 or not 1 <= limit <= GAMES_PAGE_MAX:
+        raise HTTPException(status_code=400,
+                            detail=f"offset debe ser >= 0 y limit estar entre 1 y {GAMES_PAGE_MAX}")
+    return {"total": len(items), "offset": offset, "limit": limit, name: items[offset:offset + limit]}
+
+@app.get("/games/{game_id}/calls")
+async def get_game_calls(game_id: str, offset: int = 0, limit: int = 100):
+    """Números cantados, en orden, por páginas (``offset``, ``limit``)."""
+    page = game_page("called_numbers", get_game(game_id).called, offset, limit)
+    return {"game_id": game_id, **page}
+
+@app.get("/games/{game_id}/winners")
+async def get_game_winners(game_id: str, offset: int = 0, limit: int = 100):
+    """Premios en el orden en que se consiguieron, por páginas (``offset``, ``limit``)."""
+    page = game_page("winners", get_game(game_id).winners, offset, limit)
+    return {"game_id": game_id, **page}
+
+@app.delete("/games/{game_id}", status_code=204)
+async def delete_game(game_id: str):
+    get_game(game_id)
+    games.pop(game_id, None)
+    return Response(status_code=204)
+
+@app.post("/games/{game_id}/cards")
+async def add_game_cards(request: Request, game_id: str, body: GameCards):
+    """
+    Añade cartones a una partida: con su ``grid`` (como lo devuelve /process) o por
+    ``card_ids`` de cartones registrados en /cards. Si la partida ya ha empezado, los
+    cartones nuevos reciben los números cantados y se devuelven los premios que ya tengan.
+    """
+    game = get_game(game_id)
+    cards = {card.card_id: card.grid for card in body.cards}
+    for card_id in body.card_ids:
+        card = get_card_registry().get(card_id)
+        if card is None:
+            raise HTTPException(status_code=404, detail=f"Cartón no registrado: {card_id}")
+        cards[card_id] = card["grid"]
+    if len(cards) != len(body.cards) + len(body.card_ids):
+        raise HTTPException(status_code=400, detail="Hay cartones repetidos en la petición")
+    try:
+        winners = await run_in_threadpool(game.add_cards, cards)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    request.state.log.update(game_id=game_id, cards_added=len(cards))
+    return {"game_id": game_id, "added": len(cards), "cards": len(game), "winners": winners}
+
+@app.post("/games/{game_id}/calls")
+async def call_number(request: Request, game_id: str, number: int):
+    """
+    Canta un número. Solo se actualizan los cartones que lo tienen; la respuesta
+    lista los premios (línea, columna, diagonal, cartón lleno) que completa.
+    """
+    game = get_game(game_id)
+    start = time.perf_counter()
+    winners = await run_in_threadpool(game.call, number)
+    processing_ms = round((time.perf_counter() - start) * 1000, 3)
+    request.state.log.update(game_id=game_id, number=number, winners=len(winners), processing_ms=processing_ms)
+    return {"game_id": game_id, "number": number, "called": len(game.called), "winners": winners,
+            "processing_ms": processing_ms}
+
+@app.get("/games/{game_id}/cards/{card_id}")
+async def get_game_card(game_id: str, card_id: str):
+    game = get_game(game_id)
+    try:
+        marks = game.marks(card_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="El cartón no está en la partida")
+    return {"game_id": game_id, "card_id": card_id, "marks": marks, "won": game.won(card_id)}
+
+async def _receive_frames(websocket, mailbox, counts):
+    """Recibe frames sin esperar al OCR: en ``mailbox`` (tamaño 1) solo queda el más
+    reciente, y los que se pisan antes de procesarse cuentan como descartados. Al
+    desconectarse el cliente deja ``None``."""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("bytes")
+            if not data:
+                continue
+            if mailbox.full():
+                mailbox.get_nowait()
+                counts["dropped"] += 1
+                metrics.STREAM_FRAMES.labels("dropped").inc()
+            mailbox.put_nowait(data)
+    finally:
+        if mailbox.full():
+            mailbox.get_nowait()
+        mailbox.put_nowait(None)
+
+@app.websocket("/stream")
+async def stream_card(websocket: WebSocket, rows: int = 5, cols: int = 5, locate: Optional[bool] = None):
+    """Modo de vídeo: el cliente envía frames (mensajes binarios JPEG/PNG) de un mismo
+    cartón y recibe por cada frame procesado un JSON con las celdas que cambiaron
+    (ver ``CellTracker.commit``) y los frames descartados hasta entonces.
+
+    Solo las celdas cuya imagen cambió pasan por el OCR. Si llegan frames más rápido
+    de lo que se procesan, se procesa siempre el último y los intermedios se
+    descartan, igual que si el pool de OCR está lleno.
+    """
+    await websocket.accept()
+    if locate is None:
+        locate = LOCATE_CARD
+    try:
+        tracker = feature("stream").CellTracker((rows, cols), locate=locate)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    if not tesseract_available:
+        await websocket.close(code=1011, reason="Tesseract OCR no está disponible")
+        return
+
+    tokens = bind_request(request_id_from(websocket.headers.get("x-request-id")))
+    mailbox = asyncio.Queue(maxsize=1)
+    counts = {"dropped": 0}
+    receiver = asyncio.create_task(_receive_frames(websocket, mailbox, counts))
+    metrics.STREAMS_OPEN.inc()
+    logger.info("🎥 Stream opened", extra={"fields": {"grid": f"{rows}x{cols}", "locate": locate}})
+    try:
+        while (frame := await mailbox.get()) is not None:
+            try:
+                image, cells = await run_in_threadpool(tracker.observe, frame)
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+            detected = None
+            if cells:
+                try:
+                    detected, _ocr_paths = await ocr_pool.run(
+                        process_image_with_stats, image, grid=tracker.grid, ocr_mode=OCR_MODE,
+                        target_cell_height=0, cells=cells, memo=True, classifier=USE_CLASSIFIER)
+                except PoolSaturated:
+                    # Sin commit, las celdas siguen distintas de su última lectura y se
+                    # leen en el siguiente frame
+                    counts["dropped"] += 1
+                    metrics.STREAM_FRAMES.labels("dropped").inc()
+                    continue
+            delta = tracker.commit(detected)
+            delta["dropped"] = counts["dropped"]
+            metrics.STREAM_FRAMES.labels("processed").inc()
+            await websocket.send_json(delta)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.exception(f"❌ Stream error: {str(e)}")
+        await websocket.close(code=1011, reason=f"{type(e).__name__}: {e}"[:120])
+    finally:
+        receiver.cancel()
+        metrics.STREAMS_OPEN.dec()
+        logger.info("🎥 Stream closed", extra={"fields": {
+            "frames": tracker.frames, "dropped": counts["dropped"], "cells_read": tracker.cells_read}})
+        unbind_request(tokens)
 
 # Handler global de excepciones
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error("=" * 50)
-    logger.error("🔥 GLOBAL EXCEPTION HANDLER")
-    logger.error("=" * 50)
-    logger.error(f"  Exception: {str(exc)}")
-    logger.error(f"  Type: {type(exc).__name__}")
-    logger.error(f"  Request: {request.method} {request.url}")
-    logger.error(f"  Origin: {request.headers.get('origin', 'NO ORIGIN')}")
-    logger.error(f"  Traceback:\n{traceback.format_exc()}")
-    logger.error("=" * 50)
+    logger.error(f"🔥 Unhandled {type(exc).__name__} on {request.method} {request.url.path}: {str(exc)}",
+                 exc_info=exc)
     
     return JSONResponse(
         status_code=500,
@@ -365,6 +1307,8 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
+record_startup_phase("import", time.perf_counter() - _IMPORT_STARTED)
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
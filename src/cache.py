@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def image_key(image, grid, version, **options):
+    """Clave de contenido de un cartón: hash de los píxeles decodificados más la
+    forma de la imagen, la cuadrícula, la versión de la canalización y las opciones.
+
+    Dos subidas del mismo cartón (aunque cambie el nombre o la compresión sin
+    pérdida) producen la misma clave.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((image.shape, str(image.dtype), tuple(grid), version,
+                        sorted(options.items()))).encode())
+    digest.update(np.ascontiguousarray(image))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Caché en memoria acotada en número de entradas y en antigüedad (TTL).
+
+    ``max_size=0`` la desactiva; ``ttl=None`` hace que las entradas no caduquen.
+    """
+
+    def __init__(self, max_size=256, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    """Almacén de resultados en un fichero SQLite compartido entre procesos.
+
+    Los valores se guardan como JSON. Varios workers de uvicorn pueden abrir el
+    mismo fichero: el modo WAL deja leer mientras otro proceso escribe.
+
+    El fichero se recorta a ``max_size`` solo cuando pasa de ``max_size`` más un
+    ``TRIM_SLACK``, y los caducados se borran como mucho cada ``purge_interval``
+    segundos (``get`` ya ignora los caducados), no en cada ``put``.
+    """
+
+    # Holgura sobre max_size antes de recortar (fracción)
+    TRIM_SLACK = 0.1
+
+    def __init__(self, path, max_size=10000, ttl=None, purge_interval=60):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+        # Filas estimadas: cada put cuenta una y se recuentan al recortar o purgar
+        # (otros procesos también escriben en el fichero)
+        self._rows = self._count()
+        self._last_purge = time.monotonic()
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return default
+        value, created = row
+        if self.ttl is not None and time.time() - created > self.ttl:
+            return default
+        return json.loads(value)
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now),
+            )
+            self._rows += 1
+            if self.ttl is not None and time.monotonic() - self._last_purge >= self.purge_interval:
+                self._last_purge = time.monotonic()
+                self._conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+                self._rows = self._count()
+            if self._rows > self.max_size * (1 + self.TRIM_SLACK):
+                # Recortar lo que sobre del límite, empezando por lo más antiguo
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results"
+                    " ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,),
+                )
+                self._rows = self._count()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._rows = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._count()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResultCache:
+    """Caché de resultados de OCR: LRU en memoria delante de un ``SQLiteStore`` opcional.
+
+    Lleva la cuenta de aciertos y fallos para exponerla en ``/health``.
+    """
+
+    def __init__(self, max_size=256, ttl=3600, db_path=None, db_max_size=10000):
+        self.memory = LRUCache(max_size, ttl)
+        self.store = None
+        if db_path and max_size > 0:
+            self.store = SQLiteStore(db_path, db_max_size, ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Crea la caché a partir de RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_DB
+        y RESULT_CACHE_DB_SIZE."""
+        ttl = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+        return cls(
+            max_size=int(os.getenv("RESULT_CACHE_SIZE", "256")),
+            ttl=ttl if ttl > 0 else None,
+            db_path=os.getenv("RESULT_CACHE_DB") or None,
+            db_max_size=int(os.getenv("RESULT_CACHE_DB_SIZE", "10000")),
+        )
+
+    @property
+    def enabled(self):
+        return self.memory.max_size > 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.store is not None:
+            value = self.store.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.store is not None:
+            self.store.put(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": "sqlite" if self.store is not None else "memory",
+            "enabled": self.enabled,
+            "entries": len(self.memory),
+            "max_size": self.memory.max_size,
+            "ttl_seconds": self.memory.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
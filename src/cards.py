@@ -0,0 +1,312 @@
+"""Registro de cartones ya leídos y comprobación de marcas sin OCR.
+
+Al registrar un cartón (sin marcar) se guardan su geometría (líneas de la rejilla en
+una imagen canónica de ``CELL_SIZE`` px por celda), sus números, una huella de su
+diseño (miniaturas de las celdas, ver ``stream.cell_thumbnails``) y la tinta y el
+color de cada celda. En las fotos siguientes del mismo cartón solo se endereza la
+imagen a ese tamaño canónico y se comparan, para todas las celdas a la vez, la
+fracción de tinta oscura y de color saturado con las del registro: una celda con
+bastante más de cualquiera de las dos está marcada (rotulador, tinta de bingo o
+ficha). Ningún paso pasa por el OCR.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+from .preproc import detect_card, detect_grid_lines, estimated_cell_height, preprocess_image
+from .processor import LOCATE_CARD_FRACTION, grid_edges, validate_grid
+from .stream import THUMB_MARGIN, THUMB_SIZE, cell_differences, cell_thumbnails
+from .utils import load_image, read_image_size
+
+# Alto y ancho (px) de cada celda en la imagen canónica del cartón
+CELL_SIZE = 48
+
+# Fracción de cada lado de la celda que se descarta al medir tinta y color (líneas de
+# la rejilla, letra de la columna y pequeños errores de alineación)
+CELL_INSET = 0.15
+
+# Píxeles de color: saturación y brillo mínimos (HSV de OpenCV, 0-255)
+COLOUR_SATURATION = 80
+COLOUR_VALUE = 50
+# Píxeles de tinta: más oscuros que esta fracción del papel y sin color
+INK_LEVEL = 0.55
+
+# Aumento mínimo de la fracción de tinta o de color de una celda para darla por marcada
+MARK_INK_DELTA = float(os.getenv("MARK_INK_DELTA", "0.12"))
+MARK_COLOUR_DELTA = float(os.getenv("MARK_COLOUR_DELTA", "0.12"))
+
+# Diferencia de diseño (mediana por celda, ver ``cell_differences``) a partir de la
+# cual la foto no se considera del cartón registrado
+LAYOUT_MAX_DIFFERENCE = float(os.getenv("CARD_LAYOUT_MAX_DIFFERENCE", "0.2"))
+
+# Ajuste fino de cada foto sobre la imagen del registro (``cv2.findTransformECC``):
+# iteraciones, tolerancia y correlación mínima para aceptar el ajuste
+ECC_ITERATIONS = 50
+ECC_EPSILON = 1e-4
+ECC_MIN_CORRELATION = 0.5
+
+# Reducciones en color que OpenCV aplica durante la decodificación (ver preproc)
+_REDUCED_COLOR = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                  (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+_FIELDS = ("id", "rows", "cols", "located", "ys", "xs", "grid", "ink", "colour", "fingerprint",
+           "image", "created_at")
+
+
+class CardMismatch(Exception):
+    """La foto no corresponde al cartón registrado."""
+
+    def __init__(self, difference):
+        super().__init__(f"La foto no corresponde al cartón registrado (diferencia {difference:.2f})")
+        self.difference = difference
+
+
+def decode_colour(source, grid=(5, 5), locate=False, cell_size=CELL_SIZE):
+    """Imagen en color (BGR) decodificada ya reducida si las celdas salen al menos el
+    doble de altas que ``cell_size``, o ``None`` si no se puede decodificar."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            source = fh.read()
+    image = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        size = read_image_size(source)
+        if size is not None:
+            cell = estimated_cell_height(*size, *grid, LOCATE_CARD_FRACTION if locate else 1.0)
+            for factor, flag in _REDUCED_COLOR:
+                if cell / factor >= cell_size:
+                    image = load_image(source, flag)
+                    break
+    if image is None:
+        image = load_image(source)
+    if image is not None and image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image
+
+
+def _corners(size):
+    width, height = size
+    return np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+
+
+def align_card(source, grid=(5, 5), locate=False, cell_size=CELL_SIZE):
+    """Cartón en color enderezado a la imagen canónica (rows * cell_size x cols * cell_size).
+
+    Con ``locate`` se localiza el cartón (``detect_card``) y se endereza al doble del
+    tamaño canónico; ahí se buscan las líneas exteriores de la rejilla, como en
+    ``process_image`` (lo localizado puede ser el papel, o un dedo puede deformar el
+    contorno), y la foto se lleva al tamaño canónico con una sola transformación. Si
+    no se encuentra el cartón, o sin ``locate``, se escala la foto entera.
+
+    Returns:
+        tuple: (imagen BGR o ``None`` si no se puede decodificar, si se localizó el cartón)
+    """
+    image = decode_colour(source, grid, locate, cell_size)
+    if image is None:
+        return None, False
+    rows, cols = grid
+    size = (cols * cell_size, rows * cell_size)
+    quad = detect_card(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)) if locate else None
+    if quad is None:
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA), False
+
+    big = (2 * size[0], 2 * size[1])
+    matrix = cv2.getPerspectiveTransform(np.asarray(quad, np.float32), _corners(big))
+    warped = cv2.cvtColor(cv2.warpPerspective(image, matrix, big, flags=cv2.INTER_LINEAR,
+                                              borderMode=cv2.BORDER_REPLICATE), cv2.COLOR_BGR2GRAY)
+    ys, xs = detect_grid_lines(preprocess_image(warped), rows, cols)
+    inner = None
+    if ys is not None and xs is not None:
+        top, bottom = ys[0], min(ys[-1], big[1] - 1)
+        left, right = xs[0], min(xs[-1], big[0] - 1)
+        inner = np.float32([[left, top], [right, top], [right, bottom], [left, bottom]])
+    else:
+        inner = detect_card(warped, min_area=0.5)
+    if inner is not None:
+        matrix = cv2.getPerspectiveTransform(np.asarray(inner, np.float32), _corners(big)) @ matrix
+    matrix = cv2.getPerspectiveTransform(_corners(big), _corners(size)) @ matrix
+    return cv2.warpPerspective(image, matrix, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE), True
+
+
+def refine_alignment(reference, gray):
+    """Homografía que lleva ``gray`` sobre ``reference`` (dos imágenes canónicas en
+    gris del mismo cartón), o ``None`` si el ajuste no converge o no es fiable."""
+    matrix = np.eye(3, dtype=np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, ECC_ITERATIONS, ECC_EPSILON)
+    try:
+        correlation, matrix = cv2.findTransformECC(reference, gray, matrix, cv2.MOTION_HOMOGRAPHY, criteria,
+                                                   None, 5)
+    except cv2.error:
+        return None
+    return matrix if correlation >= ECC_MIN_CORRELATION else None
+
+
+def inner_boxes(ys, xs, inset=CELL_INSET):
+    """Zona central (xa, ya, xb, yb) de cada celda, fila a fila, como array (N, 4)."""
+    ys, xs = np.asarray(ys, np.float64), np.asarray(xs, np.float64)
+    y0, y1 = ys[:-1], ys[1:]
+    x0, x1 = xs[:-1], xs[1:]
+    pad_y, pad_x = (y1 - y0) * inset, (x1 - x0) * inset
+    ya, yb = np.round(y0 + pad_y), np.round(y1 - pad_y)
+    xa, xb = np.round(x0 + pad_x), np.round(x1 - pad_x)
+    rows, cols = len(y0), len(x0)
+    boxes = np.stack([np.tile(xa, rows), np.repeat(ya, cols), np.tile(xb, rows), np.repeat(yb, cols)], axis=1)
+    return boxes.astype(np.int64)
+
+
+def cell_fractions(mask, boxes):
+    """Fracción de píxeles de ``mask`` (0/1) dentro de cada caja, con la imagen integral."""
+    integral = cv2.integral(mask)
+    xa, ya, xb, yb = boxes.T
+    count = integral[yb, xb] - integral[ya, xb] - integral[yb, xa] + integral[ya, xa]
+    return count / np.maximum(1, (xb - xa) * (yb - ya))
+
+
+def ink_and_colour(card, ys, xs):
+    """Fracción de tinta oscura y de color saturado de cada celda (dos arrays (N,))."""
+    hsv = cv2.cvtColor(card, cv2.COLOR_BGR2HSV)
+    saturation, value = hsv[..., 1], hsv[..., 2]
+    colour = (saturation >= COLOUR_SATURATION) & (value >= COLOUR_VALUE)
+    # El nivel del papel (percentil alto del brillo) compensa la exposición de la foto
+    paper = float(np.percentile(value, 90))
+    ink = (value < INK_LEVEL * paper) & ~colour
+    boxes = inner_boxes(ys, xs)
+    return cell_fractions(ink.astype(np.uint8), boxes), cell_fractions(colour.astype(np.uint8), boxes)
+
+
+def card_profile(source, grid=(5, 5), locate=False):
+    """Geometría, huella del diseño y tinta/color por celda de una foto de cartón.
+
+    Returns:
+        dict|None: ``ys``, ``xs`` (líneas en la imagen canónica), ``located``,
+        ``image`` (imagen canónica en gris), ``fingerprint`` (miniaturas de las
+        celdas), ``ink`` y ``colour`` (fracción por celda), o ``None`` si la imagen no
+        se puede decodificar.
+    """
+    validate_grid(*grid)
+    card, located = align_card(source, grid, locate)
+    if card is None:
+        return None
+    rows, cols = grid
+    gray = cv2.cvtColor(card, cv2.COLOR_BGR2GRAY)
+    ys, xs = grid_edges(*gray.shape, rows, cols, detect_grid_lines(preprocess_image(gray), rows, cols))
+    ink, colour = ink_and_colour(card, ys, xs)
+    return {"ys": ys, "xs": xs, "located": located, "image": gray, "fingerprint": cell_thumbnails(gray, grid),
+            "ink": ink, "colour": colour}
+
+
+def check_marks(source, card):
+    """Celdas marcadas en una foto de un cartón registrado (``CardRegistry.get``).
+
+    La foto se endereza como en el registro, se ajusta sobre la imagen del registro
+    (``refine_alignment``) y se compara con él: primero la huella del diseño (la
+    mediana por celda, para que las marcas no cuenten) y después la tinta y el color
+    de cada celda.
+
+    Returns:
+        dict: ``marks`` (matriz de bool), ``marked`` (números de las celdas
+        marcadas), ``scores`` (aumento de tinta o color por celda, 1 es el umbral),
+        ``located``, ``aligned`` (si se pudo ajustar sobre el registro) y
+        ``layout_difference``.
+
+    Raises:
+        ValueError: si la imagen no se puede decodificar.
+        CardMismatch: si el diseño no coincide con el del cartón registrado.
+    """
+    rows, cols = card["rows"], card["cols"]
+    image, located = align_card(source, (rows, cols), card["located"])
+    if image is None:
+        raise ValueError("No se pudo decodificar la imagen")
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    matrix = refine_alignment(card["image"], gray)
+    if matrix is not None:
+        size = gray.shape[::-1]
+        flags = cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP
+        image = cv2.warpPerspective(image, matrix, size, flags=flags, borderMode=cv2.BORDER_REPLICATE)
+        gray = cv2.warpPerspective(gray, matrix, size, flags=flags, borderMode=cv2.BORDER_REPLICATE)
+    difference = float(np.median(cell_differences(cell_thumbnails(gray, (rows, cols)), card["fingerprint"])))
+    if difference > LAYOUT_MAX_DIFFERENCE:
+        raise CardMismatch(difference)
+
+    ink, colour = ink_and_colour(image, card["ys"], card["xs"])
+    ink_delta, colour_delta = ink - card["ink"], colour - card["colour"]
+    marked = (ink_delta > MARK_INK_DELTA) | (colour_delta > MARK_COLOUR_DELTA)
+    scores = np.maximum(ink_delta / MARK_INK_DELTA, colour_delta / MARK_COLOUR_DELTA).clip(0)
+    grid = card["grid"]
+    return {
+        "marks": marked.reshape(rows, cols).tolist(),
+        "marked": [grid[i // cols][i % cols] for i in np.flatnonzero(marked) if grid[i // cols][i % cols]],
+        "scores": scores.reshape(rows, cols).round(2).tolist(),
+        "located": located,
+        "aligned": matrix is not None,
+        "layout_difference": round(difference, 3),
+    }
+
+
+class CardRegistry:
+    """Cartones registrados en SQLite (``:memory:`` por defecto, o un fichero
+    compartido por todos los workers de uvicorn)."""
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cards ("
+            " id TEXT PRIMARY KEY, rows INTEGER NOT NULL, cols INTEGER NOT NULL, located INTEGER NOT NULL,"
+            " ys TEXT NOT NULL, xs TEXT NOT NULL, grid TEXT NOT NULL, ink BLOB NOT NULL,"
+            " colour BLOB NOT NULL, fingerprint BLOB NOT NULL, image BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    @classmethod
+    def from_env(cls):
+        """Crea el registro en CARDS_DB (en memoria del proceso si no está definido)."""
+        return cls(os.getenv("CARDS_DB") or ":memory:")
+
+    def register(self, grid, profile):
+        """Guarda un cartón con sus números (``grid``) y su ``card_profile``; devuelve su id."""
+        card_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO cards ({', '.join(_FIELDS)}) VALUES ({', '.join('?' * len(_FIELDS))})",
+                (card_id, len(grid), len(grid[0]), int(profile["located"]), json.dumps(profile["ys"]),
+                 json.dumps(profile["xs"]), json.dumps(grid), profile["ink"].astype(np.float32).tobytes(),
+                 profile["colour"].astype(np.float32).tobytes(),
+                 profile["fingerprint"].astype(np.float16).tobytes(),
+                 cv2.imencode(".png", profile["image"])[1].tobytes(), time.time()),
+            )
+        return card_id
+
+    def get(self, card_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_FIELDS)} FROM cards WHERE id = ?",
+                                     (card_id,)).fetchone()
+        if row is None:
+            return None
+        card = dict(zip(_FIELDS, row))
+        side = THUMB_SIZE - 2 * THUMB_MARGIN
+        fingerprint = np.frombuffer(card["fingerprint"], np.float16).astype(np.float32)
+        card.update(
+            located=bool(card["located"]), ys=json.loads(card["ys"]), xs=json.loads(card["xs"]),
+            grid=json.loads(card["grid"]), ink=np.frombuffer(card["ink"], np.float32),
+            colour=np.frombuffer(card["colour"], np.float32),
+            fingerprint=fingerprint.reshape(card["rows"], card["cols"], side, side),
+            image=cv2.imdecode(np.frombuffer(card["image"], np.uint8), cv2.IMREAD_GRAYSCALE),
+        )
+        return card
+
+    def delete(self, card_id):
+        with self._lock:
+            return self._conn.execute("DELETE FROM cards WHERE id = ?", (card_id,)).rowcount > 0
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "cards": count}
@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lado de la huella en píxeles (FINGERPRINT_SIZE**2 bits por celda)
+FINGERPRINT_SIZE = 16
+
+# Bits a 1 de cada byte, para contar distancias de Hamming con una sola indexación
+_POPCOUNT = np.array([bin(v).count("1") for v in range(256)], np.uint8)
+
+
+def fingerprint(cell_bw):
+    """Huella binaria de una celda limpia (binaria, de cualquier polaridad).
+
+    La tinta es el nivel minoritario de la celda. Se recorta a su rectángulo mínimo,
+    se centra en un cuadrado (conserva la proporción), se reduce a
+    FINGERPRINT_SIZE x FINGERPRINT_SIZE y se empaquetan los bits. Así la huella no
+    depende del tamaño de la celda ni de dónde cae el número.
+    Devuelve ``None`` si la celda no tiene tinta.
+    """
+    ink = cv2.compare(cell_bw, 128, cv2.CMP_LT)
+    if 2 * cv2.countNonZero(ink) > ink.size:
+        ink = cv2.bitwise_not(ink)
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return None
+    x, y, w, h = cv2.boundingRect(points)
+    side = max(w, h)
+    square = np.zeros((side, side), np.uint8)
+    ox, oy = (side - w) // 2, (side - h) // 2
+    square[oy:oy + h, ox:ox + w] = ink[y:y + h, x:x + w]
+    small = cv2.resize(square, (FINGERPRINT_SIZE, FINGERPRINT_SIZE), interpolation=cv2.INTER_AREA)
+    return np.packbits(small >= 128).tobytes()
+
+
+class CellMemo:
+    """Memoria de celdas ya reconocidas: huella de la celda -> texto de Tesseract.
+
+    Una búsqueda acierta si hay una huella idéntica o a distancia de Hamming
+    ``<= max_distance`` y la vecina más cercana con otro texto está claramente más
+    lejos (si dos textos distintos empatan, se prefiere volver a pasar por Tesseract).
+    La capacidad es fija; al llenarse se reemplaza la entrada usada hace más tiempo.
+    """
+
+    def __init__(self, capacity=4096, max_distance=4):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        nbytes = FINGERPRINT_SIZE * FINGERPRINT_SIZE // 8
+        self._bits = np.zeros((max(capacity, 0), nbytes), np.uint8)
+        self._texts = [None] * max(capacity, 0)
+        # Identificador numérico de cada texto, para comparar textos de forma vectorizada
+        self._labels = np.zeros(max(capacity, 0), np.int32)
+        self._label_ids = {}
+        self._last_used = np.zeros(max(capacity, 0), np.int64)
+        self._index = {}
+        self._size = 0
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def env_options():
+        """Argumentos del constructor según CELL_MEMO_SIZE y CELL_MEMO_DISTANCE."""
+        return {
+            "capacity": int(os.getenv("CELL_MEMO_SIZE", "4096")),
+            "max_distance": int(os.getenv("CELL_MEMO_DISTANCE", "4")),
+        }
+
+    @classmethod
+    def from_env(cls):
+        """Crea la memoria desde ``env_options`` y carga CELL_MEMO_PATH si el fichero existe."""
+        memo = cls(**cls.env_options())
+        path = os.getenv("CELL_MEMO_PATH")
+        if path and os.path.exists(path):
+            try:
+                memo.load(path)
+                logger.info(f"Memoria de celdas cargada: {memo._size} entradas de {path}")
+            except Exception as e:
+                logger.warning(f"No se pudo cargar la memoria de celdas {path}: {e}")
+        return memo
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def lookup(self, key):
+        """Texto memorizado para la huella ``key`` o ``None``."""
+        if key is None or not self.enabled:
+            return None
+        with self._lock:
+            self._tick += 1
+            slot = self._index.get(key)
+            if slot is None and self._size:
+                slot = self._nearest(np.frombuffer(key, np.uint8))
+            if slot is None:
+                self.misses += 1
+                metrics.CELL_MEMO.labels("miss").inc()
+                return None
+            self.hits += 1
+            metrics.CELL_MEMO.labels("hit").inc()
+            self._last_used[slot] = self._tick
+            return self._texts[slot]
+
+    def _nearest(self, bits):
+        distances = _POPCOUNT[np.bitwise_xor(self._bits[:self._size], bits)].sum(axis=1, dtype=np.int32)
+        slot = int(distances.argmin())
+        best = distances[slot]
+        if best > self.max_distance:
+            return None
+        # Rechazar si otro texto está casi tan cerca: la huella es ambigua
+        rivals = distances[self._labels[:self._size] != self._labels[slot]]
+        if rivals.size and rivals.min() <= best + self.max_distance:
+            return None
+        return slot
+
+    def add(self, key, text):
+        """Memoriza ``text`` para la huella ``key``. Se ignoran las celdas sin tinta y
+        los textos vacíos o que no son un número."""
+        if key is None or not text or not text.isascii() or not text.isdigit() or not self.enabled:
+            return
+        with self._lock:
+            self._tick += 1
+            slot = self._index.get(key)
+            if slot is None:
+                if self._size < self.capacity:
+                    slot = self._size
+                    self._size += 1
+                else:
+                    slot = int(self._last_used.argmin())
+                    del self._index[self._bits[slot].tobytes()]
+                self._bits[slot] = np.frombuffer(key, np.uint8)
+                self._index[key] = slot
+            self._texts[slot] = text
+            self._labels[slot] = self._label_ids.setdefault(text, len(self._label_ids))
+            self._last_used[slot] = self._tick
+
+    def stats(self):
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, self._size
+        lookups = hits + misses
+        return {
+            "entries": size,
+            "capacity": self.capacity,
+            "max_distance": self.max_distance,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def save(self, path):
+        """Guarda las entradas en ``path`` (npz), escribiendo primero a un temporal."""
+        with self._lock:
+            size = self._size
+            bits = self._bits[:size].copy()
+            texts = np.array(self._texts[:size], dtype=str)
+            last_used = self._last_used[:size].copy()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fh:
+            np.savez(fh, bits=bits, texts=texts, last_used=last_used)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Carga entradas guardadas con ``save``; si sobran, se quedan las más recientes."""
+        with np.load(path) as data:
+            bits, texts, last_used = data["bits"], data["texts"], data["last_used"]
+        if bits.shape[1:] != self._bits.shape[1:]:
+            raise ValueError("Tamaño de huella incompatible")
+        order = np.argsort(last_used)[::-1][:self.capacity]
+        with self._lock:
+            self._index.clear()
+            self._size = len(order)
+            self._bits[:self._size] = bits[order]
+            self._texts = [str(t) for t in texts[order]] + [None] * (self.capacity - self._size)
+            self._label_ids = {}
+            for slot in range(self._size):
+                self._labels[slot] = self._label_ids.setdefault(self._texts[slot], len(self._label_ids))
+            # Conservar el orden LRU relativo, por debajo del reloj actual
+            self._last_used[:self._size] = np.arange(self._size, 0, -1) - self._size
+            for slot in range(self._size):
+                self._index[self._bits[slot].tobytes()] = slot
+
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def get_memo():
+    """Memoria de celdas del proceso, creada en el primer uso desde el entorno."""
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                _memo = CellMemo.from_env()
+    return _memo
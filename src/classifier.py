@@ -0,0 +1,230 @@
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Lado de la plantilla normalizada de cada dígito
+TEMPLATE_SIZE = 20
+
+# Fuentes Hershey de OpenCV con las que se generan las plantillas iniciales (sin ficheros)
+_FONTS = (
+    cv2.FONT_HERSHEY_SIMPLEX,
+    cv2.FONT_HERSHEY_DUPLEX,
+    cv2.FONT_HERSHEY_COMPLEX,
+    cv2.FONT_HERSHEY_TRIPLEX,
+    cv2.FONT_HERSHEY_PLAIN,
+)
+
+
+def ink_mask(cell_bw):
+    """Máscara de tinta (255) de una celda binaria: el nivel minoritario."""
+    ink = cv2.compare(cell_bw, 128, cv2.CMP_LT)
+    if 2 * cv2.countNonZero(ink) > ink.size:
+        ink = cv2.bitwise_not(ink)
+    return ink
+
+
+def segment_digits(cell_bw, min_height=0.5):
+    """Separa una celda en componentes con forma de dígito, de izquierda a derecha.
+
+    Se descartan las componentes más bajas que ``min_height`` veces la más alta
+    (restos de ruido o de la rejilla). Componentes que se solapan en horizontal
+    se unen (dígitos rotos en dos trozos).
+
+    Returns:
+        list[np.ndarray]: recortes binarios (255 = tinta) de cada dígito.
+    """
+    ink = ink_mask(cell_bw)
+    num, _labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    if num <= 1:
+        return []
+    stats = stats[1:]
+    tallest = stats[:, cv2.CC_STAT_HEIGHT].max()
+    keep = stats[(stats[:, cv2.CC_STAT_HEIGHT] >= min_height * tallest)
+                 & (stats[:, cv2.CC_STAT_AREA] >= 4)]
+    boxes = []
+    for x, y, w, h, _area in keep[np.argsort(keep[:, cv2.CC_STAT_LEFT])]:
+        if boxes and x < boxes[-1][2]:
+            bx, by, bx2, by2 = boxes[-1]
+            boxes[-1] = [bx, min(by, y), max(bx2, x + w), max(by2, y + h)]
+        else:
+            boxes.append([x, y, x + w, y + h])
+    return [ink[y:y2, x:x2] for x, y, x2, y2 in boxes]
+
+
+def normalise(crop):
+    """Centra el recorte en un cuadrado, lo reduce a TEMPLATE_SIZE y devuelve el
+    vector de norma 1 (para comparar por similitud coseno)."""
+    h, w = crop.shape
+    side = max(h, w)
+    square = np.zeros((side, side), np.uint8)
+    oy, ox = (side - h) // 2, (side - w) // 2
+    square[oy:oy + h, ox:ox + w] = crop
+    small = cv2.resize(square, (TEMPLATE_SIZE, TEMPLATE_SIZE), interpolation=cv2.INTER_AREA)
+    vector = small.astype(np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def render_digit_templates(heights=(24, 40, 64)):
+    """Plantillas (vectores, etiquetas) de los dígitos 0-9 con las fuentes Hershey."""
+    vectors, labels = [], []
+    for font in _FONTS:
+        for height in heights:
+            scale = cv2.getFontScaleFromHeight(font, height)
+            for thickness in (max(1, height // 16), max(2, height // 8)):
+                for digit in "0123456789":
+                    canvas = np.full((height * 2, height * 2), 255, np.uint8)
+                    cv2.putText(canvas, digit, (height // 2, height * 3 // 2),
+                                font, scale, 0, thickness, cv2.LINE_AA)
+                    crops = segment_digits(cv2.threshold(canvas, 127, 255, cv2.THRESH_BINARY)[1])
+                    if len(crops) == 1:
+                        vectors.append(normalise(crops[0]))
+                        labels.append(digit)
+    return np.array(vectors, np.float32), np.array(labels)
+
+
+class DigitClassifier:
+    """Clasificador de dígitos por plantilla más cercana (similitud coseno en NumPy).
+
+    El banco de plantillas parte de las fuentes Hershey de OpenCV y crece con las
+    lecturas confirmadas por Tesseract (``learn``), hasta ``capacity`` plantillas
+    aprendidas (las más antiguas se reemplazan). Una celda solo se acepta si todos
+    sus dígitos superan ``min_similarity`` y ganan al mejor dígito distinto por
+    ``min_margin``; si no, se devuelve ``None`` y la celda va a Tesseract.
+    """
+
+    def __init__(self, min_similarity=0.9, min_margin=0.04, capacity=2000, max_digits=2):
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.capacity = capacity
+        self.max_digits = max_digits
+        base_vectors, base_labels = render_digit_templates()
+        self._base = len(base_labels)
+        self._vectors = np.zeros((self._base + capacity, TEMPLATE_SIZE * TEMPLATE_SIZE), np.float32)
+        self._vectors[:self._base] = base_vectors
+        self._labels = np.zeros(self._base + capacity, np.int8)
+        self._labels[:self._base] = base_labels.astype(np.int8)
+        self._learned = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def env_options():
+        """Argumentos del constructor según DIGIT_MIN_SIMILARITY, DIGIT_MIN_MARGIN y DIGIT_BANK_SIZE."""
+        return {
+            "min_similarity": float(os.getenv("DIGIT_MIN_SIMILARITY", "0.9")),
+            "min_margin": float(os.getenv("DIGIT_MIN_MARGIN", "0.04")),
+            "capacity": int(os.getenv("DIGIT_BANK_SIZE", "2000")),
+        }
+
+    @classmethod
+    def from_env(cls):
+        """Crea el clasificador desde ``env_options`` y carga DIGIT_BANK_PATH si el
+        fichero existe."""
+        classifier = cls(**cls.env_options())
+        path = os.getenv("DIGIT_BANK_PATH")
+        if path and os.path.exists(path):
+            try:
+                classifier.load(path)
+                logger.info(f"Banco de plantillas cargado: {classifier._learned} de {path}")
+            except Exception as e:
+                logger.warning(f"No se pudo cargar el banco de plantillas {path}: {e}")
+        return classifier
+
+    def _bank(self):
+        size = self._base + self._learned
+        return self._vectors[:size], self._labels[:size]
+
+    def predict(self, vectors):
+        """Dígito, similitud y margen de cada vector (filas de ``vectors``)."""
+        with self._lock:
+            bank, labels = self._bank()
+            similarity = vectors @ bank.T
+        # Mejor similitud por dígito (10 columnas) y comparación entre el primero y el segundo
+        per_digit = np.full((len(vectors), 10), -1.0, np.float32)
+        for digit in range(10):
+            columns = labels == digit
+            if columns.any():
+                per_digit[:, digit] = similarity[:, columns].max(axis=1)
+        order = np.argsort(per_digit, axis=1)
+        best, second = order[:, -1], order[:, -2]
+        rows = np.arange(len(vectors))
+        return best, per_digit[rows, best], per_digit[rows, best] - per_digit[rows, second]
+
+    def classify(self, cell_bw):
+        """Texto de la celda si el clasificador está seguro, ``None`` si no."""
+        crops = segment_digits(cell_bw)
+        if not crops or len(crops) > self.max_digits:
+            return None
+        digits, similarity, margin = self.predict(np.stack([normalise(c) for c in crops]))
+        if (similarity < self.min_similarity).any() or (margin < self.min_margin).any():
+            return None
+        return "".join(str(d) for d in digits)
+
+    def learn(self, cell_bw, text):
+        """Añade al banco los dígitos de una celda leída por Tesseract, si la
+        segmentación cuadra con el texto (mismo número de dígitos). Solo se deben
+        pasar lecturas confirmadas (``ocr.is_confirmed``): el banco no distingue
+        una plantilla mal etiquetada."""
+        if not text or not text.isdigit() or self.capacity <= 0:
+            return False
+        crops = segment_digits(cell_bw)
+        if len(crops) != len(text):
+            return False
+        vectors = [normalise(c) for c in crops]
+        with self._lock:
+            for vector, digit in zip(vectors, text):
+                slot = self._base + self._next
+                self._vectors[slot] = vector
+                self._labels[slot] = int(digit)
+                self._next = (self._next + 1) % self.capacity
+                self._learned = min(self._learned + 1, self.capacity)
+        return True
+
+    def stats(self):
+        return {"templates": self._base + self._learned, "learned": self._learned}
+
+    def save(self, path):
+        """Guarda las plantillas aprendidas en ``path`` (npz)."""
+        with self._lock:
+            end = self._base + self._learned
+            vectors = self._vectors[self._base:end].copy()
+            labels = self._labels[self._base:end].copy()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fh:
+            np.savez(fh, vectors=vectors, labels=labels)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Carga plantillas aprendidas guardadas con ``save`` (nada si ``capacity`` es 0)."""
+        if self.capacity <= 0:
+            return
+        with np.load(path) as data:
+            vectors, labels = data["vectors"], data["labels"]
+        if vectors.shape[1:] != self._vectors.shape[1:]:
+            raise ValueError("Tamaño de plantilla incompatible")
+        vectors, labels = vectors[-self.capacity:], labels[-self.capacity:]
+        with self._lock:
+            self._learned = len(labels)
+            self._next = self._learned % self.capacity
+            self._vectors[self._base:self._base + self._learned] = vectors
+            self._labels[self._base:self._base + self._learned] = labels
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    """Clasificador del proceso, creado en el primer uso desde el entorno."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = DigitClassifier.from_env()
+    return _classifier
@@ -0,0 +1,375 @@
+"""Procesa archivos enteros de cartones sin pasar por la API: directorios, globs o un
+manifiesto, repartidos entre todos los núcleos con un pool de procesos.
+
+Cada resultado se escribe en cuanto termina (JSONL o CSV, según la extensión de
+``--output``) y los cartones que ya están en el fichero de salida se saltan, así que
+una ejecución interrumpida se retoma lanzando el mismo comando. Un cartón que falla
+queda registrado con ``success: false`` y su error, sin detener el resto; con
+``--retry-failed`` se quitan de la salida y se vuelven a procesar.
+
+Uso:
+    python -m src.cli escaneos/2024 --output resultados.jsonl
+    python -m src.cli "escaneos/**/*.jpg" --manifest pendientes.txt --output resultados.csv --workers 8
+    python -m src.cli escaneos --output resultados.jsonl --retry-failed
+"""
+import argparse
+import csv
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .processor import ALLOWED_EXTENSIONS, OCR_MODES, process_image_with_stats, validate_grid
+
+CSV_FIELDS = ("file", "success", "grid", "ocr_paths", "error", "seconds")
+
+# Cartones enviados al pool por cada worker: suficientes para que ninguno espere,
+# pocos para no leer por adelantado un archivo entero
+IN_FLIGHT_PER_WORKER = 4
+
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def expand_inputs(inputs, manifest=None):
+    """Rutas de las imágenes a procesar, sin duplicados y en orden estable.
+
+    Cada entrada puede ser un fichero, un directorio (se recorre entero) o un glob
+    (``**`` recursivo). El manifiesto lista una ruta por línea (``#`` comenta),
+    relativa al propio manifiesto si no es absoluta.
+    """
+    entries = list(inputs)
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    entries.append(line if os.path.isabs(line) else os.path.join(base, line))
+
+    paths, seen = [], set()
+
+    def add(path):
+        path = os.path.normpath(path)
+        if path not in seen and is_image(path):
+            seen.add(path)
+            paths.append(path)
+
+    for entry in entries:
+        if os.path.isdir(entry):
+            for root, dirs, files in os.walk(entry):
+                dirs.sort()
+                for name in sorted(files):
+                    add(os.path.join(root, name))
+        elif glob.has_magic(entry):
+            for path in sorted(glob.glob(entry, recursive=True)):
+                if os.path.isfile(path):
+                    add(path)
+        else:
+            add(entry)
+    return paths
+
+
+def output_format(path, fmt=None):
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    if fmt not in ("jsonl", "csv"):
+        raise ValueError(f"Formato de salida no soportado: {fmt}")
+    return fmt
+
+
+def read_records(path, fmt):
+    """Registros de una salida anterior (dicts; en CSV, con los valores como texto).
+    Las líneas cortadas se ignoran."""
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as fh:
+        if fmt == "csv":
+            return list(csv.DictReader(fh))
+        records = []
+        for line in fh:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+
+def _succeeded(record):
+    return record.get("success") in (True, "True", "true")
+
+
+def read_done(path, fmt, retry_failed=False):
+    """Ficheros ya presentes en la salida de una ejecución anterior (solo los que
+    salieron bien con ``retry_failed``)."""
+    done = set()
+    for record in read_records(path, fmt):
+        if record.get("file") and (_succeeded(record) or not retry_failed):
+            done.add(os.path.normpath(record["file"]))
+    return done
+
+
+def drop_failed(path, fmt):
+    """Reescribe la salida sin los cartones fallidos, que se van a reintentar, y con
+    un solo registro por fichero (el último). Así ``--retry-failed`` no deja
+    registros repetidos. Devuelve cuántos registros se quitaron."""
+    records = read_records(path, fmt)
+    latest = {}
+    for record in records:
+        if record.get("file"):
+            latest[os.path.normpath(record["file"])] = record
+    kept = [record for record in latest.values() if _succeeded(record)]
+    if len(kept) == len(records):
+        return 0
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    writer = ResultWriter(tmp_path, fmt)
+    try:
+        for record in kept:
+            writer.write(record)
+    finally:
+        writer.close()
+    os.replace(tmp_path, path)
+    return len(records) - len(kept)
+
+
+class ResultWriter:
+    """Añade resultados al fichero de salida, uno por línea y vaciando el buffer en
+    cada uno para que un corte no pierda lo ya procesado."""
+
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        # Si la ejecución anterior se cortó a mitad de línea, empezar en una nueva
+        needs_newline = not new and self._last_byte(path) != b"\n"
+        self._fh = open(path, "a", newline="", encoding="utf-8")
+        if needs_newline:
+            self._fh.write("\n")
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(self._fh, fieldnames=CSV_FIELDS)
+            if new:
+                self._csv.writeheader()
+
+    @staticmethod
+    def _last_byte(path):
+        with open(path, "rb") as fh:
+            fh.seek(-1, os.SEEK_END)
+            return fh.read(1)
+
+    def write(self, record):
+        if self._csv is not None:
+            row = dict(record)
+            for key in ("grid", "ocr_paths"):
+                if row.get(key) is not None:
+                    row[key] = json.dumps(row[key], ensure_ascii=False)
+            self._csv.writerow({key: row.get(key) for key in CSV_FIELDS})
+        else:
+            self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+
+# Cola del pool en la que cada worker anota el cartón que empieza (ver ``run``)
+_started = None
+
+
+def _init_worker(started=None):
+    global _started
+    _started = started
+    # Un hilo por proceso: el paralelismo lo da el pool, no OpenCV ni OpenMP
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def _run_file(path, grid, ocr_mode, locate):
+    """``process_file`` en un worker, avisando antes de que el cartón ha empezado."""
+    if _started is not None:
+        _started.put(path)
+    return process_file(path, grid, ocr_mode, locate)
+
+
+def process_file(path, grid, ocr_mode, locate):
+    """Resultado de un cartón como dict para la salida (nunca lanza)."""
+    start = time.perf_counter()
+    record = {"file": path}
+    try:
+        numbers, paths = process_image_with_stats(path, grid=grid, ocr_mode=ocr_mode, locate=locate,
+                                                  memo=True, classifier=True)
+        record.update(success=True, grid=numbers, ocr_paths=paths)
+    except Exception as e:
+        record.update(success=False, error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+class Progress:
+    """Línea de progreso en stderr (como mucho cada ``interval`` segundos)."""
+
+    def __init__(self, total, interval=0.5, stream=sys.stderr):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, record):
+        self.done += 1
+        self.failed += not record["success"]
+        now = time.perf_counter()
+        if now - self._last >= self.interval or self.done == self.total:
+            self._last = now
+            self.stream.write("\r" + self.line(now))
+            self.stream.flush()
+
+    def line(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        return (f"[{self.done}/{self.total}] {rate:.1f} cards/s, {self.failed} failed, "
+                f"elapsed {elapsed:.0f}s, ETA {eta:.0f}s")
+
+
+def _new_pool(workers):
+    started = multiprocessing.SimpleQueue()
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(started,)), started
+
+
+def _drain(queue):
+    items = set()
+    while not queue.empty():
+        items.add(queue.get())
+    return items
+
+
+def run(paths, writer, grid=(5, 5), ocr_mode="cell", locate=False, workers=None, progress=None):
+    """Procesa ``paths`` en un pool de ``workers`` procesos y escribe cada resultado
+    en cuanto termina. Si un proceso del pool muere (p. ej. por falta de memoria),
+    los cartones que ya habían empezado y no terminaron se registran como fallidos;
+    los que aún no habían empezado se reenvían a un pool nuevo.
+
+    Returns:
+        tuple: (procesados, fallidos)
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = iter(paths)
+    done = failed = 0
+    executor, started = _new_pool(workers)
+    in_flight = {}
+    # Cartones que un worker ya empezó; se vacía la cola en cada vuelta para que no
+    # se llene la tubería
+    running = set()
+    try:
+        while True:
+            for path in pending:
+                in_flight[executor.submit(_run_file, path, grid, ocr_mode, locate)] = path
+                if len(in_flight) >= workers * IN_FLIGHT_PER_WORKER:
+                    break
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            running |= _drain(started)
+            broken = any(isinstance(future.exception(), BrokenProcessPool) for future in finished)
+            retry = []
+            any_started = False
+            if broken:
+                # Se guardan los cartones que ya terminaron bien; de los que estaban en
+                # marcha no se sabe cuál tumbó el proceso y quedan como fallidos
+                # (--retry-failed los reintenta). Los que no llegaron a empezar se reenvían
+                # (si no consta ninguno en marcha, el pool ni arrancó: todos fallidos).
+                finished = list(in_flight)
+                any_started = any(path in running for path in in_flight.values())
+            records = []
+            for future in finished:
+                path = in_flight.pop(future)
+                started_here = path in running
+                running.discard(path)
+                error = future.exception() if future.done() else None
+                if future.done() and error is None:
+                    records.append(future.result())
+                    continue
+                if isinstance(error, BrokenProcessPool) and not started_here and any_started:
+                    retry.append(path)
+                    continue
+                if error is None or isinstance(error, BrokenProcessPool):
+                    message = "BrokenProcessPool: un proceso del pool terminó de forma abrupta"
+                else:
+                    message = f"{type(error).__name__}: {error}"
+                records.append({"file": path, "success": False, "seconds": None, "error": message})
+            if broken:
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor, started = _new_pool(workers)
+                running.clear()
+                pending = itertools.chain(retry, pending)
+            for record in records:
+                writer.write(record)
+                done += 1
+                failed += not record["success"]
+                if progress is not None:
+                    progress.update(record)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return done, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="*", help="ficheros, directorios o globs (entre comillas)")
+    parser.add_argument("--manifest", help="fichero con una ruta por línea")
+    parser.add_argument("--output", required=True, help="fichero .jsonl o .csv (se amplía si existe)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="por defecto, según la extensión")
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--cols", type=int, default=5)
+    parser.add_argument("--ocr-mode", choices=OCR_MODES, default="cell")
+    parser.add_argument("--locate", action="store_true", help="localizar y enderezar el cartón (fotos)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="procesos (por defecto, núcleos)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="volver a procesar los cartones que fallaron en la ejecución anterior")
+    args = parser.parse_args(argv)
+
+    if not args.inputs and not args.manifest:
+        parser.error("indica al menos un fichero, directorio, glob o --manifest")
+    try:
+        validate_grid(args.rows, args.cols)
+    except ValueError as e:
+        parser.error(str(e))
+
+    fmt = output_format(args.output, args.format)
+    paths = expand_inputs(args.inputs, args.manifest)
+    if args.retry_failed:
+        drop_failed(args.output, fmt)
+    done = read_done(args.output, fmt, args.retry_failed)
+    todo = [path for path in paths if path not in done]
+    print(f"{len(paths)} cartones, {len(paths) - len(todo)} ya en {args.output}, {len(todo)} por procesar "
+          f"con {args.workers} procesos", file=sys.stderr)
+    if not todo:
+        return 0
+
+    writer = ResultWriter(args.output, fmt)
+    progress = Progress(len(todo))
+    try:
+        processed, failed = run(todo, writer, (args.rows, args.cols), args.ocr_mode, args.locate,
+                                args.workers, progress)
+    except KeyboardInterrupt:
+        print(f"\nInterrumpido: {progress.done} cartones guardados; vuelve a lanzar el comando para "
+              f"continuar", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+    print(f"\n{processed} cartones procesados, {failed} fallidos -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
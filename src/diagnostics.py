@@ -0,0 +1,71 @@
+import os
+import threading
+
+import cv2
+
+from .cache import LRUCache
+from .processor import render_mask, render_overlay
+
+# Imágenes que se pueden pedir por petición: nombre del fichero -> función de dibujo
+KINDS = ("grid", "bw")
+
+
+class DiagnosticsStore:
+    """Imágenes de diagnóstico de ``save_grid`` por ``result_id``, acotadas en número
+    y en antigüedad.
+
+    Solo se guarda lo necesario para dibujarlas (la imagen decodificada a la
+    resolución del OCR, su escala respecto a la subida y el dict ``diagnostics`` de
+    ``process_image``): la cuadrícula se dibuja a la resolución original y el PNG se
+    codifica la primera vez que se pide cada imagen, y los bytes quedan en la entrada
+    para las siguientes.
+    """
+
+    def __init__(self, max_size=32, ttl=600):
+        self._entries = LRUCache(max_size=max_size, ttl=ttl or None)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Crea el almacén a partir de DIAGNOSTICS_SIZE y DIAGNOSTICS_TTL (segundos)."""
+        return cls(
+            max_size=int(os.getenv("DIAGNOSTICS_SIZE", "32")),
+            ttl=float(os.getenv("DIAGNOSTICS_TTL", "600")),
+        )
+
+    @property
+    def enabled(self):
+        return self._entries.max_size > 0
+
+    def put(self, result_id, image, scale, diagnostics):
+        self._entries.put(result_id, {"image": image, "scale": scale, "diagnostics": diagnostics, "png": {}})
+
+    def __contains__(self, result_id):
+        return self._entries.get(result_id) is not None
+
+    def png(self, result_id, kind):
+        """PNG de la imagen ``kind`` ("grid" o "bw") de una petición, o None si no
+        existe o ha caducado."""
+        if kind not in KINDS:
+            raise ValueError(f"Imagen de diagnóstico no soportada: {kind}")
+        entry = self._entries.get(result_id)
+        if entry is None:
+            return None
+        with self._lock:
+            data = entry["png"].get(kind)
+        if data is None:
+            if kind == "grid":
+                image = render_overlay(entry["image"], entry["diagnostics"], entry["scale"])
+            else:
+                image = render_mask(entry["diagnostics"])
+            ok, encoded = cv2.imencode(".png", image)
+            if not ok:
+                raise RuntimeError(f"No se pudo codificar la imagen {kind}")
+            data = encoded.tobytes()
+            with self._lock:
+                entry["png"][kind] = data
+        return data
+
+    def stats(self):
+        return {"size": len(self._entries), "max_size": self._entries.max_size,
+                "ttl_seconds": self._entries.ttl}
@@ -0,0 +1,241 @@
+"""Motor de partida: índice de cartones para detectar ganadores al cantar cada número.
+
+Cada cartón se guarda como un conjunto de bits (una palabra de 64 bits por cada 64
+celdas, en un array de NumPy compartido por todos los cartones) y el índice
+``número -> (cartón, celda)`` se guarda en arrays compactos. Cantar un número solo
+toca los cartones que lo tienen: se marca su bit y se comprueban, con una máscara por
+patrón, las líneas, columnas, diagonales y el cartón completo de esos cartones.
+"""
+import threading
+
+import numpy as np
+
+from .processor import validate_grid
+
+# Patrones de premio: filas, columnas, diagonales (solo cartones cuadrados) y cartón lleno
+PATTERNS = ("row", "column", "diagonal", "full")
+
+# Números válidos de un cartón (bingo de 75 bolas)
+MAX_NUMBER = 75
+
+_WORD = 64
+
+
+def pattern_masks(rows, cols, patterns=PATTERNS):
+    """Nombres y máscaras (P, palabras) en uint64 de cada patrón de premio.
+
+    La celda (i, j) es el bit ``i * cols + j``; las palabras van de la menos a la más
+    significativa.
+    """
+    for pattern in patterns:
+        if pattern not in PATTERNS:
+            raise ValueError(f"Patrón no soportado: {pattern}")
+    cells = []
+    names = []
+    if "row" in patterns:
+        for i in range(rows):
+            names.append(f"row:{i}")
+            cells.append([i * cols + j for j in range(cols)])
+    if "column" in patterns:
+        for j in range(cols):
+            names.append(f"column:{j}")
+            cells.append([i * cols + j for i in range(rows)])
+    if "diagonal" in patterns and rows == cols:
+        names += ["diagonal:0", "diagonal:1"]
+        cells.append([i * cols + i for i in range(rows)])
+        cells.append([i * cols + cols - 1 - i for i in range(rows)])
+    if "full" in patterns:
+        names.append("full")
+        cells.append(list(range(rows * cols)))
+
+    words = -(-rows * cols // _WORD)
+    masks = np.zeros((len(cells), words), np.uint64)
+    for p, bits in enumerate(cells):
+        for bit in bits:
+            masks[p, bit // _WORD] |= np.uint64(1) << np.uint64(bit % _WORD)
+    return names, masks
+
+
+def parse_number(text, max_number=MAX_NUMBER):
+    """Número de una celda de ``grid`` (``None`` si no es un número de 1 a ``max_number``)."""
+    text = str(text).strip()
+    if not text.isascii() or not text.isdigit() or not 1 <= int(text) <= max_number:
+        return None
+    return int(text)
+
+
+class Game:
+    """Partida con muchos cartones del mismo tamaño.
+
+    Solo la casilla central de un cartón de lados impares, si no es un número (la
+    FREE), cuenta como marcada desde el principio; el resto de celdas tienen que ser
+    números de 1 a ``MAX_NUMBER``. Un cartón que se añade con la partida empezada
+    recibe los números ya cantados.
+
+    Args:
+        grid (tuple): (rows, cols) de los cartones.
+        patterns (tuple): patrones de premio a comprobar (ver ``PATTERNS``).
+    """
+
+    def __init__(self, grid=(5, 5), patterns=PATTERNS):
+        validate_grid(*grid)
+        self.grid = tuple(grid)
+        self.pattern_names, self.masks = pattern_masks(*grid, patterns)
+        self.words = self.masks.shape[1]
+        self.card_ids = []
+        self._positions = {}       # card_id -> índice
+        self._marks = np.zeros((1024, self.words), np.uint64)
+        self._won = np.zeros((1024, len(self.pattern_names)), bool)
+        # número -> (índices de cartón int32, bits int16): crecen al añadir cartones
+        self._index = {}
+        self.called = []
+        self._called = set()
+        self.winners = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.card_ids)
+
+    def _grow(self, count):
+        if count <= len(self._marks):
+            return
+        capacity = max(count, 2 * len(self._marks))
+        marks = np.zeros((capacity, self.words), np.uint64)
+        marks[:len(self._marks)] = self._marks
+        won = np.zeros((capacity, len(self.pattern_names)), bool)
+        won[:len(self._won)] = self._won
+        self._marks, self._won = marks, won
+
+    def add_cards(self, cards):
+        """Añade cartones ``{card_id: grid}`` (``grid`` como lo devuelve ``/process``).
+
+        Returns:
+            list[dict]: premios que ya tienen los cartones nuevos (con la partida
+            empezada), como en ``call``.
+
+        Raises:
+            ValueError: si un cartón ya está en la partida, no tiene el tamaño de la
+                partida o tiene celdas que no son números (salvo la FREE central).
+        """
+        rows, cols = self.grid
+        size = rows * cols
+        centre = rows // 2 * cols + cols // 2 if rows % 2 and cols % 2 else None
+        new_ids = list(cards)
+        numbers = np.empty((len(new_ids), size), np.int64)
+        for row, card_id in enumerate(new_ids):
+            grid = cards[card_id]
+            if len(grid) != rows or any(len(line) != cols for line in grid):
+                raise ValueError(f"El cartón {card_id} no es de {rows}x{cols}")
+            parsed = [parse_number(c) for line in grid for c in line]
+            invalid = [k for k, n in enumerate(parsed) if n is None and k != centre]
+            if invalid:
+                cells = ", ".join(f"({k // cols}, {k % cols})" for k in invalid)
+                raise ValueError(f"El cartón {card_id} tiene celdas que no son números de 1 a "
+                                 f"{MAX_NUMBER}: {cells}")
+            numbers[row] = [-1 if n is None else n for n in parsed]
+
+        with self._lock:
+            if len(set(new_ids)) != len(new_ids) or any(card_id in self._positions for card_id in new_ids):
+                raise ValueError("Hay cartones que ya están en la partida")
+            start = len(self.card_ids)
+            self._grow(start + len(new_ids))
+            indices = np.arange(start, start + len(new_ids))
+
+            # Marcas iniciales: la FREE central y números ya cantados
+            marked = numbers < 0
+            if self.called:
+                marked |= np.isin(numbers, self.called)
+            self._marks[indices] = self._pack(marked)
+
+            # Índice: ordenar las celdas con número por número y cortar por grupos
+            valid = np.flatnonzero(numbers.ravel() >= 0)
+            flat = numbers.ravel()[valid]
+            order = np.argsort(flat, kind="stable")
+            flat, valid = flat[order], valid[order]
+            values, first = np.unique(flat, return_index=True)
+            card_rows, bits = np.divmod(valid, size)
+            for number, lo, hi in zip(values.tolist(), first, [*first[1:], len(flat)]):
+                entry = ((card_rows[lo:hi] + start).astype(np.int32), bits[lo:hi].astype(np.int16))
+                previous = self._index.get(number)
+                if previous is not None:
+                    entry = (np.concatenate([previous[0], entry[0]]), np.concatenate([previous[1], entry[1]]))
+                self._index[number] = entry
+
+            for offset, card_id in enumerate(new_ids):
+                self._positions[card_id] = start + offset
+            self.card_ids.extend(new_ids)
+            return self._check(indices, number=None)
+
+    def _pack(self, marked):
+        """Matriz (N, celdas) de bool -> palabras (N, words) uint64 (bit i = celda i)."""
+        padded = np.zeros((len(marked), self.words * _WORD), bool)
+        padded[:, :marked.shape[1]] = marked
+        return np.packbits(padded, axis=1, bitorder="little").view("<u8").astype(np.uint64)
+
+    def call(self, number):
+        """Canta ``number``: marca sus celdas y devuelve los premios nuevos.
+
+        Returns:
+            list[dict]: ``{"card_id", "pattern", "number"}`` por cada patrón que un
+            cartón completa con este número (vacía si ya se había cantado).
+        """
+        number = int(number)
+        with self._lock:
+            if number in self._called:
+                return []
+            self._called.add(number)
+            self.called.append(number)
+            entry = self._index.get(number)
+            if entry is None:
+                return []
+            cards, bits = entry
+            values = np.left_shift(np.uint64(1), (bits % _WORD).astype(np.uint64))
+            np.bitwise_or.at(self._marks, (cards, bits // _WORD), values)
+            # Los cartones de cada lista están en orden: quitar repetidos (un número
+            # leído dos veces en el mismo cartón) sin ordenar otra vez
+            cards = cards[np.r_[True, cards[1:] != cards[:-1]]]
+            return self._check(cards, number)
+
+    def _check(self, cards, number):
+        """Premios nuevos de los cartones ``cards`` (índices), con máscaras de bits."""
+        if not len(cards):
+            return []
+        marks = self._marks[cards]
+        # (cartones, patrones): todas las palabras de la máscara presentes en las marcas
+        complete = ((marks[:, None, :] & self.masks[None]) == self.masks[None]).all(axis=2)
+        new = complete & ~self._won[cards]
+        self._won[cards] |= complete
+        found, patterns = np.nonzero(new)
+        card_ids, names = self.card_ids, self.pattern_names
+        wins = [{"card_id": card_ids[c], "pattern": names[p], "number": number}
+                for c, p in zip(cards[found].tolist(), patterns.tolist())]
+        self.winners.extend(wins)
+        return wins
+
+    def marks(self, card_id):
+        """Matriz de bool con las celdas marcadas de un cartón (KeyError si no está)."""
+        rows, cols = self.grid
+        words = self._marks[self._positions[card_id]]
+        bits = np.unpackbits(words.view(np.uint8), bitorder="little")[:rows * cols]
+        return bits.astype(bool).reshape(rows, cols).tolist()
+
+    def won(self, card_id):
+        """Patrones que ya ha completado un cartón (KeyError si no está)."""
+        row = self._won[self._positions[card_id]]
+        return [self.pattern_names[p] for p in np.flatnonzero(row).tolist()]
+
+    def nbytes(self):
+        """Memoria de las marcas y del índice (sin los ids de los cartones)."""
+        used = len(self.card_ids)
+        return (self._marks[:used].nbytes + self._won[:used].nbytes
+                + sum(cards.nbytes + bits.nbytes for cards, bits in self._index.values()))
+
+    def stats(self):
+        return {
+            "grid": list(self.grid),
+            "patterns": self.pattern_names,
+            "cards": len(self.card_ids),
+            "called": len(self.called),
+            "winners": len(self.winners),
+            "index_bytes": self.nbytes(),
+        }
@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Estados de un trabajo: en cola, en curso, terminado bien o con error
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+_FIELDS = ("id", "status", "filename", "rows", "cols", "queued_at", "started_at",
+           "finished_at", "result", "error")
+
+
+def _new_job(filename, rows, cols):
+    job = dict.fromkeys(_FIELDS)
+    job.update(id=uuid.uuid4().hex, status="queued", filename=filename,
+               rows=rows, cols=cols, queued_at=time.time())
+    return job
+
+
+def _expired(job, now, ttl):
+    """Solo caducan los trabajos terminados: uno en cola o en curso nunca se borra."""
+    return job["finished_at"] is not None and now - job["finished_at"] > ttl
+
+
+def _with_timings(job):
+    """Añade la espera en cola y el tiempo de OCR (segundos) a partir de las marcas."""
+    queued, started, finished = job.get("queued_at"), job.get("started_at"), job.get("finished_at")
+    job["queue_wait_seconds"] = round(started - queued, 4) if started else None
+    job["processing_seconds"] = round(finished - started, 4) if started and finished else None
+    return job
+
+
+class MemoryJobStore:
+    """Trabajos en un dict del proceso; caducan ``ttl`` segundos después de terminar
+    (los que siguen en cola o en curso no caducan)."""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename, rows, cols):
+        job = _new_job(filename, rows, cols)
+        with self._lock:
+            self._jobs[job["id"]] = job
+        self.purge()
+        return _with_timings(dict(job))
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            job = dict(job) if job is not None else None
+        if job is None or _expired(job, time.time(), self.ttl):
+            return None
+        return _with_timings(job)
+
+    def purge(self):
+        now = time.time()
+        with self._lock:
+            for job_id in [k for k, job in self._jobs.items() if _expired(job, now, self.ttl)]:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {"backend": "memory", **{s: statuses.count(s) for s in JOB_STATUSES}}
+
+
+class SQLiteJobStore:
+    """Trabajos en un fichero SQLite: cualquier worker de uvicorn puede consultar el
+    estado de un trabajo aunque lo ejecute otro proceso."""
+
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, rows INTEGER,"
+            " cols INTEGER, queued_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+            " result TEXT, error TEXT)"
+        )
+
+    def create(self, filename, rows, cols):
+        job = _new_job(filename, rows, cols)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, filename, rows, cols, queued_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job["id"], job["status"], filename, rows, cols, job["queued_at"]),
+            )
+        self.purge()
+        return _with_timings(job)
+
+    def update(self, job_id, **fields):
+        unknown = set(fields) - set(_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos de trabajo desconocidos: {sorted(unknown)}")
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?",
+                               (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_FIELDS, row))
+        if _expired(job, time.time(), self.ttl):
+            return None
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return _with_timings(job)
+
+    def purge(self):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.ttl,),
+            )
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"backend": "sqlite", **{s: counts.get(s, 0) for s in JOB_STATUSES}}
+
+
+def store_from_env():
+    """Almacén de trabajos según JOBS_DB (SQLite si está definido) y JOBS_TTL."""
+    ttl = float(os.getenv("JOBS_TTL", "3600"))
+    path = os.getenv("JOBS_DB")
+    return SQLiteJobStore(path, ttl) if path else MemoryJobStore(ttl)
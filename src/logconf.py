@@ -0,0 +1,165 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+# Id de la petición en curso: lo fija el middleware y lo heredan las tareas e hilos
+# que se lancen desde ella (run_in_threadpool, pool de OCR, trabajos)
+request_id_var = contextvars.ContextVar("request_id", default="-")
+# Si la petición en curso cae en la muestra de logs detallados (cabeceras, resultados)
+verbose_var = contextvars.ContextVar("log_verbose", default=False)
+
+# X-Request-ID aceptados de proxies y clientes; cualquier otro se sustituye
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+_listener = None
+_handler = None
+
+
+class ContextFilter(logging.Filter):
+    """Añade ``request_id`` a cada registro desde el contexto de quien registra."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea: ``ts``, ``level``, ``logger``, ``msg``, ``request_id``
+    y los campos de ``extra={"fields": {...}}``."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", "-")
+        if request_id != "-":
+            entry["request_id"] = request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato clásico de una línea con los ``fields`` al final como ``clave=valor``."""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        return line
+
+
+class DroppingQueueHandler(QueueHandler):
+    """``QueueHandler`` que nunca bloquea: con la cola llena descarta el registro
+    (y lo cuenta en ``dropped``) en lugar de frenar el event loop."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # El mensaje y la traza se resuelven aquí, en el hilo que registra; el
+        # listener solo da formato y escribe
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level=None, fmt=None, queue_size=None):
+    """Configura el logging del proceso (una sola vez).
+
+    Los registros van a una cola acotada y un hilo (``QueueListener``) los escribe en
+    stdout, así que registrar no bloquea aunque stdout vaya lento.
+
+    Args:
+        level: Nivel del logger raíz (default: LOG_LEVEL o INFO).
+        fmt: "json" (una línea JSON por registro) o "text" (default: LOG_FORMAT o json).
+        queue_size: Registros en espera antes de descartar (default: LOG_QUEUE_SIZE o 10000).
+
+    Returns:
+        DroppingQueueHandler: el handler instalado en el logger raíz.
+    """
+    global _listener, _handler
+    if _handler is not None:
+        return _handler
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+    queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000")) if queue_size is None else queue_size
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    _handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    # Sustituir los handlers de consola previos (p. ej. de basicConfig) por la cola
+    for handler in list(root.handlers):
+        if type(handler) is logging.StreamHandler and handler.stream in (sys.stdout, sys.stderr):
+            root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(_handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _handler
+
+
+def request_id_from(header):
+    """Id de la petición: el ``X-Request-ID`` recibido si es seguro para los logs
+    (``[A-Za-z0-9._-]``, hasta 64 caracteres) o uno nuevo en otro caso."""
+    if header and REQUEST_ID_PATTERN.fullmatch(header):
+        return header
+    return uuid.uuid4().hex[:16]
+
+
+def bind_request(request_id, sample_rate=0.0):
+    """Asocia ``request_id`` al contexto en curso y decide si la petición entra en
+    la muestra de logs detallados (siempre con LOG_LEVEL=DEBUG).
+
+    Returns:
+        tuple: tokens para ``unbind_request``.
+    """
+    verbose = logging.getLogger().isEnabledFor(logging.DEBUG) or random.random() < sample_rate
+    return request_id_var.set(request_id), verbose_var.set(verbose)
+
+
+def unbind_request(tokens):
+    request_token, verbose_token = tokens
+    request_id_var.reset(request_token)
+    verbose_var.reset(verbose_token)
+
+
+def verbose():
+    """Si la petición en curso debe registrar cabeceras y resultados completos."""
+    return verbose_var.get()
+
+
+def dropped():
+    """Registros descartados por tener la cola llena."""
+    return _handler.dropped if _handler is not None else 0
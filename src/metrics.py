@@ -0,0 +1,81 @@
+import os
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+
+# Con varios workers de uvicorn cada proceso escribe sus métricas en ficheros de
+# PROMETHEUS_MULTIPROC_DIR (vacío al arrancar) y /metrics las agrega todas
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SIZE_BUCKETS = (16e3, 64e3, 256e3, 1e6, 2e6, 4e6, 8e6, 16e6, 32e6, 64e6)
+CELL_BUCKETS = (1, 4, 9, 16, 25, 36, 49, 64, 81, 100)
+
+REQUEST_LATENCY = Histogram(
+    "bingo_http_request_duration_seconds", "HTTP request latency by endpoint",
+    ["method", "endpoint", "status"], buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "bingo_ocr_stage_duration_seconds", "Time per processing stage of timed /process requests",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+# Las celdas las cuenta la canalización (``ocr.count_path``) donde actualiza ``stats``, y
+# la memoria de celdas cada consulta; las de la caché de resultados, la API. Como los
+# motores de src.ocr, también en los procesos del pool
+CELLS = Counter("bingo_ocr_cells_total", "Cells resolved per path (empty, free, memo, classifier, "
+                "tesseract, cache)", ["path"])
+CELL_MEMO = Counter("bingo_cell_memo_lookups_total", "Cell memo lookups", ["result"])
+TESSERACT_CALLS = Counter("bingo_tesseract_invocations_total", "Calls into the Tesseract engine", ["engine"])
+OCR_FAILURES = Counter("bingo_ocr_failures_total", "Exceptions raised by the Tesseract engine", ["engine"])
+CELLS_PER_CARD = Histogram("bingo_cells_per_card", "Cells in each processed card", buckets=CELL_BUCKETS)
+UPLOAD_SIZE = Histogram("bingo_upload_size_bytes", "Size of uploaded images", buckets=SIZE_BUCKETS)
+RESULT_CACHE = Counter("bingo_result_cache_lookups_total", "Result cache lookups", ["result"])
+
+STREAM_FRAMES = Counter("bingo_stream_frames_total", "Frames received on /stream", ["result"])
+
+# Los gauges de cada proceso vivo se suman (livesum) al agregar
+OCR_IN_FLIGHT = Gauge("bingo_ocr_in_flight", "Cards running in the OCR pool", multiprocess_mode="livesum")
+OCR_QUEUED = Gauge("bingo_ocr_queued", "Cards waiting for an OCR pool slot", multiprocess_mode="livesum")
+JOBS_QUEUED = Gauge("bingo_jobs_queued", "Async jobs waiting for a worker", multiprocess_mode="livesum")
+JOBS_RUNNING = Gauge("bingo_jobs_running", "Async jobs being processed", multiprocess_mode="livesum")
+STREAMS_OPEN = Gauge("bingo_streams_open", "Open /stream WebSocket connections", multiprocess_mode="livesum")
+# Duración de cada fase del arranque de cada proceso (import, startup, engine, warm_cell...)
+STARTUP_PHASE = Gauge("bingo_startup_phase_seconds", "Duration of each cold start phase", ["phase"],
+                      multiprocess_mode="liveall")
+
+
+def observe_pool(stats):
+    """Actualiza los gauges del pool de OCR con ``OCRPool.stats()``."""
+    OCR_IN_FLIGHT.set(stats["in_flight"])
+    OCR_QUEUED.set(stats["queued"])
+
+
+def observe_card(cells, cached=False):
+    """Observa el tamaño de un cartón; si salió de la caché de resultados, sus celdas
+    cuentan en el camino ``cache`` (las demás ya las contó la canalización)."""
+    CELLS_PER_CARD.observe(cells)
+    if cached:
+        CELLS.labels("cache").inc(cells)
+
+
+def observe_stages(timings):
+    """Observa cada etapa de un desglose de ``timing.span`` (segundos)."""
+    for stage, seconds in timings.items():
+        STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+def render():
+    """Texto de exposición de Prometheus y su content type."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Retira los gauges ``live*`` de este proceso al apagarlo (modo multiproceso)."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
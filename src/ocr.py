@@ -1,11 +1,267 @@
+import logging
+import os
+import shutil
+import threading
+
 import cv2
-import pytesseract
+import numpy as np
+
+from . import metrics
+
+try:
+    # Se importa aquí y no al crear el motor: tesserocr (cysignals) instala manejadores
+    # de señales y eso solo puede hacerse desde el hilo principal
+    import tesserocr
+except ImportError:  # dependencia opcional: libtesseract en proceso
+    tesserocr = None
+
+# pytesseract (y PIL) se importa al crear el motor (get_engine), no al arrancar
+pytesseract = None
+
+logger = logging.getLogger(__name__)
+
+DIGITS = '0123456789'
+DIGITS_WHITELIST = f'-c tessedit_char_whitelist={DIGITS}'
+
+# "auto" usa tesserocr si está instalado y se inicializa; si no, pytesseract
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+
+# Una lectura de Tesseract solo se da por confirmada (y alimenta el clasificador y la
+# memoria de celdas) con esta confianza mínima (0-100) y si es un número de 1 al máximo
+CONFIRM_MIN_CONFIDENCE = float(os.getenv("OCR_CONFIRM_CONFIDENCE", "80"))
+CONFIRM_MAX_NUMBER = int(os.getenv("OCR_CONFIRM_MAX_NUMBER", "75"))
+
+
+def _import_pytesseract():
+    global pytesseract
+    if pytesseract is None:
+        import pytesseract as module
+        pytesseract = module
+    return pytesseract
+
+
+def ocr_available():
+    """Cheap check (no subprocess, no model loading) that some engine can run:
+    ``tesserocr`` is installed or a ``tesseract`` binary is on PATH."""
+    return tesserocr is not None or shutil.which("tesseract") is not None
+
+
+class PytesseractEngine:
+    """Engine that forks the ``tesseract`` binary on every call."""
+
+    name = "pytesseract"
+
+    def __init__(self):
+        _import_pytesseract()
+
+    def _run(self, call, image, psm, **kwargs):
+        """Run one pytesseract call, counting it and any failure in ``metrics``."""
+        config = f'--psm {psm} --oem 3 {DIGITS_WHITELIST}'
+        metrics.TESSERACT_CALLS.labels(self.name).inc()
+        try:
+            return call(image, config=config, **kwargs)
+        except pytesseract.pytesseract.TesseractNotFoundError:
+            metrics.OCR_FAILURES.labels(self.name).inc()
+            raise RuntimeError("Tesseract no encontrado: asegúrate de que esté instalado y en PATH")
+        except Exception:
+            metrics.OCR_FAILURES.labels(self.name).inc()
+            raise
+
+    def image_to_string(self, image, psm):
+        return self._run(pytesseract.image_to_string, image, psm)
+
+    def image_to_data(self, image, psm):
+        return self._run(pytesseract.image_to_data, image, psm, output_type=pytesseract.Output.DICT)
+
+    def image_to_text(self, image, psm):
+        """Text and lowest word confidence (``None`` without words) in one call."""
+        data = self.image_to_data(image, psm)
+        words = [(text.strip(), float(conf)) for text, conf in zip(data['text'], data['conf'])
+                 if text and text.strip()]
+        if not words:
+            return '', None
+        return ' '.join(text for text, _conf in words), min(conf for _text, conf in words)
+
+
+class TesserocrEngine:
+    """Engine that binds libtesseract in-process through ``tesserocr``.
+
+    Keeps one initialised ``TessBaseAPI`` per thread (digit whitelist already
+    set) and reuses it across cells and requests; only the page segmentation
+    mode changes between calls.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang='eng'):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr no está instalado")
+        self.lang = lang
+        self._local = threading.local()
+        # Inicializar en el hilo actual para fallar pronto si no hay traineddata
+        self._api()
+
+    def _api(self):
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            kwargs = {'lang': self.lang, 'oem': tesserocr.OEM.DEFAULT}
+            tessdata = os.getenv('TESSDATA_PREFIX')
+            if tessdata:
+                kwargs['path'] = tessdata.rstrip('/\\') + os.sep
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            api.SetVariable('tessedit_char_whitelist', DIGITS)
+            self._local.api = api
+        return api
+
+    def _set_image(self, image, psm):
+        api = self._api()
+        api.SetPageSegMode(psm)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape
+        # SetImageBytes no copia el buffer: se mantiene la referencia hasta reconocer
+        buffer = image.tobytes()
+        api.SetImageBytes(buffer, width, height, 1, width)
+        return api, buffer
+
+    def _run(self, read, image, psm):
+        """Set ``image`` and return ``read(api)``, counting the call and any failure
+        in ``metrics``."""
+        metrics.TESSERACT_CALLS.labels(self.name).inc()
+        try:
+            api, _buffer = self._set_image(image, psm)
+            return read(api)
+        except Exception:
+            metrics.OCR_FAILURES.labels(self.name).inc()
+            raise
+
+    def image_to_string(self, image, psm):
+        return self._run(lambda api: api.GetUTF8Text(), image, psm)
+
+    def image_to_text(self, image, psm):
+        """Text and mean word confidence (``None`` without text) of the same recognition."""
+        def read(api):
+            text = api.GetUTF8Text()
+            return text, (float(api.MeanTextConf()) if text.strip() else None)
+        return self._run(read, image, psm)
+
+    def image_to_data(self, image, psm):
+        return self._run(self._words, image, psm)
+
+    @staticmethod
+    def _words(api):
+        api.Recognize()
+        data = {'text': [], 'conf': [], 'left': [], 'top': [], 'width': [], 'height': []}
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+        level = tesserocr.RIL.WORD
+        for word in tesserocr.iterate_level(iterator, level):
+            try:
+                text = word.GetUTF8Text(level)
+            except RuntimeError:
+                continue
+            x1, y1, x2, y2 = word.BoundingBox(level)
+            data['text'].append(text)
+            data['conf'].append(word.Confidence(level))
+            data['left'].append(x1)
+            data['top'].append(y1)
+            data['width'].append(x2 - x1)
+            data['height'].append(y2 - y1)
+        return data
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def create_engine(name="auto"):
+    """Build an OCR engine by name ("auto", "tesserocr" or "pytesseract")."""
+    if name == "pytesseract":
+        return PytesseractEngine()
+    if name == "tesserocr":
+        return TesserocrEngine()
+    if name != "auto":
+        raise ValueError(f"Motor de OCR no soportado: {name}")
+    if tesserocr is not None:
+        try:
+            return TesserocrEngine()
+        except Exception as e:
+            logger.warning(f"tesserocr no disponible, usando pytesseract: {e}")
+    return PytesseractEngine()
+
+
+def get_engine():
+    """Return the process-wide OCR engine, created on first use from ``OCR_ENGINE``.
+
+    Creating it loads the traineddata (tesserocr) for the calling thread; the API
+    does it during warm-up so the first request does not pay for it.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(OCR_ENGINE)
+                logger.info(f"Motor de OCR: {_engine.name}")
+    return _engine
+
+
+def engine_name():
+    """Name of the process-wide engine, creating it (and loading the model for the
+    calling thread) if needed. Picklable, so it can run in a process pool."""
+    return get_engine().name
+
+
+def is_confirmed(text, confidence, min_confidence=None, max_number=None):
+    """Whether a Tesseract read can be trusted as ground truth for the classifier's
+    template bank and the cell memo: a number from 1 to ``max_number`` (no leading
+    zeros) read with at least ``min_confidence`` (defaults: CONFIRM_MIN_CONFIDENCE
+    and CONFIRM_MAX_NUMBER). Reads without a confidence are never confirmed."""
+    min_confidence = CONFIRM_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    max_number = CONFIRM_MAX_NUMBER if max_number is None else max_number
+    if confidence is None or confidence < min_confidence:
+        return False
+    if not text or not text.isascii() or not text.isdigit() or text[0] == '0':
+        return False
+    return int(text) <= max_number
+
+
+def read_cell(cell_image, psm=7):
+    """Read a single cell with Tesseract: (stripped text, confidence or ``None``)."""
+    text, confidence = get_engine().image_to_text(cell_image, psm)
+    return text.strip(), confidence
+
+
+def extract_text_from_cell(cell_image, psm=10, classifier=None, stats=None):
+    """Extract text from a single cell image using Tesseract OCR.
+
+    If a ``DigitClassifier`` is given it is tried first and Tesseract only runs
+    when the classifier is not confident; confirmed Tesseract reads (see
+    ``is_confirmed``) are fed back to the classifier's template bank. ``stats``
+    (dict) counts the cells per path.
+    """
+    if classifier is not None:
+        text = classifier.classify(cell_image)
+        if text is not None:
+            count_path(stats, "classifier")
+            return text
+    text, confidence = read_cell(cell_image, psm)
+    if classifier is not None and is_confirmed(text, confidence):
+        classifier.learn(cell_image, text)
+    count_path(stats, "tesseract")
+    return text
+
+
+def count_path(stats, path, n=1):
+    """Add ``n`` cells to the ``path`` counter of ``stats`` (when given) and to the
+    ``bingo_ocr_cells_total`` metric of this process."""
+    if not n:
+        return
+    metrics.CELLS.labels(path).inc(n)
+    if stats is not None:
+        stats[path] = stats.get(path, 0) + n
 
-def extract_text_from_cell(cell_image):
-    """Extract text from a single cell image using Tesseract OCR."""
-    config = '--psm 10 --oem 3 -c tessedit_char_whitelist=0123456789'
-    text = pytesseract.image_to_string(cell_image, config=config)
-    return text.strip()
 
 def process_cells(cells):
     """Process a list of cell images and return the extracted text."""
@@ -13,4 +269,82 @@ def process_cells(cells):
     for cell in cells:
         text = extract_text_from_cell(cell)
         extracted_text.append(text)
-    return extracted_text
\ No newline at end of file
+    return extracted_text
+
+
+def compose_cells(cell_images, gutter=None):
+    """Stack cell images in a single column on a white canvas.
+
+    Cells are expected as dark digits on a light background. Each cell gets its
+    own text line separated by white gutters, so Tesseract's line finder never
+    merges two cells into one word.
+
+    Returns:
+        tuple: (canvas, slots) where slots[k] = (x, y, w, h) of cell k in the canvas.
+    """
+    if not cell_images:
+        return np.full((1, 1), 255, np.uint8), []
+    max_h = max(c.shape[0] for c in cell_images)
+    max_w = max(c.shape[1] for c in cell_images)
+    if gutter is None:
+        gutter = max(10, max_h // 4)
+
+    height = gutter + len(cell_images) * (max_h + gutter)
+    width = 2 * gutter + max_w
+    canvas = np.full((height, width), 255, np.uint8)
+
+    slots = []
+    y = gutter
+    for cell in cell_images:
+        h, w = cell.shape[:2]
+        canvas[y:y + h, gutter:gutter + w] = cell
+        slots.append((gutter, y, w, h))
+        y += max_h + gutter
+    return canvas, slots
+
+
+def _slot_words(data, slots):
+    """Words of an ``image_to_data`` result per slot: [(left, text, confidence)]."""
+    words = [[] for _ in slots]
+    confidences = data.get('conf') or [None] * len(data.get('text', []))
+    for k, text in enumerate(data.get('text', [])):
+        text = (text or '').strip()
+        if not text:
+            continue
+        cx = data['left'][k] + data['width'][k] / 2.0
+        cy = data['top'][k] + data['height'][k] / 2.0
+        for idx, (x, y, w, h) in enumerate(slots):
+            if x <= cx < x + w and y <= cy < y + h:
+                conf = confidences[k]
+                words[idx].append((data['left'][k], text, None if conf is None else float(conf)))
+                break
+    return [sorted(ws) for ws in words]
+
+
+def assign_words(data, slots):
+    """Map the words of an ``image_to_data`` result back to the cell slots.
+
+    Each word goes to the slot containing the centre of its bounding box; the
+    words of one slot are joined left to right with a space.
+    """
+    return [' '.join(text for _, text, _conf in ws) for ws in _slot_words(data, slots)]
+
+
+def assign_confidences(data, slots):
+    """Lowest word confidence of each slot (``None`` for slots without words)."""
+    confidences = []
+    for ws in _slot_words(data, slots):
+        values = [conf for _, _text, conf in ws if conf is not None]
+        confidences.append(min(values) if values and len(values) == len(ws) else None)
+    return confidences
+
+
+def extract_text_batched(cell_images, confidences=False):
+    """Run Tesseract once over all cells and return one string per cell (and, with
+    ``confidences``, the lowest word confidence of each cell as a second list)."""
+    canvas, slots = compose_cells(cell_images)
+    if not slots:
+        return ([], []) if confidences else []
+    data = get_engine().image_to_data(canvas, 6)
+    texts = assign_words(data, slots)
+    return (texts, assign_confidences(data, slots)) if confidences else texts
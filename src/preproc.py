@@ -1,16 +1,289 @@
+import os
+
 import cv2
 import numpy as np
+from .utils import load_image, read_image_size
+
+# Reducciones que OpenCV aplica durante la decodificación (en JPEG, sin llegar a
+# decodificar la imagen completa)
+_REDUCED_GRAYSCALE = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                      (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
 
-def preprocess_image(image_path):
-    # Cargar imagen y convertir a escala de grises
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def preprocess_image(image):
+    # Acepta ruta, bytes codificados o ndarray ya decodificado (BGR o gris)
+    image = load_image(image)
+    # Convertir a escala de grises (si no lo está ya)
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
     # Aplicar umbral adaptativo para mejorar el contraste
     _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
     
     return thresh
 
+def estimated_cell_height(height, width, rows, cols, card_fraction=1.0):
+    """Alto de celda esperado si el cartón ocupa ``card_fraction`` del lado de la foto."""
+    return min(height / rows, width / cols) * card_fraction
+
+def load_normalised(source, grid=(5, 5), target_cell_height=64, card_fraction=1.0):
+    """Carga la imagen en gris con las celdas a una resolución adecuada para el OCR.
+
+    Con bytes o una ruta se lee la cabecera y, si las celdas salen al menos el doble
+    de altas que ``target_cell_height``, se decodifica ya reducida
+    (``IMREAD_REDUCED_GRAYSCALE_2/4/8``). Si aún sobra resolución (formato sin
+    cabecera conocida, ndarray ya decodificado) se hace un único ``resize`` con
+    ``INTER_AREA``. Las celdas quedan entre una y dos veces ``target_cell_height``;
+    las imágenes pequeñas no se amplían. ``target_cell_height`` 0 o ``None`` desactiva
+    la normalización.
+
+    Returns:
+        tuple: (imagen en gris o ``None`` si no se puede decodificar, (sx, sy) con la
+        escala aplicada respecto al original en cada eje)
+    """
+    rows, cols = grid
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            source = fh.read()
+
+    image = None
+    original = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        original = read_image_size(source)
+        if original is not None and target_cell_height:
+            cell = estimated_cell_height(*original, rows, cols, card_fraction)
+            for factor, flag in _REDUCED_GRAYSCALE:
+                if cell / factor >= target_cell_height:
+                    image = load_image(source, flag)
+                    break
+        if image is None:
+            image = load_image(source)
+    else:
+        image = load_image(source)
+    if image is not None and image.ndim == 3:
+        # Igual que sin normalizar: decodificación en color y conversión a gris
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if image is None:
+        return None, (1.0, 1.0)
+    if original is None:
+        original = image.shape
+    elif (original[0] > original[1]) != (image.shape[0] > image.shape[1]):
+        # Con orientación EXIF la cabecera trae los lados intercambiados
+        original = original[::-1]
+
+    if target_cell_height:
+        cell = estimated_cell_height(*image.shape, rows, cols, card_fraction)
+        if cell >= 2 * target_cell_height:
+            ratio = target_cell_height / cell
+            size = (max(1, round(image.shape[1] * ratio)), max(1, round(image.shape[0] * ratio)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image, (image.shape[1] / original[1], image.shape[0] / original[0])
+
+def otsu_thresholds(hist):
+    """Umbral de Otsu de cada fila de ``hist`` (N x 256), vectorizado.
+
+    Reproduce el criterio de ``cv2.THRESH_OTSU``: maximiza la varianza entre clases
+    y se queda con el primer máximo; si ningún corte es válido devuelve 0.
+    """
+    hist = np.asarray(hist, dtype=np.float64)
+    total = hist.sum(axis=1, keepdims=True)
+    total[total == 0] = 1
+    p = hist / total
+    levels = np.arange(hist.shape[1], dtype=np.float64)
+    q1 = np.cumsum(p, axis=1)
+    m1 = np.cumsum(p * levels, axis=1)
+    q2 = 1.0 - q1
+    eps = np.finfo(np.float32).eps
+    valid = (np.minimum(q1, q2) >= eps) & (np.maximum(q1, q2) <= 1.0 - eps)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mu1 = m1 / q1
+        mu2 = (m1[:, -1:] - m1) / q2
+        sigma = q1 * q2 * (mu1 - mu2) ** 2
+    sigma = np.where(valid, sigma, 0.0)
+    return sigma.argmax(axis=1)
+
+def block_otsu_thresholds(image, boxes):
+    """Umbral de Otsu de cada bloque (xa, ya, xb, yb) de ``image``, vectorizado.
+
+    Los histogramas de todos los bloques salen de una sola pasada: con la imagen
+    integral si la imagen tiene como mucho dos niveles (el caso de ``preprocess_image``)
+    o con un ``bincount`` por bloque/nivel en el caso general (bloques sin solapes,
+    como los recortes de la rejilla).
+    """
+    xa, ya, xb, yb = np.asarray(boxes, dtype=np.int64).reshape(-1, 4).T
+    count = len(xa)
+    low, high = (int(v) for v in cv2.minMaxLoc(image)[:2])
+    hist = np.zeros((count, 256), np.float64)
+    if high - low < 2 or not cv2.countNonZero(cv2.inRange(image, low + 1, high - 1)):
+        is_high = cv2.threshold(cv2.compare(image, high, cv2.CMP_EQ), 127, 1, cv2.THRESH_BINARY)[1]
+        integral = cv2.integral(is_high)
+        n_high = integral[yb, xb] - integral[ya, xb] - integral[yb, xa] + integral[ya, xa]
+        hist[:, high] = n_high
+        if low != high:
+            hist[:, low] = (xb - xa) * (yb - ya) - n_high
+    else:
+        index = np.full(image.shape, -1, np.int32)
+        for k in range(count):
+            index[ya[k]:yb[k], xa[k]:xb[k]] = k
+        keys = (index.astype(np.int64) + 1) * 256 + image
+        hist = np.bincount(keys.ravel(), minlength=(count + 1) * 256).reshape(count + 1, 256)[1:]
+    return otsu_thresholds(hist)
+
+def line_mask(binary, min_fraction=0.5):
+    """Líneas horizontales y verticales largas de una imagen binaria (líneas en blanco).
+
+    Una apertura con un kernel de una fila (o columna) de ``min_fraction`` del ancho
+    (o alto) solo conserva los trazos rectos al menos así de largos: las líneas de la
+    rejilla sobreviven, los dígitos y el ruido no.
+
+    Returns:
+        tuple: (horizontales, verticales) como máscaras binarias.
+    """
+    height, width = binary.shape
+    h_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, int(width * min_fraction)), 1))
+    v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(1, int(height * min_fraction))))
+    return cv2.morphologyEx(binary, cv2.MORPH_OPEN, h_kernel), cv2.morphologyEx(binary, cv2.MORPH_OPEN, v_kernel)
+
+def order_quad(points):
+    """Ordena cuatro puntos como (arriba-izq, arriba-der, abajo-der, abajo-izq)."""
+    points = np.asarray(points, np.float32).reshape(4, 2)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([points[sums.argmin()], points[diffs.argmin()],
+                     points[sums.argmax()], points[diffs.argmax()]], np.float32)
+
+# Fracción mínima de su envolvente convexa que ocupa el contorno de un cartón en una hoja
+SOLIDITY = 0.8
+
+def _grid_mesh(gray, max_side):
+    """Malla de líneas largas de ``gray`` sobre una copia reducida (lado mayor
+    ``max_side``) y la escala de esa copia."""
+    height, width = gray.shape
+    scale = min(1.0, max_side / float(max(height, width)))
+    small = gray if scale == 1.0 else cv2.resize(gray, (int(width * scale), int(height * scale)),
+                                                 interpolation=cv2.INTER_AREA)
+    # Suavizar antes del umbral: la textura del fondo no debe formar trazos largos
+    small = cv2.GaussianBlur(small, (5, 5), 0)
+    binary = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10)
+    # Engrosar los trazos para que las líneas de un cartón algo girado sigan siendo rectas
+    binary = cv2.dilate(binary, np.ones((5, 5), np.uint8))
+    horizontal, vertical = line_mask(binary, min_fraction=1 / 16)
+    return cv2.dilate(cv2.bitwise_or(horizontal, vertical), np.ones((3, 3), np.uint8)), scale
+
+def _contour_quad(contour):
+    hull = cv2.convexHull(contour)
+    quad = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+    if len(quad) != 4:
+        quad = cv2.boxPoints(cv2.minAreaRect(hull))
+    return order_quad(quad)
+
+def detect_card(gray, max_side=800, min_area=0.1):
+    """Localiza el cuadrilátero de la rejilla impresa del cartón en una foto.
+
+    Trabaja sobre una copia reducida (lado mayor ``max_side``): umbral adaptativo,
+    extracción morfológica de líneas largas (al menos 1/16 de la imagen) y el mayor
+    contorno externo de la malla resultante, aproximado a cuatro vértices.
+
+    Returns:
+        np.ndarray|None: 4x2 float32 en coordenadas de ``gray`` (ver ``order_quad``)
+        o ``None`` si no aparece una rejilla que ocupe al menos ``min_area`` de la foto.
+    """
+    mesh, scale = _grid_mesh(gray, max_side)
+    contours, _ = cv2.findContours(mesh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    contour = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(contour) < min_area * mesh.shape[0] * mesh.shape[1]:
+        return None
+    return _contour_quad(contour) / scale
+
+def detect_cards(gray, max_side=1600, min_area=0.01, relative_area=0.25, max_cards=None):
+    """Localiza todos los cartones de una hoja (varios cartones por página).
+
+    Misma malla que ``detect_card``, pero cada contorno externo que ocupa al menos
+    ``min_area`` de la foto y ``relative_area`` del mayor, y que llena su envolvente
+    convexa (``SOLIDITY``), es un cartón (lo demás son títulos, subrayados, logotipos
+    o el borde del papel). Más resolución por defecto para que no se
+    junten cartones separados por poco margen.
+
+    Returns:
+        list[np.ndarray]: cuadriláteros 4x2 float32 en coordenadas de ``gray``, en
+        orden de lectura (por filas de arriba abajo y de izquierda a derecha), como
+        mucho ``max_cards`` (los mayores).
+    """
+    mesh, scale = _grid_mesh(gray, max_side)
+    contours, _ = cv2.findContours(mesh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    floor = min_area * mesh.shape[0] * mesh.shape[1]
+    # Una rejilla llena su envolvente convexa; el borde del papel o de la mesa es un
+    # trazo abierto que no la llena
+    candidates = [(area, contour) for area, contour in ((cv2.contourArea(c), c) for c in contours)
+                  if area >= floor and area >= SOLIDITY * cv2.contourArea(cv2.convexHull(contour))]
+    if not candidates:
+        return []
+    largest = max(area for area, _contour in candidates)
+    found = sorted((item for item in candidates if item[0] >= relative_area * largest),
+                   key=lambda item: -item[0])[:max_cards]
+    quads = [_contour_quad(contour) / scale for _area, contour in found]
+    # Orden de lectura: un cartón empieza fila nueva si su centro queda por debajo
+    # de la mitad del alto medio respecto a la fila en curso
+    quads.sort(key=lambda quad: quad[:, 1].mean())
+    half = np.median([np.ptp(quad[:, 1]) for quad in quads]) / 2
+    lines, top = [], None
+    for quad in quads:
+        centre = quad[:, 1].mean()
+        if top is None or centre - top > half:
+            lines.append([])
+            top = centre
+        lines[-1].append(quad)
+    return [quad for line in lines for quad in sorted(line, key=lambda quad: quad[:, 0].mean())]
+
+def warp_card(image, quad):
+    """Endereza el cuadrilátero ``quad`` de ``image`` a un rectángulo.
+
+    El tamaño de salida es el de los lados más largos del cuadrilátero (no se pierde
+    resolución). Devuelve (imagen enderezada, homografía de ``image`` a la salida).
+    """
+    tl, tr, br, bl = quad
+    width = int(round(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))))
+    height = int(round(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], np.float32)
+    matrix = cv2.getPerspectiveTransform(np.asarray(quad, np.float32), target)
+    warped = cv2.warpPerspective(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                                 borderMode=cv2.BORDER_REPLICATE)
+    return warped, matrix
+
+def _line_positions(profile, count, length):
+    """Centros de las ``count`` líneas de un perfil de proyección, o ``None``."""
+    hits = profile >= 0.5 * profile.max() if profile.max() > 0 else np.zeros(len(profile), bool)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], hits.astype(np.int8), [0]))))
+    centres = ((edges[0::2] + edges[1::2] - 1) / 2.0).round().astype(int)
+    # El borde exterior a veces cae fuera del recorte: completar con los extremos
+    if len(centres) == count - 1:
+        if centres[0] > length - 1 - centres[-1]:
+            centres = np.concatenate(([0], centres))
+        else:
+            centres = np.concatenate((centres, [length]))
+    if len(centres) == count - 2:
+        centres = np.concatenate(([0], centres, [length]))
+    if len(centres) != count:
+        return None
+    # Separaciones razonables: ninguna celda menor que la mitad de la media
+    gaps = np.diff(centres)
+    if gaps.min() < 0.5 * gaps.mean():
+        return None
+    return centres
+
+def detect_grid_lines(binary, rows, cols):
+    """Posiciones de las líneas de la rejilla en una imagen binaria (líneas en blanco).
+
+    Returns:
+        tuple: (ys, xs) con rows+1 y cols+1 posiciones, o ``None`` en cada eje cuyas
+        líneas no se pueden determinar con seguridad.
+    """
+    height, width = binary.shape
+    horizontal, vertical = line_mask(binary, min_fraction=0.5)
+    ys = _line_positions(cv2.reduce(horizontal, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel(), rows + 1, height)
+    xs = _line_positions(cv2.reduce(vertical, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel(), cols + 1, width)
+    return ys, xs
+
 def divide_into_grid(image, rows=5, cols=5):
     height, width = image.shape
     cell_height = height // rows
@@ -1,159 +1,490 @@
 import os
 import cv2
 import numpy as np
-import pytesseract
-from .preproc import preprocess_image
+from .preproc import (preprocess_image, block_otsu_thresholds, detect_card, warp_card, detect_grid_lines,
+                      load_normalised)
+from .utils import load_image
+from .ocr import (extract_text_batched, count_path, is_confirmed, read_cell, CONFIRM_MIN_CONFIDENCE,
+                  CONFIRM_MAX_NUMBER)
+from .cellcache import CellMemo, fingerprint, get_memo
+from .classifier import DigitClassifier, get_classifier, ink_mask
+from .timing import span
 
+# Versión de la canalización: forma parte de la clave de la caché de resultados.
+# Subirla cuando un cambio en el preprocesado o el OCR altere los textos detectados
+PIPELINE_VERSION = "4"
 
-def process_image(image_path, grid=(5, 5), save_grid_path=None):
-    """Divide la imagen en una cuadrícula, extrae texto por celda y opcionalmente guarda
-    una copia de la imagen original con la cuadrícula dibujada.
+# Modos de OCR: "cell" lanza Tesseract una vez por celda, "batch" una vez por cartón
+OCR_MODES = ("cell", "batch")
 
-    Args:
-        image_path (str): ruta a la imagen de entrada.
-        grid (tuple): (rows, cols) tamaño de la cuadrícula. Default (5,5).
-        save_grid_path (str|None): si se provee, guarda la imagen con la cuadrícula dibujada en esa ruta.
+# Modos de limpieza: "card" procesa todas las celdas a la vez sobre la imagen completa,
+# "cell" es la canalización original por celda (referencia para comparar precisión)
+CLEANUP_MODES = ("card", "cell")
 
-    Returns:
-        list[list[str]]: matriz de textos detectados por fila.
-    """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Imagen no encontrada: {image_path}")
+# Formatos de imagen aceptados y tamaño máximo de la cuadrícula
+ALLOWED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+MAX_GRID = 10
 
-    # Cargar imagen original en color y en gris
-    img_color = cv2.imread(image_path)
-    if img_color is None:
-        raise IOError(f"No se pudo leer la imagen: {image_path}")
-    img_gray = cv2.cvtColor(img_color, cv2.COLOR_BGR2GRAY)
+# Alto de celda (px) al que se normalizan las fotos grandes antes del OCR; 0 desactiva
+TARGET_CELL_HEIGHT = int(os.getenv("TARGET_CELL_HEIGHT", "64"))
 
-    # Preprocesado global (umbral) que ya existe en preproc
-    processed = preprocess_image(image_path)
+# Fracción mínima de la foto que se supone ocupa el cartón cuando hay que localizarlo
+LOCATE_CARD_FRACTION = 0.5
 
-    rows, cols = grid
-    height, width = processed.shape
-    cell_h = height // rows
-    cell_w = width // cols
-
-    # Dibujar la cuadrícula sobre una copia de la imagen original (escala apropiada)
-    overlay = img_color.copy()
-    # Si la imagen preprocesada tiene distinto tamaño, redimensionamos la overlay para alinear
-    if (overlay.shape[0] != height) or (overlay.shape[1] != width):
-        overlay = cv2.resize(overlay, (width, height), interpolation=cv2.INTER_AREA)
-
-    line_color = (0, 0, 255)  # rojo BGR
-    line_thickness = max(1, min(width, height) // 200)
-
-    # Dibujar líneas verticales y horizontales
-    for c in range(1, cols):
-        x = int(c * cell_w)
-        cv2.line(overlay, (x, 0), (x, height), line_color, line_thickness)
-    for r in range(1, rows):
-        y = int(r * cell_h)
-        cv2.line(overlay, (0, y), (width, y), line_color, line_thickness)
+# Color de la cuadrícula en las imágenes de diagnóstico (rojo BGR)
+GRID_COLOR = (0, 0, 255)
 
-    if save_grid_path:
-        # Guardar la imagen en color con la cuadrícula (overlay)
-        cv2.imwrite(save_grid_path, overlay)
+# Casilla FREE: proporción ancho/alto de la tinta a partir de la cual es un texto o
+# logo (un bloque ancho) y la que basta si además hay más de dos letras en la línea
+FREE_MIN_ASPECT = 2.4
+FREE_MIN_LETTERS_ASPECT = 2.0
+
+
+def pipeline_options(classifier=True):
+    """Ajustes del entorno que, además de PIPELINE_VERSION, cambian los textos
+    detectados: umbrales de confirmación, memoria de celdas y clasificador (``None``
+    si está desactivado). Forman parte de la clave de la caché de resultados."""
+    return {
+        "confirm": (CONFIRM_MIN_CONFIDENCE, CONFIRM_MAX_NUMBER),
+        "memo": tuple(sorted(CellMemo.env_options().items())),
+        "classifier": tuple(sorted(DigitClassifier.env_options().items())) if classifier else None,
+    }
+
+
+def validate_extension(filename):
+    """Lanza ValueError si la extensión de ``filename`` no es un formato aceptado."""
+    file_ext = os.path.splitext(filename or '')[1].lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise ValueError(f"Formato de archivo no permitido. Use: {', '.join(ALLOWED_EXTENSIONS)}")
+    return file_ext
 
-    # Crear máscara global donde volcamos cada celda procesada (fondo negro, números blancos)
-    full_mask = np.zeros_like(processed)
 
-    detected = []
+def validate_grid(rows, cols):
+    """Lanza ValueError si la cuadrícula no está entre 1x1 y MAX_GRID x MAX_GRID."""
+    if not (1 <= rows <= MAX_GRID and 1 <= cols <= MAX_GRID):
+        raise ValueError(f"Las dimensiones del grid deben estar entre 1 y {MAX_GRID}")
 
-    # Extraer cada celda, aplicar OCR por celda
+
+def remove_speckles(cell_bw, min_area=None, max_labels=None):
+    """Elimina las componentes blancas más pequeñas que el área mínima de la celda.
+
+    Equivale a pintar cada etiqueta válida por separado, pero en una sola pasada:
+    una tabla de búsqueda por etiqueta (255 si el área supera el mínimo) indexada
+    con la matriz de etiquetas.
+    """
+    area = cell_bw.shape[0] * cell_bw.shape[1]
+    # Con 8-conectividad hay como mucho area/4 componentes: etiquetas de 16 bits si caben
+    if max_labels is None:
+        max_labels = area // 4
+    ltype = cv2.CV_16U if max_labels < 65535 else cv2.CV_32S
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(cell_bw, connectivity=8, ltype=ltype)
+    # área mínima: proporcional al área de la celda
+    if min_area is None:
+        min_area = max(8, area // 500)
+    lut = np.where(stats[:, cv2.CC_STAT_AREA] >= min_area, 255, 0).astype(np.uint8)
+    lut[0] = 0  # fondo
+    return np.take(lut, labels)
+
+
+def clear_border(cell_bw):
+    """Pone a negro toda región blanca (4-conectada) que toque el borde de la celda.
+
+    Mismo resultado que lanzar ``cv2.floodFill`` desde cada píxel blanco del borde,
+    pero con un único floodFill: se rodea la celda con un marco blanco de 1 px, que
+    queda conectado con todas esas regiones, y se rellena desde una esquina del marco.
+    """
+    framed = cv2.copyMakeBorder(cell_bw, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=255)
+    cv2.floodFill(framed, None, (0, 0), 0)
+    return framed[1:-1, 1:-1]
+
+
+def grid_edges(height, width, rows, cols, lines=None):
+    """Posiciones (ys, xs) de las rows+1 y cols+1 líneas de la cuadrícula: las
+    detectadas en ``lines`` o, por eje, el reparto a partes iguales."""
+    ys, xs = lines if lines is not None else (None, None)
+    if ys is None:
+        ys = [i * (height // rows) for i in range(rows + 1)]
+    if xs is None:
+        xs = [j * (width // cols) for j in range(cols + 1)]
+    return [int(y) for y in ys], [int(x) for x in xs]
+
+
+def draw_grid(canvas, ys, xs, color, thickness, homography=None, border=False):
+    """Dibuja las líneas de la cuadrícula (interiores, y el borde si ``border``).
+
+    Las posiciones están en coordenadas de la imagen procesada; con ``homography``
+    (de la imagen original a la procesada) se dibujan sobre la original.
+    """
+    first, last = (0, None) if border else (1, -1)
+    segments = [((x, ys[0]), (x, ys[-1])) for x in xs[first:last]]
+    segments += [((xs[0], y), (xs[-1], y)) for y in ys[first:last]]
+    if not segments:
+        return canvas
+    points = np.array(segments, np.float32).reshape(-1, 1, 2)
+    if homography is not None:
+        points = cv2.perspectiveTransform(points, np.linalg.inv(homography))
+    for p0, p1 in points.reshape(-1, 2, 2).round().astype(int):
+        cv2.line(canvas, tuple(int(v) for v in p0), tuple(int(v) for v in p1), color, thickness)
+    return canvas
+
+
+def cell_boxes(height, width, rows, cols, lines=None):
+    """Recortes (xa, ya, xb, yb) de cada celda, fila a fila, con un pequeño margen
+    para evitar las líneas de separación.
+
+    Con ``lines=(ys, xs)`` (de ``detect_grid_lines``) cada celda va de una línea a la
+    siguiente; un eje en ``None`` se reparte a partes iguales.
+    """
+    ys, xs = grid_edges(height, width, rows, cols, lines)
+    boxes = []
     for i in range(rows):
-        row_texts = []
         for j in range(cols):
-            x0 = j * cell_w
-            y0 = i * cell_h
-            x1 = x0 + cell_w
-            y1 = y0 + cell_h
+            x0, x1 = xs[j], xs[j + 1]
+            y0, y1 = ys[i], ys[i + 1]
 
             # Añadir pequeño margen para evitar líneas de separación
-            pad_x = max(2, int(cell_w * 0.05))
-            pad_y = max(2, int(cell_h * 0.05))
+            pad_x = max(2, int((x1 - x0) * 0.05))
+            pad_y = max(2, int((y1 - y0) * 0.05))
             xa = max(0, x0 + pad_x)
             ya = max(0, y0 + pad_y)
             xb = min(width, x1 - pad_x)
             yb = min(height, y1 - pad_y)
 
-            cell = processed[ya:yb, xa:xb]
             # Si la celda queda vacía por recortes, usar el recorte sin padding
-            if cell.size == 0:
-                cell = processed[y0:y1, x0:x1]
-
-            # Opcional: mejorar la celda antes de OCR
-            # Aplicar Otsu para obtener mejor binarización
-            try:
-                _, cell_bw = cv2.threshold(cell, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-            except Exception:
-                cell_bw = cell.copy()
-
-            # --- Limpieza de ruido por celda ---
-            # kernel proporcional al tamaño de la celda
-            try:
-                k = max(1, int(min(cell_bw.shape) / 30))
-            except Exception:
-                k = 1
-            # kernel debe ser impar para algunos filtros; para morfologie usamos rect
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, k), max(1, k)))
-
-            # Aplicar median blur si la celda es lo suficientemente grande
-            try:
-                if min(cell_bw.shape) >= 3:
-                    cell_bw = cv2.medianBlur(cell_bw, 3)
-            except Exception:
-                pass
-
-            # Apertura seguida de cierre para eliminar ruido pequeño y cerrar huecos
-            try:
-                cell_bw = cv2.morphologyEx(cell_bw, cv2.MORPH_OPEN, kernel)
-                cell_bw = cv2.morphologyEx(cell_bw, cv2.MORPH_CLOSE, kernel)
-            except Exception:
-                pass
-
-            # Eliminar componentes conectadas muy pequeñas (speckles)
-            try:
-                num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(cell_bw, connectivity=8)
-                # área mínima: proporcional al área de la celda
-                min_area = max(8, (cell_bw.shape[0] * cell_bw.shape[1]) // 500)
-                cleaned = np.zeros_like(cell_bw)
-                for lbl in range(1, num_labels):
-                    area = stats[lbl, cv2.CC_STAT_AREA]
-                    if area >= min_area:
-                        cleaned[labels == lbl] = 255
-                cell_bw = cleaned
-            except Exception:
-                pass
-
-            # --- Cambiar fondo: floodFill desde los bordes blancos hacia el interior hasta encontrar zonas negras ---
-            flood = cell_bw.copy()
-            h_c, w_c = flood.shape
-            # máscara para floodFill requiere tamaño (h+2, w+2)
-            mask = np.zeros((h_c + 2, w_c + 2), np.uint8)
-
-            # floodFill desde los cuatro bordes donde haya pixels blancos (255)
-            # recorrer top/bottom rows
-            for x in range(w_c):
-                if flood[0, x] == 255:
-                    cv2.floodFill(flood, mask, (x, 0), 0)
-                if flood[h_c - 1, x] == 255:
-                    cv2.floodFill(flood, mask, (x, h_c - 1), 0)
-            # recorrer left/right cols
-            for y in range(h_c):
-                if flood[y, 0] == 255:
-                    cv2.floodFill(flood, mask, (0, y), 0)
-                if flood[y, w_c - 1] == 255:
-                    cv2.floodFill(flood, mask, (w_c - 1, y), 0)
-
-            # Ahora 'flood' tiene el fondo convertido a negro (0) hasta encontrar regiones negras
-            # Asegurarnos de que los números estén en blanco (255) y el fondo en negro (0)
-            white_pixels = np.count_nonzero(flood == 255)
-            black_pixels = np.count_nonzero(flood == 0)
-            if white_pixels < black_pixels:
-                # Si hay más negro que blanco, invertir para que números queden blancos
-                flood = cv2.bitwise_not(flood)
+            if xb <= xa or yb <= ya:
+                xa, ya, xb, yb = x0, y0, x1, y1
+            boxes.append((xa, ya, xb, yb))
+    return boxes
+
+
+def clean_cell(cell):
+    """Canalización de limpieza original de una celda (referencia).
 
+    Devuelve la celda binarizada con el fondo en blanco y los números en negro.
+    """
+    # Opcional: mejorar la celda antes de OCR
+    # Aplicar Otsu para obtener mejor binarización
+    try:
+        _, cell_bw = cv2.threshold(cell, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    except Exception:
+        cell_bw = cell.copy()
+
+    # --- Limpieza de ruido por celda ---
+    # kernel proporcional al tamaño de la celda
+    try:
+        k = max(1, int(min(cell_bw.shape) / 30))
+    except Exception:
+        k = 1
+    # kernel debe ser impar para algunos filtros; para morfologie usamos rect
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, k), max(1, k)))
+
+    # Aplicar median blur si la celda es lo suficientemente grande
+    try:
+        if min(cell_bw.shape) >= 3:
+            cell_bw = cv2.medianBlur(cell_bw, 3)
+    except Exception:
+        pass
+
+    # Apertura seguida de cierre para eliminar ruido pequeño y cerrar huecos
+    try:
+        cell_bw = cv2.morphologyEx(cell_bw, cv2.MORPH_OPEN, kernel)
+        cell_bw = cv2.morphologyEx(cell_bw, cv2.MORPH_CLOSE, kernel)
+    except Exception:
+        pass
+
+    # Eliminar componentes conectadas muy pequeñas (speckles)
+    try:
+        cell_bw = remove_speckles(cell_bw)
+    except Exception:
+        pass
+
+    # --- Cambiar fondo: borrar (a negro) las zonas blancas conectadas con los bordes ---
+    flood = clear_border(cell_bw)
+
+    # Ahora 'flood' tiene el fondo convertido a negro (0) hasta encontrar regiones negras
+    # Asegurarnos de que los números estén en blanco (255) y el fondo en negro (0)
+    white_pixels = np.count_nonzero(flood == 255)
+    black_pixels = np.count_nonzero(flood == 0)
+    if white_pixels < black_pixels:
+        # Si hay más negro que blanco, invertir para que números queden blancos
+        flood = cv2.bitwise_not(flood)
+    return flood
+
+
+def clean_card(processed, boxes):
+    """Misma limpieza que ``clean_cell`` pero de todas las celdas a la vez.
+
+    Umbral, median blur, apertura/cierre, speckles y borrado del fondo se aplican una
+    sola vez sobre la imagen completa; los umbrales de Otsu de cada celda salen de
+    histogramas por bloques. Las franjas entre recortes se mantienen en negro para que
+    no unan componentes de celdas vecinas. Devuelve un recorte limpio por celda.
+    """
+    boxes_arr = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    thresholds = block_otsu_thresholds(processed, boxes_arr)
+
+    # Máscara de celdas y mapa de umbrales (255 fuera de las celdas => nunca se supera)
+    inside = np.zeros_like(processed)
+    tmap = np.full_like(processed, 255)
+    for (xa, ya, xb, yb), t in zip(boxes, thresholds):
+        inside[ya:yb, xa:xb] = 255
+        tmap[ya:yb, xa:xb] = t
+    bw = cv2.bitwise_and(cv2.compare(processed, tmap, cv2.CMP_GT), inside)
+
+    # Kernel y área mínima de una celda típica. Las franjas entre recortes (2 * 5% de la
+    # celda) son más anchas que el kernel (celda / 30): el cierre no puede unir celdas
+    cell_h = int(np.median(boxes_arr[:, 3] - boxes_arr[:, 1]))
+    cell_w = int(np.median(boxes_arr[:, 2] - boxes_arr[:, 0]))
+    k = max(1, int(min(cell_h, cell_w) / 30))
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (k, k))
+    if min(cell_h, cell_w) >= 3:
+        bw = cv2.medianBlur(bw, 3)
+    bw = cv2.morphologyEx(bw, cv2.MORPH_OPEN, kernel)
+    bw = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, kernel)
+
+    # Tras la apertura cada componente contiene un cuadrado k x k: eso acota el número
+    # de etiquetas y permite etiquetas de 16 bits aunque la imagen sea grande
+    step = max(2, k)
+    max_labels = (processed.shape[0] // step + 1) * (processed.shape[1] // step + 1)
+    bw = remove_speckles(bw, min_area=max(8, (cell_h * cell_w) // 500), max_labels=max_labels)
+
+    # Fondo: las franjas entre celdas en blanco forman una red unida al marco, así que
+    # un único floodFill borra todo lo que toca el borde de cualquier celda
+    flood = clear_border(cv2.bitwise_or(bw, cv2.bitwise_not(inside)))
+
+    # Invertir las celdas con más negro que blanco (conteo por celda con la imagen integral)
+    integral = cv2.integral(cv2.threshold(flood, 127, 1, cv2.THRESH_BINARY)[1])
+    xa, ya, xb, yb = boxes_arr.T
+    white = integral[yb, xb] - integral[ya, xb] - integral[yb, xa] + integral[ya, xa]
+    invert = white < (xb - xa) * (yb - ya) - white
+    cells = []
+    for (xa, ya, xb, yb), inv in zip(boxes, invert):
+        cell = flood[ya:yb, xa:xb]
+        cells.append(cv2.bitwise_not(cell) if inv else cell)
+    return cells
+
+
+def is_free_text(ink):
+    """Si la tinta de la casilla central es un texto o un logo y no un número: varias
+    letras en una misma línea o un bloque de tinta mucho más ancho que alto.
+
+    Las manchas pequeñas (menos de un 10% de la mayor) no cuentan. Un número del
+    cartón tiene como mucho dos dígitos y su caja es, como mucho, ~1.9 veces más
+    ancha que alta; FREE sale a partir de ~2.5 aunque la limpieza lo parta en trozos.
+    """
+    num, _labels, comp, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    comp = comp[1:]
+    if not len(comp):
+        return False
+    comp = comp[comp[:, cv2.CC_STAT_AREA] >= 0.1 * comp[:, cv2.CC_STAT_AREA].max()]
+    x0, y0 = comp[:, cv2.CC_STAT_LEFT].min(), comp[:, cv2.CC_STAT_TOP].min()
+    x1 = (comp[:, cv2.CC_STAT_LEFT] + comp[:, cv2.CC_STAT_WIDTH]).max()
+    y1 = (comp[:, cv2.CC_STAT_TOP] + comp[:, cv2.CC_STAT_HEIGHT]).max()
+    width, height = x1 - x0, max(1, y1 - y0)
+    if width >= FREE_MIN_ASPECT * height or width >= 0.6 * ink.shape[1]:
+        return True
+    # Letras: componentes con al menos la mitad del alto de la línea
+    letters = (comp[:, cv2.CC_STAT_HEIGHT] >= 0.5 * height).sum()
+    return letters > 2 and width >= FREE_MIN_LETTERS_ASPECT * height
+
+
+def blank_cell_kind(area, centre=False, min_ink=0.005):
+    """Detecta celdas que no hace falta leer, con un par de operaciones baratas.
+
+    Args:
+        area (np.ndarray): celda limpia (binaria) sin la franja superior.
+        centre (bool): si es la casilla central de un cartón 5x5 (la FREE).
+        min_ink (float): fracción mínima de tinta para considerar que hay algo escrito.
+
+    Returns:
+        str|None: "free" para la casilla central con un texto o logo que no son
+        números (ver ``is_free_text``), "empty" si no hay tinta suficiente o ninguna
+        componente tiene forma de dígito, ``None`` si la celda hay que leerla.
+    """
+    ink = ink_mask(area)
+    if cv2.countNonZero(ink) < min_ink * ink.size:
+        return "empty"
+    num, _labels, comp, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    heights = comp[1:, cv2.CC_STAT_HEIGHT]
+    widths = comp[1:, cv2.CC_STAT_WIDTH]
+    # Dígito: al menos un 20% del alto de la zona y no más ancho que dos dígitos pegados
+    tall = heights >= 0.2 * area.shape[0]
+    digit_like = tall & (widths <= 3 * heights)
+    if centre and is_free_text(ink):
+        return "free"
+    if not digit_like.any():
+        return "empty"
+    return None
+
+
+def load_for_ocr(image, grid=(5, 5), locate=False, target_cell_height=None):
+    """Imagen en gris a la resolución del OCR (ver ``load_normalised``) y su escala
+    (sx, sy) respecto al original. Con ``locate`` se reserva resolución para un
+    cartón que ocupe solo LOCATE_CARD_FRACTION de la foto."""
+    if target_cell_height is None:
+        target_cell_height = TARGET_CELL_HEIGHT
+    return load_normalised(image, grid, target_cell_height,
+                           card_fraction=LOCATE_CARD_FRACTION if locate else 1.0)
+
+
+def render_overlay(image, diagnostics, scale=None):
+    """Imagen original en color (BGR) con la cuadrícula detectada dibujada encima.
+
+    Si el cartón se redujo o enderezó, las líneas se proyectan de vuelta a las
+    coordenadas de ``image`` con la homografía de ``diagnostics``. Con ``scale``
+    (sx, sy), ``image`` es la ya reducida por ``load_for_ocr``: se amplía al tamaño
+    original y las líneas se proyectan a él.
+    """
+    overlay = load_image(image)
+    homography = diagnostics["homography"]
+    if scale is not None and tuple(scale) != (1.0, 1.0):
+        scale_x, scale_y = scale
+        height, width = overlay.shape[:2]
+        overlay = cv2.resize(overlay, (round(width / scale_x), round(height / scale_y)),
+                             interpolation=cv2.INTER_LINEAR)
+        to_reduced = np.diag([scale_x, scale_y, 1.0])
+        homography = to_reduced if homography is None else homography @ to_reduced
+    if overlay.ndim == 2:
+        overlay = cv2.cvtColor(overlay, cv2.COLOR_GRAY2BGR)
+    else:
+        overlay = overlay.copy()
+    return draw_grid(overlay, diagnostics["ys"], diagnostics["xs"], GRID_COLOR,
+                     max(1, min(overlay.shape[:2]) // 200), homography,
+                     border=diagnostics["located"])
+
+
+def render_mask(diagnostics):
+    """Máscara compuesta de las celdas limpias (fondo negro, números blancos) en BGR
+    con la cuadrícula dibujada."""
+    mask = diagnostics["mask"]
+    bw_bgr = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+    return draw_grid(bw_bgr, diagnostics["ys"], diagnostics["xs"], GRID_COLOR,
+                     max(1, min(mask.shape) // 200))
+
+
+def process_image(image, grid=(5, 5), save_grid_path=None, ocr_mode="cell", cleanup="card",
+                  memo=None, classifier=None, stats=None, locate=False,
+                  target_cell_height=None, timings=None, diagnostics=None, cells=None):
+    """Divide la imagen en una cuadrícula, extrae texto por celda y opcionalmente guarda
+    una copia de la imagen original con la cuadrícula dibujada.
+
+    Args:
+        image (str|bytes|np.ndarray): ruta a la imagen de entrada, bytes codificados
+            (PNG/JPEG...) o imagen ya decodificada (BGR o escala de grises).
+        grid (tuple): (rows, cols) tamaño de la cuadrícula. Default (5,5).
+        save_grid_path (str|None): si se provee, guarda la imagen con la cuadrícula dibujada en esa ruta.
+        ocr_mode (str): "cell" (un Tesseract por celda) o "batch" (todas las celdas
+            compuestas en una sola imagen y un único Tesseract con ``image_to_data``).
+        cleanup (str): "card" (limpieza de todas las celdas a la vez sobre la imagen
+            completa) o "cell" (canalización original por celda, como referencia).
+        memo (CellMemo|bool|None): memoria de celdas ya reconocidas; las celdas cuya
+            huella coincide no pasan por Tesseract. Solo se memorizan lecturas de
+            Tesseract confirmadas (``ocr.is_confirmed``). ``True`` usa la memoria del proceso
+            (``get_memo()``), útil cuando se ejecuta en un pool de procesos.
+        classifier (DigitClassifier|bool|None): clasificador de dígitos por plantillas
+            que se prueba antes de Tesseract; solo las celdas dudosas van a Tesseract.
+            ``True`` usa el clasificador del proceso (``get_classifier()``).
+        stats (dict|None): si se provee, se rellena con el número de celdas resueltas
+            por cada camino ("empty", "free", "memo", "classifier", "tesseract").
+        locate (bool): localizar la rejilla impresa en la foto (``detect_card``),
+            enderezarla y cortar las celdas por las líneas detectadas en lugar de
+            repartir la foto entera a partes iguales. Si no se encuentra, se usa la
+            foto completa.
+        target_cell_height (int|None): alto de celda al que se reducen las fotos
+            grandes (``load_normalised``); ``None`` usa TARGET_CELL_HEIGHT y 0 procesa
+            la imagen a resolución completa.
+        timings (dict|None): si se provee, se le suman los segundos de cada etapa
+            ("decode", "locate", "preprocess", "cleanup", "memo", "classifier", "ocr",
+            "overlay"); "ocr" acumula las llamadas a Tesseract de todas las celdas.
+        diagnostics (dict|None): si se provee, se rellena con lo necesario para
+            dibujar después las imágenes de diagnóstico (``render_overlay`` y
+            ``render_mask``): líneas ``ys``/``xs``, ``homography``, ``located`` y la
+            máscara compuesta ``mask``. No dibuja ni codifica nada.
+        cells (list[int]|None): índices (fila a fila) de las únicas celdas que hay que
+            leer; las demás quedan a ``None`` en el resultado. Lo usa el modo de
+            vídeo (``stream.CellTracker``) para releer solo las celdas que cambian.
+
+    Returns:
+        list[list[str]]: matriz de textos detectados por fila.
+    """
+    if ocr_mode not in OCR_MODES:
+        raise ValueError(f"Modo de OCR no soportado: {ocr_mode}")
+    if cleanup not in CLEANUP_MODES:
+        raise ValueError(f"Modo de limpieza no soportado: {cleanup}")
+    validate_grid(*grid)
+
+    is_path = isinstance(image, (str, os.PathLike))
+    if is_path and not os.path.exists(image):
+        raise FileNotFoundError(f"Imagen no encontrada: {image}")
+
+    # Cargar en gris con las celdas a la resolución del OCR (las fotos grandes se
+    # decodifican ya reducidas)
+    with span(timings, "decode"):
+        img_gray, (scale_x, scale_y) = load_for_ocr(image, grid, locate, target_cell_height)
+    if img_gray is None:
+        raise IOError(f"No se pudo leer la imagen: {image if is_path else 'datos en memoria'}")
+
+    # Transformación de la imagen original a la procesada, para dibujar la cuadrícula
+    homography = None
+    if (scale_x, scale_y) != (1.0, 1.0):
+        homography = np.diag([scale_x, scale_y, 1.0])
+
+    # Localizar la rejilla impresa y enderezarla: solo se procesa la zona del cartón
+    located = False
+    if locate:
+        with span(timings, "locate"):
+            quad = detect_card(img_gray)
+            if quad is not None:
+                img_gray, warp = warp_card(img_gray, quad)
+                homography = warp if homography is None else warp @ homography
+                located = True
+
+    # Preprocesado global (umbral) que ya existe en preproc, sobre la imagen ya decodificada
+    with span(timings, "preprocess"):
+        processed = preprocess_image(img_gray)
+
+    rows, cols = grid
+    height, width = processed.shape
+    # Líneas de la cuadrícula: detectadas sobre el cartón localizado o a partes iguales
+    lines = None
+    if locate:
+        with span(timings, "locate"):
+            lines = detect_grid_lines(processed, rows, cols)
+    ys, xs = grid_edges(height, width, rows, cols, lines)
+
+    # La máscara compuesta solo se construye si alguien va a verla
+    if save_grid_path and diagnostics is None:
+        diagnostics = {}
+    if diagnostics is not None:
+        diagnostics.update(ys=ys, xs=xs, homography=homography, located=located)
+
+    if save_grid_path:
+        # Guardar la imagen original en color con la cuadrícula (overlay)
+        with span(timings, "overlay"):
+            cv2.imwrite(save_grid_path, render_overlay(image, diagnostics))
+
+    if memo is True:
+        memo = get_memo()
+    if classifier is True:
+        classifier = get_classifier()
+
+    with span(timings, "cleanup"):
+        # Crear máscara global donde volcamos cada celda procesada (fondo negro, números blancos)
+        full_mask = np.zeros_like(processed) if diagnostics is not None else None
+
+        # Imágenes listas para OCR, en orden fila a fila
+        ocr_images = []
+        batch_images = []
+        bands = []
+
+        # Extraer y limpiar cada celda
+        boxes = cell_boxes(height, width, rows, cols, (ys, xs))
+        # La limpieza por cartón necesita margen entre recortes (celdas de al menos unos px)
+        if cleanup == "card" and min(np.diff(ys).min(), np.diff(xs).min()) >= 8:
+            floods = clean_card(processed, boxes)
+        else:
+            floods = [clean_cell(processed[ya:yb, xa:xb]) for xa, ya, xb, yb in boxes]
+
+        for (xa, ya, xb, yb), flood in zip(boxes, floods):
             # --- Borrar letra en la parte superior de la celda ---
             # Definir primer cuarto superior de la celda
             h_f, w_f = flood.shape
@@ -164,47 +495,142 @@ def process_image(image_path, grid=(5, 5), save_grid_path=None):
             # Establecer la región superior al color de fondo (0 -> negro) para que no afecte al OCR
             flood_for_ocr[0:quarter_h, :] = 0
 
+            # Para OCR usamos la versión flood_for_ocr invertida (números en negro sobre fondo blanco)
+            ocr_img = cv2.bitwise_not(flood_for_ocr)
+            ocr_images.append(ocr_img)
+            bands.append(quarter_h)
+
+            # La versión de máscara solo hace falta para el modo batch o la imagen de diagnóstico
+            if full_mask is None and ocr_mode != "batch":
+                continue
             # Para la máscara visual final, el usuario pidió que esa zona quede totalmente blanca;
             # creamos una copia para volcar en la máscara compuesta donde esa región será blanca (255)
             flood_for_mask = flood.copy()
             flood_for_mask[0:quarter_h, :] = 255
-
-            # Volcar la versión para máscara en la máscara global (alineada con coordenadas de la imagen completa)
-            # Asegurar límites (en caso de redondeos)
-            x_end = min(width, xa + w_f)
-            y_end = min(height, ya + h_f)
-            full_mask[ya:y_end, xa:x_end] = flood_for_mask[0:(y_end - ya), 0:(x_end - xa)]
-
-            # Para OCR usamos la versión flood_for_ocr invertida (números en negro sobre fondo blanco)
-            ocr_img = cv2.bitwise_not(flood_for_ocr)
-
-            try:
-                text = pytesseract.image_to_string(ocr_img, config='--psm 7 --oem 3 -c tessedit_char_whitelist=0123456789')
-            except pytesseract.pytesseract.TesseractNotFoundError:
-                raise RuntimeError("Tesseract no encontrado: asegúrate de que esté instalado y en PATH")
-
-            row_texts.append(text.strip())
-        detected.append(row_texts)
+            # En modo batch se compone la versión de máscara (números negros sobre blanco,
+            # franja superior en blanco) para que todas las celdas compartan polaridad
+            batch_images.append(flood_for_mask)
+
+            if full_mask is not None:
+                # Volcar la versión para máscara en la máscara global (alineada con coordenadas de la imagen completa)
+                # Asegurar límites (en caso de redondeos)
+                x_end = min(width, xa + w_f)
+                y_end = min(height, ya + h_f)
+                full_mask[ya:y_end, xa:x_end] = flood_for_mask[0:(y_end - ya), 0:(x_end - xa)]
+
+        texts = [None] * len(ocr_images)
+        keys = [None] * len(ocr_images)
+        # Los atajos previos a Tesseract miran solo la zona bajo la franja superior (fondo forzado)
+        digit_areas = [ocr_img[band:] for ocr_img, band in zip(ocr_images, bands)]
+
+        # Celdas vacías y la casilla FREE central (solo en cartones 5x5) no pasan por
+        # ningún reconocedor
+        centre = rows // 2 * cols + cols // 2 if (rows, cols) == (5, 5) else None
+        wanted = range(len(digit_areas)) if cells is None else sorted(set(cells))
+        for i in wanted:
+            kind = blank_cell_kind(digit_areas[i], centre=(i == centre))
+            if kind is not None:
+                texts[i] = ""
+                count_path(stats, kind)
+        unresolved = [i for i in wanted if texts[i] is None]
+
+    if memo is not None and memo.enabled:
+        with span(timings, "memo"):
+            for i in unresolved:
+                keys[i] = fingerprint(digit_areas[i])
+                texts[i] = memo.lookup(keys[i])
+    remaining = [i for i in unresolved if texts[i] is None]
+    count_path(stats, "memo", len(unresolved) - len(remaining))
+
+    if classifier is not None:
+        with span(timings, "classifier"):
+            for i in remaining:
+                texts[i] = classifier.classify(digit_areas[i])
+    pending = [i for i in remaining if texts[i] is None]
+    count_path(stats, "classifier", len(remaining) - len(pending))
+
+    # Sin binario de Tesseract el motor lanza RuntimeError
+    if ocr_mode == "batch":
+        with span(timings, "ocr"):
+            recognized, confidences = extract_text_batched([batch_images[i] for i in pending], confidences=True)
+    else:
+        recognized, confidences = [], []
+        for i in pending:
+            with span(timings, "ocr"):
+                text, confidence = read_cell(ocr_images[i], psm=7)
+            recognized.append(text)
+            confidences.append(confidence)
+    count_path(stats, "tesseract", len(pending))
+    for i, text in zip(pending, recognized):
+        texts[i] = text
+    # Solo las lecturas de Tesseract confirmadas (número válido leído con confianza)
+    # alimentan el banco de plantillas del clasificador y la memoria de celdas
+    confirmed = [i for i, confidence in zip(pending, confidences) if is_confirmed(texts[i], confidence)]
+    # Una casilla central que no se reconoció como FREE solo se acepta con una lectura
+    # confirmada: una FREE mal leída da números verosímiles ("6", "75", "11")
+    if centre in pending and centre not in confirmed:
+        texts[centre] = ""
+    if classifier is not None:
+        with span(timings, "classifier"):
+            for i in confirmed:
+                classifier.learn(digit_areas[i], texts[i])
+    # La memoria guarda solo lecturas confirmadas de Tesseract, no las del clasificador
+    if memo is not None:
+        with span(timings, "memo"):
+            for i in confirmed:
+                memo.add(keys[i], texts[i])
+
+    detected = [texts[i * cols:(i + 1) * cols] for i in range(rows)]
+
+    if diagnostics is not None:
+        diagnostics["mask"] = full_mask
 
     # Después de procesar todas las celdas, si se solicitó guardar la imagen, guardar
     # la máscara compuesta (fondo negro, números blancos) con la cuadrícula dibujada
     if save_grid_path:
-        base, ext = os.path.splitext(save_grid_path)
-        bw_path = f"{base}_bw{ext}"
-        try:
-            bw_bgr = cv2.cvtColor(full_mask, cv2.COLOR_GRAY2BGR)
-        except Exception:
-            bw_bgr = cv2.cvtColor(processed, cv2.COLOR_GRAY2BGR)
-
-        # Dibujar la cuadrícula sobre la máscara compuesta
-        for c in range(1, cols):
-            x = int(c * cell_w)
-            cv2.line(bw_bgr, (x, 0), (x, height), line_color, line_thickness)
-        for r in range(1, rows):
-            y = int(r * cell_h)
-            cv2.line(bw_bgr, (0, y), (width, y), line_color, line_thickness)
-
-        cv2.imwrite(bw_path, bw_bgr)
+        with span(timings, "overlay"):
+            base, ext = os.path.splitext(save_grid_path)
+            cv2.imwrite(f"{base}_bw{ext}", render_mask(diagnostics))
 
     return detected
+
+
+def warm_up(digits="27", cell=64):
+    """Procesa un cartón sintético de una fila con ``digits`` (un dígito por celda).
+
+    Carga el motor de OCR en el hilo o proceso que lo ejecuta y pasa una vez por
+    cada etapa de la canalización, para que la primera petición real no pague esas
+    inicializaciones. Sin memoria ni clasificador: las celdas llegan a Tesseract.
+
+    Returns:
+        list[str]: textos leídos (``list(digits)`` si todo va bien).
+    """
+    width = cell * len(digits)
+    card = np.full((cell, width), 255, np.uint8)
+    scale = cv2.getFontScaleFromHeight(cv2.FONT_HERSHEY_SIMPLEX, cell * 2 // 5)
+    for j, digit in enumerate(digits):
+        cv2.putText(card, digit, (j * cell + cell // 3, cell - cell // 6), cv2.FONT_HERSHEY_SIMPLEX,
+                    scale, 0, 3, cv2.LINE_AA)
+        cv2.line(card, (j * cell, 0), (j * cell, cell), 0, 2)
+    cv2.rectangle(card, (0, 0), (width - 1, cell - 1), 0, 2)
+    return process_image(card, grid=(1, len(digits)), target_cell_height=0)[0]
+
+
+def process_image_with_stats(image, timings=False, diagnostics=False, **kwargs):
+    """``process_image`` que devuelve también las celdas resueltas por cada camino.
+
+    Pensada para ejecutarse en un pool de procesos, donde un dict de salida pasado
+    como argumento no vuelve al llamador.
+
+    Returns:
+        tuple: (grid, stats), más los segundos por etapa con ``timings=True`` y el
+        dict de ``diagnostics`` con ``diagnostics=True``, en ese orden.
+    """
+    stats = {"empty": 0, "free": 0, "memo": 0, "classifier": 0, "tesseract": 0}
+    if not timings and not diagnostics:
+        return process_image(image, stats=stats, **kwargs), stats
+    spans = {} if timings else None
+    diag = {} if diagnostics else None
+    grid = process_image(image, stats=stats, timings=spans, diagnostics=diag, **kwargs)
+    return (grid, stats) + tuple(extra for extra in (spans, diag) if extra is not None)
     
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""Hojas con varios cartones: localiza cada cartón de la foto de una página y lo
+recorta para la canalización de un cartón.
+
+Los cartones se buscan en una copia reducida de la hoja (``detect_cards``). Cada uno
+se recorta como vista de la imagen decodificada, sin copiar píxeles, y se procesa
+con ``locate=True`` para enderezar su rejilla dentro del recorte. La lectura de los
+recortes la reparte el pool de OCR de la API (``OCRPool``), como la de cualquier
+cartón, así que una hoja tarda poco más que un cartón suelto.
+"""
+import os
+
+import cv2
+import numpy as np
+
+from .preproc import _REDUCED_GRAYSCALE, detect_cards
+from .processor import TARGET_CELL_HEIGHT, validate_grid
+from .utils import load_image, read_image_size
+
+# Lado mayor (px) de la copia en la que se buscan los cartones
+DETECT_SIDE = 1600
+
+# Margen alrededor de cada cartón al recortarlo (fracción de su lado mayor): la
+# rejilla se vuelve a localizar dentro del recorte y no debe quedar cortada
+CROP_MARGIN = 0.05
+
+# Cartones que se leen como mucho de una hoja (los mayores)
+SHEET_MAX_CARDS = int(os.getenv("SHEET_MAX_CARDS", "12"))
+
+
+def _reduction(size, needed):
+    """Mayor reducción de decodificación (8, 4, 2 o 1) que deja ``size`` en al menos ``needed``."""
+    for factor, _flag in _REDUCED_GRAYSCALE:
+        if size / factor >= needed:
+            return factor
+    return 1
+
+
+def _decode_gray(data, factor):
+    return load_image(data, dict(_REDUCED_GRAYSCALE).get(factor, cv2.IMREAD_GRAYSCALE))
+
+
+def sheet_crops(source, grid=(5, 5), target_cell_height=None, max_cards=SHEET_MAX_CARDS):
+    """Localiza los cartones de una hoja y los recorta.
+
+    Con bytes o una ruta, los cartones se buscan en una decodificación reducida
+    (lado mayor de al menos ``DETECT_SIDE``) y esa misma imagen se recorta si sus
+    celdas llegan a ``target_cell_height``. Si no llegan, la hoja se decodifica otra
+    vez con la reducción que necesita el cartón más pequeño. Los recortes son vistas
+    de la imagen decodificada.
+
+    Returns:
+        tuple: (recortes en gris, cajas ``[x, y, ancho, alto]`` de cada cartón en
+        píxeles de la imagen original), en orden de lectura. Listas vacías si no
+        aparece ningún cartón.
+
+    Raises:
+        ValueError: si la imagen no se puede decodificar.
+    """
+    validate_grid(*grid)
+    rows, cols = grid
+    if target_cell_height is None:
+        target_cell_height = TARGET_CELL_HEIGHT
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            source = fh.read()
+
+    original = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        original = read_image_size(source)
+        factor = _reduction(max(original), DETECT_SIDE) if original else 1
+        gray = _decode_gray(source, factor)
+    else:
+        gray = load_image(source)
+        if gray is not None and gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    if gray is None:
+        raise ValueError("No se pudo decodificar la imagen")
+    if original is None:
+        original = gray.shape
+    elif (original[0] > original[1]) != (gray.shape[0] > gray.shape[1]):
+        # Con orientación EXIF la cabecera trae los lados intercambiados
+        original = original[::-1]
+
+    quads = detect_cards(gray, max_side=DETECT_SIDE, max_cards=max_cards)
+    if not quads:
+        return [], []
+
+    # Más resolución solo si las celdas del cartón más pequeño se quedan cortas
+    sx, sy = original[1] / gray.shape[1], original[0] / gray.shape[0]
+    smallest = min(min(np.ptp(quad[:, 1]) * sy / rows, np.ptp(quad[:, 0]) * sx / cols) for quad in quads)
+    if target_cell_height and isinstance(source, (bytes, bytearray, memoryview)):
+        needed = _reduction(smallest, target_cell_height)
+        if needed < round(sx):
+            full = _decode_gray(source, needed)
+            if full is not None:
+                quads = [quad * (full.shape[1] / gray.shape[1], full.shape[0] / gray.shape[0]) for quad in quads]
+                gray = full
+                sx, sy = original[1] / gray.shape[1], original[0] / gray.shape[0]
+
+    height, width = gray.shape
+    crops, boxes = [], []
+    for quad in quads:
+        x0, y0 = quad.min(axis=0)
+        x1, y1 = quad.max(axis=0)
+        margin = CROP_MARGIN * max(x1 - x0, y1 - y0)
+        x0, y0 = max(0, int(x0 - margin)), max(0, int(y0 - margin))
+        x1, y1 = min(width, int(x1 + margin) + 1), min(height, int(y1 + margin) + 1)
+        crops.append(gray[y0:y1, x0:x1])
+        boxes.append([round(x0 * sx), round(y0 * sy), round((x1 - x0) * sx), round((y1 - y0) * sy)])
+    return crops, boxes
+
@@ -0,0 +1,222 @@
+"""Modo de vídeo: sigue un cartón fijo delante de una cámara y solo vuelve a leer las
+celdas que cambian de un frame a otro.
+
+De cada frame se guarda una miniatura por celda (``THUMB_SIZE`` x ``THUMB_SIZE``,
+normalizada con la media y la desviación del frame para no confundir un cambio de
+exposición con un número nuevo). La diferencia con la miniatura de la última lectura
+de cada celda se calcula para todas las celdas a la vez, y solo las que superan
+``CHANGE_THRESHOLD`` pasan por la canalización de OCR (``process_image(cells=...)``).
+
+Uso (driver local sobre un fichero de vídeo, una línea JSON por frame con cambios):
+    python -m src.stream partida.mp4 --rows 5 --cols 5 --locate
+    python -m src.stream partida.mp4 --step 5 --no-settle
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from .preproc import detect_card, warp_card
+from .processor import OCR_MODES, load_for_ocr, process_image, validate_grid
+
+# Lado (px) de la miniatura de cada celda con la que se comparan los frames, y margen
+# que se descarta en cada borde (las líneas de la cuadrícula no aportan nada y son lo
+# primero que se mueve si la cámara tiembla)
+THUMB_SIZE = 16
+THUMB_MARGIN = 2
+
+# Diferencia media por píxel (en desviaciones típicas del frame) a partir de la cual
+# una celda se considera cambiada: el ruido de cámara queda muy por debajo y un
+# número nuevo muy por encima
+CHANGE_THRESHOLD = float(os.getenv("STREAM_CHANGE_THRESHOLD", "0.15"))
+
+
+def cell_thumbnails(gray, grid, size=THUMB_SIZE, margin=THUMB_MARGIN):
+    """Miniaturas (rows, cols, size - 2 * margin, size - 2 * margin) en float32 de las
+    celdas de ``gray``, repartido a partes iguales y normalizado con la media y la
+    desviación del frame."""
+    rows, cols = grid
+    small = cv2.resize(gray, (cols * size, rows * size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    small = (small - small.mean()) / (small.std() + 1e-6)
+    thumbs = small.reshape(rows, size, cols, size).transpose(0, 2, 1, 3)
+    return thumbs[:, :, margin:size - margin, margin:size - margin]
+
+
+def cell_differences(a, b):
+    """Diferencia media absoluta (rows, cols) entre dos juegos de miniaturas."""
+    return np.abs(a - b).mean(axis=(2, 3))
+
+
+class CellTracker:
+    """Estado de un cartón a lo largo de un vídeo: textos leídos y miniaturas de
+    cada celda en su última lectura.
+
+    Cada frame se procesa en dos pasos, para poder hacer el OCR en otro hilo o
+    proceso (el pool de OCR de la API): ``observe`` decide qué celdas releer y
+    ``commit`` incorpora sus textos y devuelve los cambios. ``update`` hace los dos
+    seguidos en el hilo que lo llama.
+
+    Args:
+        grid (tuple): (rows, cols) del cartón.
+        locate (bool): localizar y enderezar el cartón en cada frame (cámara que no
+            encuadra solo el cartón). Un frame en el que no se encuentra no cambia nada.
+        threshold (float|None): umbral de cambio por celda (default: CHANGE_THRESHOLD).
+        settle (bool): esperar a que una celda cambiada se quede quieta (igual que en
+            el frame anterior) antes de leerla, para no leer una mano que pasa por
+            delante.
+        target_cell_height (int|None): alto de celda al que se reducen los frames
+            (ver ``load_for_ocr``).
+    """
+
+    def __init__(self, grid=(5, 5), locate=False, threshold=None, settle=True, target_cell_height=None):
+        validate_grid(*grid)
+        self.grid = tuple(grid)
+        self.locate = locate
+        self.threshold = CHANGE_THRESHOLD if threshold is None else threshold
+        self.settle = settle
+        self.target_cell_height = target_cell_height
+        self.reset()
+
+    def reset(self):
+        """Olvida todo lo leído: el siguiente frame se lee entero."""
+        rows, cols = self.grid
+        self.texts = [[None] * cols for _ in range(rows)]
+        self.frames = 0
+        self.cells_read = 0
+        self._reference = None  # miniaturas de cada celda en su última lectura
+        self._previous = None   # miniaturas del frame anterior
+        self._pending = None    # (miniaturas, celdas) del frame observado sin commit
+
+    def observe(self, frame):
+        """Prepara un frame (ruta, bytes codificados o imagen decodificada).
+
+        Returns:
+            tuple: (imagen del cartón en gris, índices fila a fila de las celdas que
+            hay que releer). La imagen es ``None`` si con ``locate`` no se encuentra
+            el cartón.
+
+        Raises:
+            ValueError: si el frame no se puede decodificar.
+        """
+        gray, _scale = load_for_ocr(frame, self.grid, self.locate, self.target_cell_height)
+        if gray is None:
+            raise ValueError("No se pudo decodificar el frame")
+        if self.locate:
+            quad = detect_card(gray)
+            if quad is None:
+                self._pending = None
+                return None, []
+            gray, _warp = warp_card(gray, quad)
+
+        thumbs = cell_thumbnails(gray, self.grid)
+        if self._reference is None:
+            changed = np.ones(self.grid, bool)
+        else:
+            changed = cell_differences(thumbs, self._reference) > self.threshold
+            if self.settle and self._previous is not None:
+                changed &= cell_differences(thumbs, self._previous) <= self.threshold
+        self._previous = thumbs
+        cells = np.flatnonzero(changed).tolist()
+        self._pending = (thumbs, cells)
+        return gray, cells
+
+    def commit(self, detected=None):
+        """Incorpora la lectura del último frame observado.
+
+        Args:
+            detected (list[list[str]]|None): resultado de ``process_image(image,
+                cells=cells)`` para las celdas de ``observe`` (None si no había
+                ninguna que leer).
+
+        Returns:
+            dict: ``frame`` (número de frame), ``located`` (si se vio el cartón),
+            ``read`` (celdas leídas) y ``changes``, la lista de celdas cuyo texto
+            cambió: ``{"row", "col", "text"}``.
+        """
+        self.frames += 1
+        delta = {"frame": self.frames, "located": self._pending is not None, "read": 0, "changes": []}
+        if self._pending is None:
+            return delta
+        thumbs, cells = self._pending
+        self._pending = None
+        if self._reference is None:
+            self._reference = thumbs.copy()
+        cols = self.grid[1]
+        for index in cells:
+            row, col = divmod(index, cols)
+            text = detected[row][col] if detected is not None else None
+            if text is None:
+                continue
+            self._reference[row, col] = thumbs[row, col]
+            delta["read"] += 1
+            if text != self.texts[row][col]:
+                self.texts[row][col] = text
+                delta["changes"].append({"row": row, "col": col, "text": text})
+        self.cells_read += delta["read"]
+        return delta
+
+    def update(self, frame, **kwargs):
+        """``observe`` + OCR de las celdas cambiadas + ``commit``, en este hilo.
+
+        ``kwargs`` se pasan a ``process_image`` (``ocr_mode``, ``memo``,
+        ``classifier``...).
+        """
+        image, cells = self.observe(frame)
+        detected = None
+        if cells:
+            detected = process_image(image, grid=self.grid, target_cell_height=0, cells=cells, **kwargs)
+        return self.commit(detected)
+
+
+def frames_from_video(path, step=1):
+    """Frames (BGR) de un fichero de vídeo, uno de cada ``step``."""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"No se pudo abrir el vídeo: {path}")
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if index % step == 0:
+                yield frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="fichero de vídeo (cualquier formato que lea OpenCV)")
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--cols", type=int, default=5)
+    parser.add_argument("--locate", action="store_true", help="localizar el cartón en cada frame")
+    parser.add_argument("--ocr-mode", choices=OCR_MODES, default="cell")
+    parser.add_argument("--step", type=int, default=1, help="procesar uno de cada N frames")
+    parser.add_argument("--threshold", type=float, default=CHANGE_THRESHOLD)
+    parser.add_argument("--no-settle", action="store_true", help="leer las celdas en cuanto cambian")
+    args = parser.parse_args(argv)
+
+    tracker = CellTracker((args.rows, args.cols), locate=args.locate, threshold=args.threshold,
+                          settle=not args.no_settle)
+    start = time.perf_counter()
+    for frame in frames_from_video(args.video, max(1, args.step)):
+        delta = tracker.update(frame, ocr_mode=args.ocr_mode, memo=True, classifier=True)
+        if delta["changes"] or not delta["located"]:
+            print(json.dumps(delta, ensure_ascii=False), flush=True)
+    elapsed = time.perf_counter() - start
+    full = tracker.frames * args.rows * args.cols
+    print(f"{tracker.frames} frames en {elapsed:.1f}s ({tracker.frames / max(elapsed, 1e-9):.1f} fps), "
+          f"{tracker.cells_read} celdas leídas de {full} ({tracker.cells_read / max(full, 1):.1%})",
+          file=sys.stderr)
+    print(json.dumps({"grid": tracker.texts}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
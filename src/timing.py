@@ -0,0 +1,53 @@
+import time
+
+
+class _Span:
+    """Suma al dict ``timings`` los segundos que pasan dentro del bloque ``with``."""
+
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(timings, name):
+    """Bloque ``with`` que acumula su duración en ``timings[name]`` (segundos).
+
+    Con ``timings=None`` devuelve siempre el mismo objeto vacío: medir desactivado no
+    reserva memoria ni llama al reloj.
+    """
+    return _NULL_SPAN if timings is None else _Span(timings, name)
+
+
+def merge(into, timings):
+    """Suma las etapas de ``timings`` a las de ``into``."""
+    for name, seconds in timings.items():
+        into[name] = into.get(name, 0.0) + seconds
+    return into
+
+
+def to_ms(timings):
+    """Copia de ``timings`` en milisegundos, redondeada para el JSON de respuesta."""
+    return {name: round(seconds * 1000, 2) for name, seconds in timings.items()}
@@ -1,12 +1,55 @@
+import os
+import struct
 import cv2
+import numpy as np
 
 def save_image(image, filename):
     """Saves an image to the specified filename."""
     cv2.imwrite(filename, image)
 
-def load_image(filepath):
-    """Loads an image from the specified filepath."""
-    return cv2.imread(filepath)
+def load_image(source, flags=cv2.IMREAD_COLOR):
+    """Loads an image from a filepath, encoded bytes or an already decoded array.
+
+    Arrays are returned as-is, bytes are decoded in memory with ``cv2.imdecode``.
+    Returns None when the data cannot be decoded, like ``cv2.imread``.
+    """
+    if isinstance(source, np.ndarray):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(source, np.uint8), flags)
+    return cv2.imread(os.fspath(source), flags)
+
+def read_image_size(data):
+    """Returns (height, width) from the header of encoded PNG, JPEG or BMP bytes.
+
+    Only the header is parsed, nothing is decoded. Returns None for other formats
+    or truncated data.
+    """
+    data = bytes(data[:65536]) if len(data) > 65536 else bytes(data)
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return height, width
+    if data[:2] == b"BM" and len(data) >= 26:
+        width, height = struct.unpack("<ii", data[18:26])
+        return abs(height), width
+    if data[:2] == b"\xff\xd8":
+        # Walk the JPEG segments up to the first start-of-frame marker
+        pos = 2
+        while pos + 9 <= len(data):
+            if data[pos] != 0xFF:
+                return None
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+                return height, width
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                pos += 2
+                continue
+            pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+    return None
 
 def convert_to_grayscale(image):
     """Converts an image to grayscale."""
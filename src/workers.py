@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """La cola de admisión del pool de OCR está llena."""
+
+    def __init__(self, retry_after):
+        super().__init__("Servidor ocupado: cola de OCR llena")
+        self.retry_after = retry_after
+
+
+def _after_barrier(barrier, fn, timeout):
+    # Si algún hilo está ocupado (p. ej. con una petición) no se espera indefinidamente
+    try:
+        barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        pass
+    return fn()
+
+
+class OCRPool:
+    """Executor (hilos o procesos) para el trabajo de OCR con admisión acotada.
+
+    Como mucho ``max_workers`` trabajos corren a la vez y ``max_queue`` esperan
+    turno; cualquier trabajo adicional se rechaza al instante con
+    ``PoolSaturated`` en lugar de dejar crecer la latencia sin límite.
+
+    ``on_change`` (opcional) recibe ``stats()`` cada vez que entra o sale un trabajo.
+    """
+
+    def __init__(self, kind="thread", max_workers=None, max_queue=None, retry_after=1):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Tipo de executor no soportado: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = self.max_workers * 2 if max_queue is None else max_queue
+        self.retry_after = retry_after
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.on_change = None
+
+    @classmethod
+    def from_env(cls):
+        """Crea el pool a partir de OCR_EXECUTOR, OCR_WORKERS, OCR_QUEUE_SIZE y OCR_RETRY_AFTER."""
+        workers = os.getenv("OCR_WORKERS")
+        queue = os.getenv("OCR_QUEUE_SIZE")
+        return cls(
+            kind=os.getenv("OCR_EXECUTOR", "thread"),
+            max_workers=int(workers) if workers else None,
+            max_queue=int(queue) if queue else None,
+            retry_after=int(os.getenv("OCR_RETRY_AFTER", "1")),
+        )
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="ocr")
+        return self._executor
+
+    def _notify(self):
+        if self.on_change is not None:
+            self.on_change(self.stats())
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+        self._notify()
+
+    async def run(self, fn, *args, **kwargs):
+        """Ejecuta ``fn`` en el pool; lanza ``PoolSaturated`` si no hay hueco."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise PoolSaturated(self.retry_after)
+            self._pending += 1
+        call = functools.partial(fn, *args, **kwargs)
+        if self.kind == "thread":
+            # El hilo hereda el contexto de la petición (id de petición en los logs)
+            call = functools.partial(contextvars.copy_context().run, call)
+        try:
+            future = self._get_executor().submit(call)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        self._notify()
+        # Liberar el hueco cuando el trabajo termina de verdad, aunque el cliente se haya ido
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def warm_up(self, fn, timeout=30):
+        """Ejecuta ``fn`` una vez en cada worker del pool (inicializaciones por hilo o
+        por proceso, como cargar el motor de OCR) y devuelve sus resultados.
+
+        Con hilos, una barrera obliga a que cada llamada ocupe un hilo distinto; con
+        procesos se envían ``max_workers`` llamadas a la vez y el executor arranca un
+        proceso por cada una. Bloquea: llamarlo fuera del event loop.
+        """
+        executor = self._get_executor()
+        call = fn
+        if self.kind == "thread":
+            call = functools.partial(_after_barrier, threading.Barrier(self.max_workers), fn, timeout)
+        futures = [executor.submit(call) for _ in range(self.max_workers)]
+        return [future.result(timeout=timeout * 2) for future in futures]
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+        in_flight = min(pending, self.max_workers)
+        return {
+            "executor": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "queued": pending - in_flight,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+import pytest
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _card(numbers, cell):
+    """Cartón en BGR: letra de la columna arriba a la izquierda, número abajo y rejilla."""
+    rows, cols = len(numbers), len(numbers[0])
+    height, width = rows * cell, cols * cell
+    image = np.full((height, width, 3), 255, np.uint8)
+    scale = cv2.getFontScaleFromHeight(FONT, cell * 2 // 5)
+    thickness = max(2, cell // 30)
+    letter_scale = cv2.getFontScaleFromHeight(FONT, max(6, cell // 9))
+    for i, row in enumerate(numbers):
+        for j, text in enumerate(row):
+            x0, y0 = j * cell, i * cell
+            cv2.putText(image, "BINGO"[j % 5], (x0 + cell // 18, y0 + cell // 5), FONT, letter_scale,
+                        (0, 0, 0), 1, cv2.LINE_AA)
+            text_scale, text_thickness = scale, thickness
+            if not text:
+                text = "FREE"
+                text_scale, text_thickness = cv2.getFontScaleFromHeight(FONT, cell // 5), max(1, thickness // 2)
+            (tw, _th), _ = cv2.getTextSize(text, FONT, text_scale, text_thickness)
+            cv2.putText(image, text, (x0 + (cell - tw) // 2, y0 + cell - cell // 5), FONT, text_scale,
+                        (0, 0, 0), text_thickness, cv2.LINE_AA)
+    line = max(2, cell // 45)
+    for k in range(rows + 1):
+        cv2.line(image, (0, min(height - 1, k * cell)), (width, min(height - 1, k * cell)), (0, 0, 0), line)
+    for k in range(cols + 1):
+        cv2.line(image, (min(width - 1, k * cell), 0), (min(width - 1, k * cell), height), (0, 0, 0), line)
+    return image
+
+
+def _numbers(rng):
+    """Cartón válido de 5x5: cada columna de su rango B-I-N-G-O y la FREE en el centro."""
+    grid = [[str(int(n)) for n in rng.choice(np.arange(15 * j + 1, 15 * j + 16), 5, replace=False)]
+            for j in range(5)]
+    grid = [list(row) for row in zip(*grid)]
+    grid[2][2] = ""
+    return grid
+
+
+def _photograph(page, rng, megapixels):
+    """La hoja (sobre su papel) en perspectiva encima de una mesa, ocupando la mitad de
+    una foto 4:3, con un dedo tapando una esquina del papel."""
+    scene_h = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    scene_w = scene_h * 4 // 3
+    margin = int(0.06 * page.shape[1])
+    page = cv2.copyMakeBorder(page, margin, margin, margin, margin, cv2.BORDER_CONSTANT, value=(235, 235, 235))
+    height, width = page.shape[:2]
+    scale = np.sqrt(0.5 * scene_w * scene_h / (height * width))
+    corners = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    jitter = rng.uniform(-0.02, 0.02, (4, 2)) * max(height, width) * scale
+    target = np.float32((corners - (width / 2, height / 2)) * scale + (scene_w / 2, scene_h / 2) + jitter)
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    photo = cv2.warpPerspective(page, matrix, (scene_w, scene_h), flags=cv2.INTER_LINEAR,
+                                borderValue=(110, 120, 100))
+    finger = tuple(int(v) for v in target[0])
+    cv2.ellipse(photo, finger, (int(scene_w * 0.03), int(scene_h * 0.08)), 30, 0, 360, (60, 80, 120), -1)
+    return photo
+
+
+@pytest.fixture
+def make_sheet():
+    """Hojas sintéticas con varios cartones: ``make_sheet(seed, count, columns, photo=False,
+    megapixels=6)`` devuelve ``image`` (BGR), ``data`` (JPEG), ``truths`` (textos de
+    cada cartón en orden de lectura) y ``boxes`` (x, y, ancho, alto en la hoja sin
+    fotografiar)."""
+
+    def make(seed, count, columns, photo=False, megapixels=6, cell=90):
+        rng = np.random.default_rng(seed)
+        truths = [_numbers(rng) for _ in range(count)]
+        cards = [_card(truth, cell) for truth in truths]
+        card_h, card_w = cards[0].shape[:2]
+        gap, top = cell // 2, 2 * cell
+        lines = -(-count // columns)
+        page = np.full((top + lines * (card_h + gap) + gap, columns * (card_w + gap) + gap, 3), 255, np.uint8)
+        cv2.putText(page, "BINGO", (gap, top * 2 // 3), FONT, cv2.getFontScaleFromHeight(FONT, cell // 2),
+                    (0, 0, 0), 3, cv2.LINE_AA)
+        boxes = []
+        for k, card in enumerate(cards):
+            y = top + (k // columns) * (card_h + gap)
+            x = gap + (k % columns) * (card_w + gap)
+            page[y:y + card_h, x:x + card_w] = card
+            boxes.append((x, y, card_w, card_h))
+        if photo:
+            page = _photograph(page, rng, megapixels)
+        ok, data = cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        return {"image": page, "data": data.tobytes(), "truths": truths, "boxes": boxes}
+
+    return make
@@ -1,10 +1,36 @@
 from fastapi.testclient import TestClient
 from src.api import app
 import io
+import os
+import re
+import pytest
 from PIL import Image
 
 client = TestClient(app)
 
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """Sustituye la canalización de OCR de la API: cada cartón se lee como
+    ``fake_ocr.grid`` por los caminos ``fake_ocr.paths``, y ``fake_ocr.calls`` guarda
+    la forma de cada imagen recibida."""
+    import types
+    import src.api as api
+    fake = types.SimpleNamespace(grid=[["1"]], paths={"classifier": 1}, calls=[])
+
+    def fake_process_image(image, timings=False, **kwargs):
+        fake.calls.append(image.shape)
+        result = fake.grid, dict(fake.paths)
+        return result + ({"ocr": 0.01},) if timings else result
+
+    monkeypatch.setattr(api, "tesseract_available", True)
+    monkeypatch.setattr(api, "process_image_with_stats", fake_process_image)
+    return fake
+
+def _png_bytes(size=(100, 100)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
 def test_root():
     response = client.get("/")
     assert response.status_code == 200
@@ -20,4 +46,297 @@ def test_process_invalid_file():
         "/process",
         files={"file": ("test.txt", b"not an image", "text/plain")}
     )
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+def test_request_id_is_echoed_and_probes_are_quiet(caplog):
+    caplog.set_level("INFO", logger="src.api")
+    assert client.get("/health").headers["x-request-id"]
+    response = client.get("/", headers={"X-Request-ID": "abc123"})
+    assert response.headers["x-request-id"] == "abc123"
+    access = [r for r in caplog.records if getattr(r, "fields", None) and "status" in r.fields]
+    assert [r.fields["path"] for r in access] == ["/"]
+
+def test_unsafe_request_id_is_replaced():
+    for unsafe in ("abc\" status=200 evil", "x" * 65, "../../etc"):
+        response = client.get("/", headers={"X-Request-ID": unsafe})
+        request_id = response.headers["x-request-id"]
+        assert request_id != unsafe and re.fullmatch(r"[0-9a-f]{16}", request_id)
+    assert client.get("/", headers={"X-Request-ID": "lb-1.a_B"}).headers["x-request-id"] == "lb-1.a_B"
+
+def test_readiness_waits_for_warm_up(monkeypatch):
+    import src.api as api
+    monkeypatch.setattr(api, "readiness", {"status": "starting", "error": None})
+    assert client.get("/livez").json() == {"status": "alive"}
+    starting = client.get("/readyz")
+    assert starting.status_code == 503 and starting.json()["status"] == "starting"
+    api.readiness["status"] = "ready"
+    ready = client.get("/readyz")
+    assert ready.status_code == 200 and "import" in ready.json()["startup_ms"]
+
+def test_feature_modules_are_not_imported_with_the_api():
+    import subprocess
+    import sys
+    code = ("import sys, src.api; "
+            "print(sorted(m for m in src.api.FEATURE_MODULES if 'src.' + m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert output.stdout.splitlines()[-1] == "[]"
+
+def test_health_reports_workers():
+    workers = client.get("/health").json()["workers"]
+    assert {"in_flight", "queued", "max_workers", "max_queue"} <= set(workers)
+
+def test_process_busy_returns_retry_after(monkeypatch):
+    import src.api as api
+    from src.workers import OCRPool
+    busy = OCRPool(max_workers=1, max_queue=0, retry_after=2)
+    busy._pending = 1
+    monkeypatch.setattr(api, "ocr_pool", busy)
+    monkeypatch.setattr(api, "tesseract_available", True)
+    response = client.post(
+        "/process",
+        files={"file": ("card.png", _png_bytes(), "image/png")}
+    )
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "2"
+
+def test_process_undecodable_image(monkeypatch):
+    import src.api as api
+    monkeypatch.setattr(api, "tesseract_available", True)
+    response = client.post(
+        "/process",
+        files={"file": ("card.png", b"not really a png", "image/png")}
+    )
+    assert response.status_code == 400
+
+def test_process_repeated_image_is_cached(monkeypatch, fake_ocr):
+    import src.api as api
+    from src.cache import ResultCache
+    monkeypatch.setattr(api, "result_cache", ResultCache(max_size=8))
+    files = {"file": ("card.png", _png_bytes(), "image/png")}
+    first = client.post("/process?rows=1&cols=1", files=files).json()
+    second = client.post("/process?rows=1&cols=1", files=files).json()
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["grid"] == [["1"]]
+    assert first["ocr_paths"]["classifier"] == 1
+    assert len(fake_ocr.calls) == 1
+    assert client.get("/health").json()["cache"]["hits"] == 1
+
+def test_process_reports_stage_timings(monkeypatch):
+    import src.api as api
+    from src.cache import ResultCache
+    monkeypatch.setattr(api, "tesseract_available", True)
+    monkeypatch.setattr(api, "result_cache", ResultCache(max_size=0))
+    files = {"file": ("card.png", _png_bytes((400, 400)), "image/png")}
+    timed = client.post("/process?timings=true", files=files).json()
+    assert {"read", "decode", "preprocess", "cleanup", "total"} <= set(timed["timings_ms"])
+    assert all(value >= 0 for value in timed["timings_ms"].values())
+    assert "timings_ms" not in client.post("/process", files=files).json()
+
+def test_save_grid_images_are_rendered_on_request(monkeypatch):
+    import src.api as api
+    from src.diagnostics import DiagnosticsStore
+    monkeypatch.setattr(api, "tesseract_available", True)
+    monkeypatch.setattr(api, "diagnostics_store", DiagnosticsStore(max_size=4))
+    files = {"file": ("card.png", _png_bytes((400, 300)), "image/png")}
+    body = client.post("/process?save_grid=true", files=files).json()
+    images = body["images"]
+    assert images["grid_url"] == f"/results/{images['result_id']}/grid.png"
+    grid = client.get(images["grid_url"])
+    assert grid.status_code == 200 and grid.headers["content-type"] == "image/png"
+    # La cuadrícula se dibuja sobre la imagen subida, a su resolución
+    assert Image.open(io.BytesIO(grid.content)).size == (400, 300)
+    assert client.get(images["grid_url"]).content == grid.content
+    assert client.get(images["bw_url"]).status_code == 200
+    assert client.get(f"/results/{images['result_id']}/other.png").status_code == 404
+    assert client.get("/results/does-not-exist/grid.png").status_code == 404
+    assert "images" not in client.post("/process", files=files).json()
+
+def test_save_grid_images_ignore_the_client_request_id(monkeypatch):
+    import src.api as api
+    from src.diagnostics import DiagnosticsStore
+    monkeypatch.setattr(api, "tesseract_available", True)
+    monkeypatch.setattr(api, "diagnostics_store", DiagnosticsStore(max_size=4))
+    urls = []
+    for size in ((400, 300), (300, 400)):
+        files = {"file": ("card.png", _png_bytes(size), "image/png")}
+        body = client.post("/process?save_grid=true", files=files, headers={"X-Request-ID": "same"}).json()
+        assert body["request_id"] == "same" and body["images"]["result_id"] != "same"
+        urls.append(body["images"]["grid_url"])
+    # Dos peticiones con el mismo X-Request-ID no se pisan las imágenes
+    sizes = [Image.open(io.BytesIO(client.get(url).content)).size for url in urls]
+    assert sizes == [(400, 300), (300, 400)]
+    assert client.get("/results/same/grid.png").status_code == 404
+
+def test_metrics_endpoint_counts_requests_and_cells(monkeypatch, fake_ocr):
+    import src.api as api
+    from src.cache import ResultCache
+    monkeypatch.setattr(api, "result_cache", ResultCache(max_size=0))
+    files = {"file": ("card.png", _png_bytes(), "image/png")}
+    assert client.post("/process?rows=1&cols=1&timings=true", files=files).status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'bingo_http_request_duration_seconds_count{endpoint="/process",method="POST",status="200"}' in body
+    assert "bingo_cells_per_card_count" in body
+    assert 'bingo_ocr_stage_duration_seconds_count{stage="ocr"}' in body
+    assert "bingo_ocr_in_flight" in body
+
+def test_process_batch_streams_one_line_per_card(monkeypatch, fake_ocr):
+    import json
+    import zipfile
+    import src.api as api
+    from src.cache import ResultCache
+    monkeypatch.setattr(api, "result_cache", ResultCache(max_size=0))
+    fake_ocr.grid = [["7"]]
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("cards/a.png", _png_bytes())
+        zf.writestr("cards/notes.txt", "hola")
+    files = [
+        ("files", ("b.png", _png_bytes(), "image/png")),
+        ("files", ("broken.png", b"not really a png", "image/png")),
+        ("files", ("cards.zip", archive.getvalue(), "application/zip")),
+    ]
+    response = client.post("/process/batch?rows=1&cols=1", files=files)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = sorted((json.loads(l) for l in response.text.splitlines()), key=lambda l: l["index"])
+    assert [l["filename"] for l in lines] == ["b.png", "broken.png", "cards/a.png", "cards/notes.txt"]
+    assert [l["success"] for l in lines] == [True, False, True, False]
+    assert lines[0]["grid"] == [["7"]]
+    assert lines[1]["status"] == 400 and lines[3]["status"] == 400
+
+def test_process_batch_rejects_invalid_grid(monkeypatch):
+    import src.api as api
+    monkeypatch.setattr(api, "tesseract_available", True)
+    response = client.post(
+        "/process/batch?rows=0",
+        files=[("files", ("b.png", _png_bytes(), "image/png"))]
+    )
+    assert response.status_code == 400
+
+def test_job_is_queued_and_polled_until_done(monkeypatch, fake_ocr):
+    import time
+    import src.api as api
+    from src.jobs import MemoryJobStore
+    monkeypatch.setattr(api, "job_store", MemoryJobStore())
+    fake_ocr.grid = [["9"]]
+    with TestClient(app) as local_client:
+        created = local_client.post(
+            "/jobs?rows=1&cols=1",
+            files={"file": ("card.png", _png_bytes(), "image/png")}
+        )
+        assert created.status_code == 202
+        status_url = created.json()["status_url"]
+        for _ in range(100):
+            job = local_client.get(status_url).json()
+            if job["status"] in ("done", "failed"):
+                break
+            time.sleep(0.02)
+    assert job["status"] == "done"
+    assert job["result"]["grid"] == [["9"]]
+    assert job["queued_at"] <= job["started_at"] <= job["finished_at"]
+    assert job["queue_wait_seconds"] >= 0 and job["processing_seconds"] >= 0
+
+def test_unknown_job_returns_404():
+    assert client.get("/jobs/does-not-exist").status_code == 404
+
+def test_stream_sends_cell_deltas(monkeypatch):
+    import src.api as api
+    monkeypatch.setattr(api, "tesseract_available", True)
+    with open("tests/sample_bingo_card.png", "rb") as fh:
+        frame = fh.read()
+    with client.websocket_connect("/stream?rows=5&cols=5&locate=false") as ws:
+        ws.send_bytes(frame)
+        first = ws.receive_json()
+        ws.send_bytes(frame)
+        second = ws.receive_json()
+    assert first["read"] == 25 and {"row": 0, "col": 0, "text": "1"} in first["changes"]
+    assert second["read"] == 0 and second["changes"] == []
+
+def test_stream_rejects_invalid_grid():
+    from starlette.websockets import WebSocketDisconnect
+    with client.websocket_connect("/stream?rows=0") as ws:
+        try:
+            ws.receive_json()
+        except WebSocketDisconnect as e:
+            assert e.code == 1008
+        else:
+            raise AssertionError("la conexión debería cerrarse")
+
+def test_registered_card_marks(monkeypatch):
+    import cv2
+    import numpy as np
+    import src.api as api
+    monkeypatch.setattr(api, "tesseract_available", True)
+    with open("tests/sample_bingo_card.png", "rb") as fh:
+        contents = fh.read()
+    registered = client.post("/cards", files={"file": ("card.png", contents, "image/png")})
+    assert registered.status_code == 201
+    card_id = registered.json()["card_id"]
+    assert registered.json()["grid"][0] == ["1", "2", "3", "4", "5"]
+
+    photo = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    cv2.circle(photo, (135, 140), 34, (40, 160, 40), -1)
+    response = client.post(f"/cards/{card_id}/marks",
+                           files={"file": ("card.jpg", cv2.imencode(".jpg", photo)[1].tobytes(), "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json()["marked"] == ["7"]
+
+    assert client.post("/cards/unknown/marks", files={"file": ("card.png", contents, "image/png")}).status_code == 404
+    assert client.delete(f"/cards/{card_id}").status_code == 204
+    assert client.get(f"/cards/{card_id}").status_code == 404
+
+def test_game_calls():
+    grid = [[str(5 * i + j + 1) for j in range(5)] for i in range(5)]
+    grid[2][2] = "FREE"
+    game = client.post("/games", params={"patterns": "row,full"})
+    assert game.status_code == 201
+    game_id = game.json()["game_id"]
+    assert game.json()["patterns"][-1] == "full"
+
+    added = client.post(f"/games/{game_id}/cards", json={"cards": [{"card_id": "a", "grid": grid}]})
+    assert added.status_code == 200 and added.json()["cards"] == 1
+    assert client.post(f"/games/{game_id}/cards", json={"card_ids": ["unknown"]}).status_code == 404
+    assert client.post(f"/games/{game_id}/cards",
+                       json={"cards": [{"card_id": "a", "grid": grid}]}).status_code == 400
+    misread = [row[:] for row in grid]
+    misread[0][1] = ""
+    rejected = client.post(f"/games/{game_id}/cards", json={"cards": [{"card_id": "b", "grid": misread}]})
+    assert rejected.status_code == 400 and "(0, 1)" in rejected.json()["detail"]
+
+    for number in (1, 2, 3, 4):
+        assert client.post(f"/games/{game_id}/calls", params={"number": number}).json()["winners"] == []
+    response = client.post(f"/games/{game_id}/calls", params={"number": 5})
+    assert response.json()["winners"] == [{"card_id": "a", "pattern": "row:0", "number": 5}]
+
+    state = client.get(f"/games/{game_id}").json()
+    assert state["called"] == 5 and state["winners"] == 1 and state["last_number"] == 5
+    calls = client.get(state["links"]["calls"], params={"offset": 3, "limit": 10}).json()
+    assert calls["total"] == 5 and calls["called_numbers"] == [4, 5]
+    winners = client.get(state["links"]["winners"]).json()
+    assert winners["winners"] == [{"card_id": "a", "pattern": "row:0", "number": 5}]
+    assert client.get(f"/games/{game_id}/winners", params={"limit": 0}).status_code == 400
+    card = client.get(f"/games/{game_id}/cards/a").json()
+    assert card["marks"][0] == [True] * 5 and card["won"] == ["row:0"]
+    assert client.post("/games", params={"patterns": "corners"}).status_code == 400
+    assert client.delete(f"/games/{game_id}").status_code == 204
+    assert client.get(f"/games/{game_id}").status_code == 404
+
+def test_process_sheet(monkeypatch, make_sheet):
+    import src.api as api
+    monkeypatch.setattr(api, "tesseract_available", True)
+    sheet = make_sheet(3, count=4, columns=2)
+    response = client.post("/process/sheet", files={"file": ("sheet.jpg", sheet["data"], "image/jpeg")})
+    assert response.status_code == 200
+    cards = response.json()["cards"]
+    assert [card["index"] for card in cards] == [0, 1, 2, 3]
+    pairs = [(read, truth) for card, truth in zip(cards, sheet["truths"])
+             for read, truth in zip(sum(card["grid"], []), sum(truth, []))]
+    assert sum(read == truth for read, truth in pairs) / len(pairs) >= 0.95
+    assert cards[3]["box"][0] > cards[2]["box"][0] and cards[2]["box"][1] > cards[0]["box"][1]
+
+    blank = client.post("/process/sheet", files={"file": ("blank.png", _png_bytes((400, 300)), "image/png")})
+    assert blank.status_code == 422
@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+
+from src.cache import LRUCache, ResultCache, SQLiteStore, image_key
+from src.processor import pipeline_options
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_lru_expires_entries():
+    cache = LRUCache(max_size=4, ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_image_key_depends_on_pixels_and_grid():
+    image = np.zeros((20, 30, 3), np.uint8)
+    key = image_key(image, (5, 5), "1")
+    assert key == image_key(image.copy(), (5, 5), "1")
+    assert key != image_key(image, (4, 5), "1")
+    assert key != image_key(image, (5, 5), "2")
+    changed = image.copy()
+    changed[0, 0, 0] = 1
+    assert key != image_key(changed, (5, 5), "1")
+
+
+def test_image_key_follows_result_affecting_settings(monkeypatch):
+    image = np.zeros((20, 30), np.uint8)
+    key = image_key(image, (5, 5), "1", **pipeline_options())
+    assert key == image_key(image, (5, 5), "1", **pipeline_options())
+    assert key != image_key(image, (5, 5), "1", **pipeline_options(classifier=False))
+    for name, value in (("DIGIT_MIN_MARGIN", "0.2"), ("CELL_MEMO_DISTANCE", "0")):
+        with monkeypatch.context() as patch:
+            patch.setenv(name, value)
+            assert key != image_key(image, (5, 5), "1", **pipeline_options())
+
+
+def test_sqlite_backend_is_shared_between_caches(tmp_path):
+    db = str(tmp_path / "results.sqlite")
+    grid = [["1", "2"], ["3", ""]]
+    ResultCache(db_path=db).put("k", grid)
+    other = ResultCache(db_path=db)
+    assert other.get("k") == grid
+    assert other.get("missing") is None
+    assert other.stats()["hits"] == 1 and other.stats()["misses"] == 1
+
+
+def test_sqlite_store_trims_only_past_the_slack(tmp_path):
+    store = SQLiteStore(str(tmp_path / "results.sqlite"), max_size=10)
+    for k in range(11):
+        store.put(f"k{k}", k)
+    # Hasta max_size + 10 % no se borra nada
+    assert len(store) == 11
+    store.put("k11", 11)
+    assert len(store) == 10
+    assert store.get("k1") is None and store.get("k11") == 11
+
+
+def test_sqlite_store_purges_expired_on_a_timer(tmp_path):
+    store = SQLiteStore(str(tmp_path / "results.sqlite"), ttl=0.01, purge_interval=3600)
+    store.put("old", 1)
+    time.sleep(0.02)
+    store.put("new", 2)
+    assert store.get("old") is None and len(store) == 2
+    store.purge_interval = 0
+    time.sleep(0.02)
+    store.put("newer", 3)
+    assert len(store) == 1
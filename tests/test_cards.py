@@ -0,0 +1,63 @@
+import os
+
+import cv2
+import pytest
+
+from src.cards import CardMismatch, CardRegistry, card_profile, check_marks
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "sample_bingo_card.png")
+NUMBERS = [[str(5 * i + j + 1) for j in range(5)] for i in range(5)]
+
+
+def _daub(image, cells, kind):
+    # Celdas de 90 px en la muestra
+    card = image.copy()
+    for row, col in cells:
+        centre = (col * 90 + 45, row * 90 + 50)
+        if kind == "ink":
+            overlay = card.copy()
+            cv2.circle(overlay, centre, 34, (180, 60, 220), -1)
+            card = cv2.addWeighted(overlay, 0.55, card, 0.45, 0)
+        else:
+            x, y = centre
+            cv2.line(card, (x - 28, y - 28), (x + 28, y + 28), (30, 30, 30), 6)
+            cv2.line(card, (x + 28, y - 28), (x - 28, y + 28), (30, 30, 30), 6)
+    return card
+
+
+@pytest.fixture
+def card(tmp_path):
+    registry = CardRegistry(str(tmp_path / "cards.db"))
+    card_id = registry.register(NUMBERS, card_profile(SAMPLE))
+    # Otra conexión al mismo fichero (como otro worker) lee el mismo cartón
+    return CardRegistry(str(tmp_path / "cards.db")).get(card_id)
+
+
+@pytest.mark.parametrize("kind", ["ink", "pen"])
+def test_marks_are_detected_without_ocr(card, kind):
+    photo = _daub(cv2.imread(SAMPLE), [(0, 0), (2, 3), (4, 4)], kind)
+    result = check_marks(cv2.imencode(".jpg", photo)[1].tobytes(), card)
+    marked = [(i, j) for i in range(5) for j in range(5) if result["marks"][i][j]]
+    assert marked == [(0, 0), (2, 3), (4, 4)]
+    assert result["marked"] == ["1", "14", "25"]
+    assert result["layout_difference"] < 0.2
+
+
+def test_unmarked_photo_has_no_marks(card):
+    result = check_marks(SAMPLE, card)
+    assert result["marked"] == [] and result["aligned"]
+
+
+def test_other_card_is_rejected(card):
+    with pytest.raises(CardMismatch):
+        check_marks(cv2.flip(cv2.imread(SAMPLE), 1), card)
+
+
+def test_registry_roundtrip(tmp_path):
+    registry = CardRegistry()
+    card_id = registry.register(NUMBERS, card_profile(SAMPLE))
+    card = registry.get(card_id)
+    assert card["grid"] == NUMBERS and card["fingerprint"].shape[:2] == (5, 5)
+    assert card["image"].shape == (240, 240)
+    assert registry.stats()["cards"] == 1
+    assert registry.delete(card_id) and registry.get(card_id) is None
@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+from prometheus_client import REGISTRY
+
+from src.cellcache import CellMemo, fingerprint
+
+
+def _cell(text, size=90, offset=(0, 0), invert=False):
+    cell = np.full((size, size), 255, np.uint8)
+    cv2.putText(cell, text, (size // 5 + offset[0], size * 3 // 4 + offset[1]),
+                cv2.FONT_HERSHEY_SIMPLEX, size / 70.0, 0, max(1, size // 30))
+    return cv2.bitwise_not(cell) if invert else cell
+
+
+def test_fingerprint_ignores_position_polarity_and_blank_cells():
+    key = fingerprint(_cell("42"))
+    assert key == fingerprint(_cell("42", offset=(7, -5)))
+    assert key == fingerprint(_cell("42", invert=True))
+    assert key != fingerprint(_cell("47"))
+    assert fingerprint(np.full((40, 40), 255, np.uint8)) is None
+
+
+def test_lookup_accepts_near_matches_only():
+    memo = CellMemo(capacity=8, max_distance=4)
+    key = fingerprint(_cell("42"))
+    memo.add(key, "42")
+    bits = np.unpackbits(np.frombuffer(key, np.uint8))
+    bits[:2] ^= 1
+    assert memo.lookup(np.packbits(bits).tobytes()) == "42"
+    assert memo.lookup(fingerprint(_cell("17"))) is None
+    assert memo.stats()["hits"] == 1 and memo.stats()["misses"] == 1
+
+
+def test_only_numbers_are_memorised():
+    memo = CellMemo(capacity=8, max_distance=0)
+    key = fingerprint(_cell("42"))
+    for text in ("", "4Z", "B", "²"):
+        memo.add(key, text)
+    assert memo.stats()["entries"] == 0
+    memo.add(key, "42")
+    assert memo.lookup(key) == "42"
+
+
+def test_evicts_least_recently_used_and_round_trips(tmp_path):
+    memo = CellMemo(capacity=2, max_distance=0)
+    keys = {t: fingerprint(_cell(t)) for t in ("1", "22", "75")}
+    memo.add(keys["1"], "1")
+    memo.add(keys["22"], "22")
+    memo.lookup(keys["1"])
+    memo.add(keys["75"], "75")
+    assert memo.lookup(keys["22"]) is None
+
+    path = str(tmp_path / "memo.npz")
+    memo.save(path)
+    restored = CellMemo(capacity=2, max_distance=0)
+    restored.load(path)
+    assert restored.lookup(keys["1"]) == "1"
+    assert restored.lookup(keys["75"]) == "75"
+
+
+def test_lookups_are_counted_as_hits_and_misses():
+    def count(result):
+        return REGISTRY.get_sample_value("bingo_cell_memo_lookups_total", {"result": result}) or 0
+
+    memo = CellMemo(capacity=4)
+    key = fingerprint(_cell("42"))
+    hits, misses = count("hit"), count("miss")
+    assert memo.lookup(key) is None
+    memo.add(key, "42")
+    assert memo.lookup(key) == "42"
+    assert (count("hit"), count("miss")) == (hits + 1, misses + 1)
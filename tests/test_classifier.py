@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+from src.classifier import DigitClassifier, segment_digits
+from src.ocr import extract_text_from_cell
+
+
+def _cell(text, size=90, font=cv2.FONT_HERSHEY_SIMPLEX):
+    cell = np.full((size, size), 255, np.uint8)
+    cv2.putText(cell, text, (size // 6, size * 3 // 4), font, size / 70.0, 0, max(1, size // 30))
+    return cell
+
+
+def test_segment_digits_left_to_right_ignoring_specks():
+    cell = _cell("47")
+    cell[5, 5] = 0
+    crops = segment_digits(cell)
+    assert len(crops) == 2
+    assert segment_digits(np.full((30, 30), 255, np.uint8)) == []
+
+
+def test_classifies_rendered_numbers_or_defers():
+    classifier = DigitClassifier()
+    numbers = [str(n) for n in range(1, 76)]
+    results = [classifier.classify(_cell(n, font=cv2.FONT_HERSHEY_DUPLEX)) for n in numbers]
+    assert all(r in (None, n) for r, n in zip(results, numbers))
+    assert sum(r is not None for r in results) >= 60
+
+
+def test_rejects_cells_that_are_not_digits():
+    classifier = DigitClassifier()
+    blob = np.full((90, 90), 255, np.uint8)
+    cv2.rectangle(blob, (20, 30), (70, 60), 0, -1)
+    assert classifier.classify(blob) is None
+    assert classifier.classify(_cell("123")) is None
+
+
+def test_learned_templates_are_used_and_tesseract_is_skipped():
+    classifier = DigitClassifier(capacity=10)
+    assert classifier.learn(_cell("42"), "42")
+    assert not classifier.learn(_cell("42"), "4")
+    assert classifier.stats()["learned"] == 2
+    stats = {}
+    assert extract_text_from_cell(_cell("42"), classifier=classifier, stats=stats) == "42"
+    assert stats == {"classifier": 1}
+
+
+def test_bank_without_capacity_loads_nothing(tmp_path):
+    trained = DigitClassifier(capacity=10)
+    assert trained.learn(_cell("42"), "42")
+    trained.save(tmp_path / "bank.npz")
+    empty = DigitClassifier(capacity=0)
+    empty.load(tmp_path / "bank.npz")
+    assert empty.stats()["learned"] == 0
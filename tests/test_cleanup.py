@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+
+from src.preproc import block_otsu_thresholds
+from src.processor import remove_speckles, clear_border, cell_boxes, clean_cell, clean_card
+
+
+# Versiones originales de la limpieza (las mismas que compara bench.cleanup), como
+# referencia de las vectorizadas
+def _legacy_remove_speckles(cell_bw):
+    """Versión original: una pasada completa por la celda para cada etiqueta."""
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(cell_bw, connectivity=8)
+    min_area = max(8, (cell_bw.shape[0] * cell_bw.shape[1]) // 500)
+    cleaned = np.zeros_like(cell_bw)
+    for lbl in range(1, num_labels):
+        area = stats[lbl, cv2.CC_STAT_AREA]
+        if area >= min_area:
+            cleaned[labels == lbl] = 255
+    return cleaned
+
+
+def _legacy_clear_border(cell_bw):
+    """Versión original: floodFill desde cada píxel blanco de los cuatro bordes."""
+    flood = cell_bw.copy()
+    h_c, w_c = flood.shape
+    mask = np.zeros((h_c + 2, w_c + 2), np.uint8)
+    for x in range(w_c):
+        if flood[0, x] == 255:
+            cv2.floodFill(flood, mask, (x, 0), 0)
+        if flood[h_c - 1, x] == 255:
+            cv2.floodFill(flood, mask, (x, h_c - 1), 0)
+    for y in range(h_c):
+        if flood[y, 0] == 255:
+            cv2.floodFill(flood, mask, (0, y), 0)
+        if flood[y, w_c - 1] == 255:
+            cv2.floodFill(flood, mask, (w_c - 1, y), 0)
+    return flood
+
+
+def _noisy_cells(count, size, seed=0):
+    """Celdas binarias con un número, líneas de cuadrícula en el borde y ruido sal."""
+    rng = np.random.default_rng(seed)
+    cells = []
+    for _ in range(count):
+        cell = np.zeros((size, size), np.uint8)
+        cv2.putText(cell, str(int(rng.integers(1, 76))), (size // 6, size * 3 // 4),
+                    cv2.FONT_HERSHEY_SIMPLEX, size / 60.0, 255, max(1, size // 30))
+        cell[:, :max(1, size // 40)] = 255
+        cell[rng.random((size, size)) < 0.02] = 255
+        cells.append(cell)
+    return cells
+
+
+def _cells():
+    rng = np.random.default_rng(1)
+    cells = _noisy_cells(20, 60) + _noisy_cells(5, 150, seed=2)
+    # Ruido aleatorio puro, incluyendo bordes completamente blancos
+    for density in (0.1, 0.5, 0.9):
+        cells.append(np.where(rng.random((40, 55)) < density, 255, 0).astype(np.uint8))
+    cells.append(np.full((30, 30), 255, np.uint8))
+    cells.append(np.zeros((30, 30), np.uint8))
+    return cells
+
+
+def test_remove_speckles_matches_legacy_loop():
+    for cell in _cells():
+        np.testing.assert_array_equal(remove_speckles(cell), _legacy_remove_speckles(cell))
+
+
+def test_clear_border_matches_legacy_flood_fill():
+    for cell in _cells():
+        np.testing.assert_array_equal(clear_border(cell), _legacy_clear_border(cell))
+
+
+def test_block_otsu_matches_opencv():
+    rng = np.random.default_rng(3)
+    gray = rng.integers(0, 256, (90, 120), dtype=np.uint8)
+    binary = np.where(rng.random((90, 120)) < 0.3, 255, 0).astype(np.uint8)
+    boxes = [(0, 0, 40, 30), (40, 30, 120, 90), (50, 5, 51, 6), (60, 0, 120, 30)]
+    for image in (gray, binary, np.zeros_like(gray)):
+        expected = [cv2.threshold(image[ya:yb, xa:xb], 0, 255, cv2.THRESH_OTSU)[0]
+                    for xa, ya, xb, yb in boxes]
+        np.testing.assert_array_equal(block_otsu_thresholds(image, boxes), expected)
+
+
+def test_clean_card_matches_per_cell_cleanup():
+    cells = _noisy_cells(25, 64, seed=4)
+    card = np.vstack([np.hstack(cells[r * 5:(r + 1) * 5]) for r in range(5)])
+    card[::64, :] = 255  # líneas de la rejilla
+    card[:, ::64] = 255
+    boxes = cell_boxes(card.shape[0], card.shape[1], 5, 5)
+    expected = [clean_cell(card[ya:yb, xa:xb]) for xa, ya, xb, yb in boxes]
+    for got, want in zip(clean_card(card, boxes), expected):
+        np.testing.assert_array_equal(got, want)
@@ -0,0 +1,98 @@
+import csv
+import json
+import os
+
+from src import cli
+from src.cli import ResultWriter, drop_failed, expand_inputs, main, read_done
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(HERE, "sample_bingo_card.png")
+
+
+def test_expand_inputs_walks_dirs_globs_and_manifest(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "b").mkdir()
+    for name in ("a/1.png", "a/b/2.jpg", "a/notes.txt", "3.png"):
+        (tmp_path / name).write_bytes(b"")
+    manifest = tmp_path / "lista.txt"
+    manifest.write_text("# pendientes\n3.png\na/1.png\n\n")
+
+    paths = expand_inputs([str(tmp_path / "a"), str(tmp_path / "**" / "*.png")], str(manifest))
+    assert paths == [os.path.normpath(str(tmp_path / name)) for name in ("a/1.png", "a/b/2.jpg", "3.png")]
+
+
+def test_read_done_skips_truncated_lines_and_retries_failures(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text(json.dumps({"file": "ok.png", "success": True}) + "\n"
+                      + json.dumps({"file": "bad.png", "success": False}) + "\n"
+                      + '{"file": "cut.png", "succ')
+    assert read_done(str(output), "jsonl") == {"ok.png", "bad.png"}
+    assert read_done(str(output), "jsonl", retry_failed=True) == {"ok.png"}
+
+    # La siguiente ejecución empieza en una línea nueva tras la cortada
+    writer = ResultWriter(str(output), "jsonl")
+    writer.write({"file": "cut.png", "success": True})
+    writer.close()
+    assert read_done(str(output), "jsonl", retry_failed=True) == {"ok.png", "cut.png"}
+
+
+def test_drop_failed_keeps_one_successful_record_per_file(tmp_path):
+    output = tmp_path / "out.jsonl"
+    records = [{"file": "a.png", "success": False}, {"file": "a.png", "success": True},
+               {"file": "b.png", "success": False}, {"file": "c.png", "success": True}]
+    output.write_text("".join(json.dumps(record) + "\n" for record in records))
+    assert drop_failed(str(output), "jsonl") == 2
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert lines == [{"file": "a.png", "success": True}, {"file": "c.png", "success": True}]
+    assert drop_failed(str(output), "jsonl") == 0
+
+
+def _crash_on_purpose(path, grid, ocr_mode, locate):
+    if "crash" in path:
+        os._exit(1)
+    return {"file": path, "success": True, "seconds": 0}
+
+
+class _Records:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+def test_broken_pool_keeps_finished_cards(monkeypatch):
+    monkeypatch.setattr(cli, "process_file", _crash_on_purpose)
+    writer = _Records()
+    paths = ["ok-1.png", "crash.png", "ok-2.png", "ok-3.png"]
+    done, failed = cli.run(paths, writer, workers=1)
+    results = {record["file"]: record["success"] for record in writer.records}
+    assert sorted(results) == sorted(paths) and done == len(paths)
+    # Solo falla el cartón en marcha; los que no habían empezado van al pool nuevo
+    assert results == {"ok-1.png": True, "crash.png": False, "ok-2.png": True, "ok-3.png": True}
+    assert failed == 1
+
+
+def test_main_processes_and_resumes(tmp_path, capsys):
+    broken = tmp_path / "roto.png"
+    broken.write_bytes(b"no es una imagen")
+    output = tmp_path / "out.csv"
+    args = [SAMPLE, str(broken), "--output", str(output), "--workers", "2"]
+
+    assert main(args) == 0
+    rows = {row["file"]: row for row in _csv(output)}
+    assert rows[os.path.normpath(SAMPLE)]["success"] == "True"
+    assert json.loads(rows[os.path.normpath(SAMPLE)]["grid"])[0] == ["1", "2", "3", "4", "5"]
+    assert rows[str(broken)]["success"] == "False" and rows[str(broken)]["error"]
+
+    # Segunda ejecución: nada que hacer; con --retry-failed solo el roto
+    assert main(args) == 0
+    assert len(_csv(output)) == 2
+    assert main(args + ["--retry-failed"]) == 0
+    assert [row["file"] for row in _csv(output)].count(str(broken)) == 1
+    assert "1 por procesar" in capsys.readouterr().err
+
+
+def _csv(path):
+    with open(path, newline="", encoding="utf-8") as fh:
+        return list(csv.DictReader(fh))
@@ -0,0 +1,98 @@
+import pytest
+
+from src.game import Game, pattern_masks
+
+CARD = [
+    ["1", "16", "31", "46", "61"],
+    ["2", "17", "32", "47", "62"],
+    ["3", "18", "FREE", "48", "63"],
+    ["4", "19", "34", "49", "64"],
+    ["5", "20", "35", "50", "65"],
+]
+
+
+def _patterns(wins):
+    return sorted((w["card_id"], w["pattern"]) for w in wins)
+
+
+def test_pattern_masks_5x5():
+    names, masks = pattern_masks(5, 5)
+    assert len(names) == 5 + 5 + 2 + 1 and masks.shape == (13, 1)
+    assert int(masks[names.index("row:0"), 0]) == 0b11111
+    assert int(masks[names.index("full"), 0]) == (1 << 25) - 1
+    # Sin diagonales en cartones no cuadrados, y más de 64 celdas en dos palabras
+    assert not any(name.startswith("diagonal") for name in pattern_masks(3, 9)[0])
+    assert pattern_masks(9, 9)[1].shape[1] == 2
+
+
+def test_calls_find_lines_columns_diagonals_and_full_house():
+    game = Game()
+    other = [row[::-1] for row in CARD]
+    assert game.add_cards({"a": CARD, "b": other}) == []
+
+    wins = []
+    for number in (1, 2, 3, 4):
+        wins += game.call(number)
+    assert wins == []
+    wins = game.call(5)
+    assert _patterns(wins) == [("a", "column:0"), ("b", "column:4")]
+    assert wins[0]["number"] == 5
+    # La FREE cuenta como marcada: la fila central sale con cuatro números
+    assert _patterns(game.call(18) + game.call(48)) == []
+    assert _patterns(game.call(63)) == [("a", "row:2"), ("b", "row:2")]
+    assert _patterns(game.call(3)) == []  # ya cantado
+    for number in (17, 49):
+        game.call(number)
+    assert ("a", "diagonal:0") not in _patterns(game.winners)
+    assert ("a", "diagonal:0") in _patterns(game.call(65))
+    assert game.marks("a")[2] == [True] * 5
+    assert game.won("a") == ["row:2", "column:0", "diagonal:0"]
+
+    for row in CARD:
+        for text in row:
+            if text != "FREE":
+                game.call(int(text))
+    full = [w for w in game.winners if w["pattern"] == "full"]
+    assert _patterns(full) == [("a", "full"), ("b", "full")]
+    assert len(game.winners) == 2 * 13
+
+
+def test_late_cards_get_called_numbers():
+    game = Game()
+    game.add_cards({"a": CARD})
+    for number in (16, 17, 18, 19):
+        game.call(number)
+    assert _patterns(game.call(20)) == [("a", "column:1")]
+    wins = game.add_cards({"b": [[row[1], row[0], *row[2:]] for row in CARD]})
+    assert _patterns(wins) == [("b", "column:0")]
+    assert game.marks("b")[0] == [True, False, False, False, False]
+
+
+def test_add_cards_validation():
+    game = Game((3, 3), patterns=("row",))
+    with pytest.raises(ValueError):
+        game.add_cards({"a": CARD})
+    game.add_cards({"a": [["1", "2", "3"], ["4", "", "6"], ["7", "8", "9"]]})
+    with pytest.raises(ValueError):
+        game.add_cards({"a": [["1", "2", "3"]] * 3})
+    assert _patterns(game.call(4) + game.call(6)) == [("a", "row:1")]
+    with pytest.raises(ValueError):
+        Game(patterns=("corners",))
+
+
+def test_only_the_centre_free_is_marked_without_a_call():
+    game = Game()
+    # Celdas que el OCR no leyó o leyó mal: el cartón se rechaza en vez de darlas por marcadas
+    for cell in ("", "5 52", "1 01", "80", "0", "FREE"):
+        bad = [row[:] for row in CARD]
+        bad[0][0] = cell
+        with pytest.raises(ValueError, match=r"\(0, 0\)"):
+            game.add_cards({"bad": bad})
+    with pytest.raises(ValueError):
+        Game((4, 4)).add_cards({"even": [["1", "2", "3", "4"], ["5", "", "7", "8"],
+                                         ["9", "10", "11", "12"], ["13", "14", "15", "16"]]})
+    assert len(game) == 0
+
+    game.add_cards({"a": CARD})
+    assert game.marks("a")[2] == [False, False, True, False, False]
+    assert all(not any(row) for k, row in enumerate(game.marks("a")) if k != 2)
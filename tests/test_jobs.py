@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from src.jobs import MemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore(ttl=60)
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite"), ttl=60)
+
+
+def test_job_lifecycle_records_timestamps(store):
+    job = store.create("card.png", 5, 5)
+    assert store.get(job["id"])["status"] == "queued"
+    store.update(job["id"], status="running", started_at=time.time())
+    store.update(job["id"], status="done", finished_at=time.time(), result={"grid": [["1"]]})
+    done = store.get(job["id"])
+    assert done["result"] == {"grid": [["1"]]}
+    assert done["queue_wait_seconds"] >= 0 and done["processing_seconds"] >= 0
+    assert store.stats()["done"] == 1
+
+
+def test_finished_jobs_expire(store):
+    job = store.create("card.png", 5, 5)
+    store.update(job["id"], status="done", finished_at=time.time() - 120)
+    assert store.get(job["id"]) is None
+    store.purge()
+    assert store.stats()["done"] == 0
+
+
+def test_unfinished_jobs_never_expire(store):
+    queued = store.create("a.png", 5, 5)
+    running = store.create("b.png", 5, 5)
+    store.update(queued["id"], queued_at=time.time() - 120)
+    store.update(running["id"], status="running", queued_at=time.time() - 120, started_at=time.time() - 90)
+    store.purge()
+    assert store.get(queued["id"])["status"] == "queued"
+    assert store.get(running["id"])["status"] == "running"
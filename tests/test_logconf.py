@@ -0,0 +1,35 @@
+import json
+import logging
+import queue
+
+from src.logconf import (ContextFilter, DroppingQueueHandler, JsonFormatter, bind_request, request_id_var,
+                         unbind_request, verbose)
+
+
+def _record(msg, *args, **extra):
+    record = logging.LogRecord("src.api", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_line_carries_request_id_and_fields():
+    tokens = bind_request("req-1", sample_rate=1.0)
+    try:
+        assert verbose()
+        record = _record("POST %s %d", "/process", 200, fields={"status": 200, "grid": "5x5"})
+        ContextFilter().filter(record)
+    finally:
+        unbind_request(tokens)
+    assert request_id_var.get() == "-"
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "POST /process 200"
+    assert entry["request_id"] == "req-1"
+    assert (entry["status"], entry["grid"]) == (200, "5x5")
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record("primero"))
+    handler.handle(_record("segundo"))
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().msg == "primero"
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+
+from src.ocr import compose_cells, assign_words, assign_confidences, count_path, create_engine, is_confirmed
+
+
+def test_compose_cells_stacks_in_one_column():
+    cells = [np.zeros((20, 30), np.uint8), np.zeros((10, 40), np.uint8)]
+    canvas, slots = compose_cells(cells, gutter=5)
+    assert canvas.shape == (5 + 2 * (20 + 5), 2 * 5 + 40)
+    assert slots == [(5, 5, 30, 20), (5, 30, 40, 10)]
+    # Celdas pegadas en su sitio, gutters en blanco
+    assert (canvas[5:25, 5:35] == 0).all()
+    assert (canvas[25:30, :] == 255).all()
+
+
+def test_assign_words_maps_boxes_to_cells():
+    slots = [(5, 5, 30, 20), (5, 30, 40, 10), (5, 45, 40, 10)]
+    data = {
+        'text': ['', '7', '12', '3', ' '],
+        'left': [0, 8, 6, 30, 0],
+        'top': [0, 8, 31, 31, 0],
+        'width': [50, 10, 12, 8, 1],
+        'height': [60, 10, 8, 8, 1],
+        'conf': [-1, 90, 88, 70, -1],
+    }
+    assert assign_words(data, slots) == ['7', '12 3', '']
+    assert assign_confidences(data, slots) == [90.0, 70.0, None]
+
+
+def test_only_confident_bingo_numbers_are_confirmed():
+    assert is_confirmed('42', 91.0, min_confidence=80, max_number=75)
+    assert not is_confirmed('42', 60.0, min_confidence=80, max_number=75)
+    assert not is_confirmed('42', None, min_confidence=80, max_number=75)
+    for text in ('', '0', '07', '76', '4 2', 'B', '²'):
+        assert not is_confirmed(text, 99.0, min_confidence=80, max_number=75)
+
+
+def test_create_engine_by_name():
+    assert create_engine("pytesseract").name == "pytesseract"
+    with pytest.raises(ValueError):
+        create_engine("easyocr")
+
+
+def test_engine_calls_and_failures_are_counted():
+    engine = create_engine("pytesseract")
+
+    def count(name):
+        return REGISTRY.get_sample_value(name, {"engine": "pytesseract"}) or 0
+
+    def broken(image, config):
+        raise OSError("tesseract crashed")
+
+    calls, failures = count("bingo_tesseract_invocations_total"), count("bingo_ocr_failures_total")
+    assert engine._run(lambda image, config: "7", None, 7) == "7"
+    with pytest.raises(OSError):
+        engine._run(broken, None, 7)
+    assert count("bingo_tesseract_invocations_total") == calls + 2
+    assert count("bingo_ocr_failures_total") == failures + 1
+
+
+def test_count_path_feeds_stats_and_the_cells_metric():
+    def count(path):
+        return REGISTRY.get_sample_value("bingo_ocr_cells_total", {"path": path}) or 0
+
+    free, tesseract = count("free"), count("tesseract")
+    stats = {}
+    count_path(stats, "free")
+    count_path(None, "tesseract", 3)
+    count_path(stats, "tesseract", 0)
+    assert stats == {"free": 1}
+    assert (count("free"), count("tesseract")) == (free + 1, tesseract + 3)
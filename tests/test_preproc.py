@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+from src.preproc import (detect_card, detect_grid_lines, divide_into_grid, load_normalised, preprocess_image,
+                         warp_card)
+from src.utils import read_image_size
+
+
+def _grid_card(ys, xs):
+    card = np.full((ys[-1] + 1, xs[-1] + 1), 255, np.uint8)
+    for y in ys:
+        cv2.line(card, (0, y), (xs[-1], y), 0, 3)
+    for x in xs:
+        cv2.line(card, (x, 0), (x, ys[-1]), 0, 3)
+    return card
+
+
+def test_detect_card_in_photo():
+    # Rejilla 5x5 girada y en perspectiva sobre un fondo gris con textura
+    card = _grid_card([i * 80 for i in range(6)], [j * 80 for j in range(6)])
+    quad = np.float32([[220, 140], [640, 170], [610, 560], [190, 520]])
+    src = np.float32([[0, 0], [400, 0], [400, 400], [0, 400]])
+    rng = np.random.default_rng(0)
+    photo = rng.integers(90, 130, (700, 900), dtype=np.uint8)
+    matrix = cv2.getPerspectiveTransform(src, quad)
+    warped = cv2.warpPerspective(card, matrix, (900, 700), flags=cv2.INTER_LINEAR)
+    inside = cv2.warpPerspective(np.full_like(card, 255), matrix, (900, 700))
+    photo[inside > 0] = warped[inside > 0]
+
+    found = detect_card(photo)
+    assert found is not None
+    assert np.abs(found - quad).max() < 8
+
+    straight, _ = warp_card(photo, found)
+    ys, xs = detect_grid_lines(preprocess_image(straight), 5, 5)
+    assert ys is not None and xs is not None
+    assert np.abs(np.diff(ys) - straight.shape[0] / 5).max() < 6
+
+
+def test_detect_card_without_card():
+    assert detect_card(np.full((300, 400), 200, np.uint8)) is None
+
+
+def test_detected_lines_follow_uneven_columns():
+    # Columnas desiguales: el reparto uniforme cortaría la rejilla, las líneas no
+    from src.processor import cell_boxes
+    ys, xs = [0, 60, 120, 180], [0, 40, 140, 200]
+    binary = preprocess_image(_grid_card(ys, xs))
+    lines = detect_grid_lines(binary, 3, 3)
+    assert np.abs(np.array(lines[1]) - xs).max() <= 2
+    boxes = cell_boxes(*binary.shape, 3, 3, lines)
+    assert len(boxes) == 9
+    assert boxes[0][0] < 40 < boxes[1][0] < boxes[1][2] < 140 < boxes[2][0]
+    assert [c.shape for c in divide_into_grid(binary, 3, 3)] == [(60, 67)] * 9
+
+
+def test_read_image_size():
+    image = np.zeros((123, 456, 3), np.uint8)
+    for ext in (".png", ".jpg", ".bmp"):
+        assert read_image_size(cv2.imencode(ext, image)[1].tobytes()) == (123, 456)
+    assert read_image_size(b"no es una imagen") is None
+
+
+def test_load_normalised_reduces_large_photos():
+    # Celdas de 320 px con objetivo 64: decodificación reducida a 1/4
+    card = _grid_card([i * 320 for i in range(6)], [j * 320 for j in range(6)])
+    data = cv2.imencode(".jpg", card)[1].tobytes()
+    image, (sx, sy) = load_normalised(data, (5, 5), target_cell_height=64)
+    assert image.ndim == 2
+    assert 64 <= image.shape[0] / 5 < 128
+    assert sx == image.shape[1] / card.shape[1] and sy == image.shape[0] / card.shape[0]
+    # Un ndarray se reduce con un único resize; con objetivo 0 no se normaliza
+    array, (ax, _) = load_normalised(card, (5, 5), target_cell_height=64)
+    assert 64 <= array.shape[0] / 5 < 128 and ax < 1
+    small, scale = load_normalised(data, (5, 5), target_cell_height=0)
+    assert small.shape == card.shape and scale == (1.0, 1.0)
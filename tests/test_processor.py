@@ -1,6 +1,54 @@
 import unittest
+
+import cv2
+import numpy as np
+
 from src.processor import process_image
 
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _render_card(numbers, cell, noise=0.0, blur=0.0, rotation=0.0, seed=0):
+    """Cartón como los de bench.synth: letra de la columna arriba a la izquierda, número
+    abajo, FREE pequeño y fino en la casilla central vacía, rejilla, giro, desenfoque y ruido."""
+    rows, cols = len(numbers), len(numbers[0])
+    image = np.full((rows * cell, cols * cell, 3), 255, np.uint8)
+    scale = cv2.getFontScaleFromHeight(FONT, cell * 2 // 5)
+    thickness = max(2, cell // 30)
+    letter_scale = cv2.getFontScaleFromHeight(FONT, max(6, cell // 9))
+    for i, row in enumerate(numbers):
+        for j, text in enumerate(row):
+            x0, y0 = j * cell, i * cell
+            cv2.putText(image, "BINGO"[j % 5], (x0 + cell // 18, y0 + cell // 5), FONT, letter_scale,
+                        (0, 0, 0), 1, cv2.LINE_AA)
+            text_scale, text_thickness = scale, thickness
+            if not text:
+                text = "FREE"
+                text_scale, text_thickness = cv2.getFontScaleFromHeight(FONT, cell // 5), max(1, thickness // 2)
+            (tw, _th), _ = cv2.getTextSize(text, FONT, text_scale, text_thickness)
+            cv2.putText(image, text, (x0 + (cell - tw) // 2, y0 + cell - cell // 5), FONT, text_scale,
+                        (0, 0, 0), text_thickness, cv2.LINE_AA)
+    line = max(2, cell // 45)
+    for k in range(rows + 1):
+        cv2.line(image, (0, min(rows * cell - 1, k * cell)), (cols * cell, min(rows * cell - 1, k * cell)), (0, 0, 0), line)
+    for k in range(cols + 1):
+        cv2.line(image, (min(cols * cell - 1, k * cell), 0), (min(cols * cell - 1, k * cell), rows * cell), (0, 0, 0), line)
+    if rotation:
+        matrix = cv2.getRotationMatrix2D((image.shape[1] / 2, image.shape[0] / 2), rotation, 1.0)
+        image = cv2.warpAffine(image, matrix, image.shape[1::-1], borderValue=(255, 255, 255))
+    if blur:
+        image = cv2.GaussianBlur(image, (0, 0), blur)
+    if noise:
+        rng = np.random.default_rng(seed)
+        image = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+    return image
+
+
+def _numbers(centre=""):
+    numbers = [[str(15 * j + i + 1) for j in range(5)] for i in range(5)]
+    numbers[2][2] = centre
+    return numbers
+
 class TestProcessor(unittest.TestCase):
 
     def test_process_image(self):
@@ -15,6 +63,21 @@ class TestProcessor(unittest.TestCase):
         ]
         self.assertEqual(result, expected_result)
 
+    def test_batch_mode_matches_cell_mode(self):
+        # El modo batch (un único Tesseract por cartón) debe dar lo mismo que el modo por celda
+        per_cell = process_image("tests/sample_bingo_card.png")
+        batched = process_image("tests/sample_bingo_card.png", ocr_mode="batch")
+        self.assertEqual(batched, per_cell)
+
+    def test_process_image_from_memory(self):
+        # Bytes codificados y ndarray ya decodificado dan el mismo resultado que la ruta
+        import cv2
+        with open("tests/sample_bingo_card.png", "rb") as f:
+            data = f.read()
+        from_path = process_image("tests/sample_bingo_card.png")
+        self.assertEqual(process_image(data), from_path)
+        self.assertEqual(process_image(cv2.imread("tests/sample_bingo_card.png")), from_path)
+
     def test_empty_image(self):
         # Test with an empty image
         result = process_image("tests/empty_image.png")
@@ -25,6 +88,82 @@ class TestProcessor(unittest.TestCase):
                            ['', '', '', '', '']]
         self.assertEqual(result, expected_result)
 
+    def test_blank_cells_skip_ocr(self):
+        # Un cartón en blanco no llega a Tesseract: todas las celdas son vacías o la FREE
+        import numpy as np
+        stats = {}
+        result = process_image(np.full((400, 400, 3), 255, np.uint8), stats=stats)
+        self.assertEqual(result, [[''] * 5 for _ in range(5)])
+        self.assertEqual(stats, {"empty": 25})
+
+    def test_blank_cell_kind(self):
+        import cv2
+        import numpy as np
+        from src.processor import blank_cell_kind
+        area = np.full((60, 90), 255, np.uint8)
+        self.assertEqual(blank_cell_kind(area), "empty")
+        digits = area.copy()
+        cv2.putText(digits, "64", (20, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 3)
+        self.assertIsNone(blank_cell_kind(digits))
+        self.assertIsNone(blank_cell_kind(digits, centre=True))
+        free = area.copy()
+        cv2.putText(free, "FREE", (5, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+        self.assertEqual(blank_cell_kind(free, centre=True), "free")
+
+    def test_free_square_is_not_read(self):
+        # La FREE fina y pequeña de los cartones sintéticos, a varias resoluciones y
+        # calidades: nunca sale como número
+        variants = [dict(cell=70), dict(cell=96), dict(cell=140), dict(cell=200),
+                    dict(cell=110, noise=6, blur=1.2, rotation=0.8), dict(cell=64, noise=4, blur=1.0)]
+        for params in variants:
+            grid = process_image(_render_card(_numbers(), **params), memo=None, classifier=None)
+            self.assertEqual(grid[2][2], "", params)
+
+    def test_numeric_centre_is_read(self):
+        # Un cartón sin FREE: el número central se lee, no se descarta
+        for centre, cell in (("35", 100), ("13", 120), ("7", 80)):
+            grid = process_image(_render_card(_numbers(centre), cell), memo=None, classifier=None)
+            self.assertEqual(grid[2][2], centre)
+
+    def test_stage_timings(self):
+        # Con timings se mide cada etapa; sin él, process_image no cambia el resultado
+        timings = {}
+        result = process_image("tests/sample_bingo_card.png", timings=timings)
+        self.assertEqual(result, process_image("tests/sample_bingo_card.png"))
+        self.assertTrue({"decode", "preprocess", "cleanup", "ocr"} <= set(timings))
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+    def test_diagnostics_are_rendered_on_demand(self):
+        # process_image solo guarda líneas y máscara; las imágenes se dibujan después
+        import cv2
+        from src.processor import render_mask, render_overlay
+        diagnostics = {}
+        process_image("tests/sample_bingo_card.png", diagnostics=diagnostics)
+        self.assertEqual(len(diagnostics["ys"]), 6)
+        original = cv2.imread("tests/sample_bingo_card.png")
+        self.assertEqual(render_overlay("tests/sample_bingo_card.png", diagnostics).shape, original.shape)
+        self.assertEqual(render_mask(diagnostics).shape, diagnostics["mask"].shape + (3,))
+
+    def test_overlay_from_reduced_image_keeps_original_size(self):
+        # La API guarda la imagen ya reducida y su escala, no los bytes subidos
+        from src.processor import GRID_COLOR, load_for_ocr, render_overlay
+        original = cv2.resize(cv2.imread("tests/sample_bingo_card.png"), None, fx=4, fy=4)
+        ok, encoded = cv2.imencode(".png", original)
+        reduced, scale = load_for_ocr(encoded.tobytes(), (5, 5), False)
+        self.assertLess(scale[0], 1.0)
+        diagnostics = {}
+        process_image(reduced, diagnostics=diagnostics)
+        overlay = render_overlay(reduced, diagnostics, scale)
+        self.assertEqual(overlay.shape, original.shape)
+        # Las líneas interiores caen en el mismo sitio que sobre la imagen original
+        expected = render_overlay(original, {**diagnostics, "homography": np.diag([*scale, 1.0])})
+        drawn, reference = np.all(overlay == GRID_COLOR, axis=2), np.all(expected == GRID_COLOR, axis=2)
+        self.assertGreater((drawn & reference).sum(), 0.9 * reference.sum())
+
+    def test_warm_up_reads_synthetic_card(self):
+        from src.processor import warm_up
+        self.assertEqual(warm_up(), ["2", "7"])
+
     def test_invalid_image(self):
         # Test with an invalid image path
         with self.assertRaises(FileNotFoundError):
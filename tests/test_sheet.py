@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+
+from src.preproc import detect_cards
+from src.sheet import sheet_crops
+
+
+def test_detect_cards_in_reading_order(make_sheet):
+    sheet = make_sheet(0, count=6, columns=3)
+    gray = cv2.cvtColor(sheet["image"], cv2.COLOR_BGR2GRAY)
+    quads = detect_cards(gray)
+    assert len(quads) == 6
+    for quad, (x, y, w, h) in zip(quads, sheet["boxes"]):
+        assert np.allclose(quad.min(axis=0), (x, y), atol=6)
+        assert np.allclose(quad.max(axis=0), (x + w, y + h), atol=6)
+    assert detect_cards(np.full((600, 800), 255, np.uint8)) == []
+
+
+def test_sheet_crops_are_views_of_one_decode(make_sheet):
+    sheet = make_sheet(1, count=4, columns=2, photo=True, megapixels=6)
+    crops, boxes = sheet_crops(sheet["data"])
+    assert len(crops) == 4
+    base = crops[0].base
+    assert base is not None and all(crop.base is base for crop in crops)
+    height, width = sheet["image"].shape[:2]
+    for x, y, w, h in boxes:
+        assert 0 <= x < x + w <= width and 0 <= y < y + h <= height
+    # Cartones en orden de lectura: la segunda fila empieza por debajo de la primera
+    assert boxes[2][1] > boxes[0][1] + boxes[0][3] / 2
+
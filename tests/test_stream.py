@@ -0,0 +1,78 @@
+import asyncio
+import os
+
+import cv2
+import numpy as np
+
+from src.stream import CellTracker, cell_differences, cell_thumbnails
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "sample_bingo_card.png")
+
+
+def _card():
+    return cv2.imread(SAMPLE)
+
+
+def _noisy(image, seed=0, gain=1.0):
+    noise = np.random.default_rng(seed).normal(0, 6, image.shape)
+    return np.clip(image * gain + noise, 0, 255).astype(np.uint8)
+
+
+def _write(image, row, col, text):
+    # Celdas de 90 px en la muestra: borrar el número y escribir otro
+    card = image.copy()
+    cv2.rectangle(card, (col * 90 + 8, row * 90 + 35), ((col + 1) * 90 - 8, (row + 1) * 90 - 8), (255, 255, 255), -1)
+    cv2.putText(card, text, (col * 90 + 20, (row + 1) * 90 - 20), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 3)
+    return card
+
+
+def test_thumbnails_ignore_noise_and_exposure():
+    gray = cv2.cvtColor(_card(), cv2.COLOR_BGR2GRAY)
+    base = cell_thumbnails(gray, (5, 5))
+    darker = cv2.cvtColor(_noisy(_card(), gain=0.8), cv2.COLOR_BGR2GRAY)
+    changed = cv2.cvtColor(_write(_card(), 1, 2, "42"), cv2.COLOR_BGR2GRAY)
+    assert cell_differences(cell_thumbnails(darker, (5, 5)), base).max() < 0.05
+    diff = cell_differences(cell_thumbnails(changed, (5, 5)), base)
+    assert np.argwhere(diff > 0.15).tolist() == [[1, 2]]
+
+
+def test_tracker_rereads_only_changed_cells():
+    tracker = CellTracker((5, 5), settle=False)
+    first = tracker.update(_card())
+    assert first["read"] == 25 and len(first["changes"]) == 25
+    assert tracker.texts[0] == ["1", "2", "3", "4", "5"]
+
+    assert tracker.update(_noisy(_card(), seed=1)) == {"frame": 2, "located": True, "read": 0, "changes": []}
+    delta = tracker.update(_noisy(_write(_card(), 1, 2, "42"), seed=2))
+    assert delta["read"] == 1
+    assert delta["changes"] == [{"row": 1, "col": 2, "text": "42"}]
+    assert tracker.cells_read == 26
+
+
+def test_tracker_waits_for_moving_cells_to_settle():
+    tracker = CellTracker((5, 5))
+    tracker.update(_card())
+    # Primer frame con el cambio: todavía distinto del anterior (en movimiento)
+    assert tracker.update(_write(_card(), 3, 0, "61"))["read"] == 0
+    assert tracker.update(_write(_card(), 3, 0, "61"))["changes"] == [{"row": 3, "col": 0, "text": "61"}]
+
+
+def test_receiver_keeps_only_the_latest_frame():
+    from src.api import _receive_frames
+
+    class FakeSocket:
+        def __init__(self, frames):
+            self.messages = [{"type": "websocket.receive", "bytes": f} for f in frames]
+            self.messages.append({"type": "websocket.disconnect"})
+
+        async def receive(self):
+            return self.messages.pop(0)
+
+    async def run():
+        mailbox = asyncio.Queue(maxsize=1)
+        counts = {"dropped": 0}
+        await _receive_frames(FakeSocket([b"1", b"2", b"3"]), mailbox, counts)
+        return mailbox.get_nowait(), counts["dropped"]
+
+    # Nadie consume: los frames se pisan y al desconectar solo queda el final (None)
+    assert asyncio.run(run()) == (None, 2)
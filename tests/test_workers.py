@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.workers import OCRPool, PoolSaturated
+
+
+def test_pool_rejects_when_queue_is_full():
+    pool = OCRPool(max_workers=1, max_queue=1, retry_after=3)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait, 5))
+        waiting = asyncio.ensure_future(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        assert pool.stats()["in_flight"] == 1
+        assert pool.stats()["queued"] == 1
+        with pytest.raises(PoolSaturated) as excinfo:
+            await pool.run(release.wait, 5)
+        assert excinfo.value.retry_after == 3
+        release.set()
+        return await asyncio.gather(running, waiting)
+
+    try:
+        assert asyncio.run(scenario()) == [True, True]
+    finally:
+        release.set()
+        pool.shutdown()
+    assert pool.stats()["in_flight"] == 0
+
+
+def test_warm_up_runs_once_per_thread():
+    pool = OCRPool(max_workers=3)
+    try:
+        names = pool.warm_up(lambda: threading.current_thread().name, timeout=5)
+    finally:
+        pool.shutdown()
+    assert len(set(names)) == 3